@@ -18,3 +18,19 @@ elif env == 'HOMOLOGATION':
     from .homologation import *
 else:
     print(f"--- {env} ENVIRONMENT ---")
+
+REDIS_URL = globals().get('REDIS_URL')
+
+# tests always use the local-memory cache so they run without Redis
+if REDIS_URL and not TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+    # a Redis outage degrades to cache misses instead of failing requests
+    DJANGO_REDIS_IGNORE_EXCEPTIONS = True
@@ -33,6 +33,22 @@ DEBUG = True
 # https://stackoverflow.com/questions/4088253/django-how-to-detect-test-environment
 TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
 
+# run Celery tasks inline while testing so no broker is needed
+CELERY_ALWAYS_EAGER = TESTING
+
+# notifications and webhook events are handled after the commit that queues
+# them; the beat picks up the ones that failed or were left by a crashed worker
+CELERYBEAT_SCHEDULE = {
+    'flush-notifications': {
+        'task': 'flush_notifications',
+        'schedule': timedelta(minutes=1),
+    },
+    'retry-pagarme-webhooks': {
+        'task': 'retry_pagarme_webhooks',
+        'schedule': timedelta(minutes=5),
+    },
+}
+
 ALLOWED_HOSTS = []
 
 
@@ -112,6 +128,15 @@ DATABASES = {
 }
 
 
+# Overridden with django-redis in settings/__init__.py when REDIS_URL is set
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'aluguel-api',
+    }
+}
+
+
 REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'rest_framework.filters.SearchFilter',
@@ -122,7 +147,7 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.ListingPagination',
     'PAGE_SIZE': 20,
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
     # 'DEFAULT_PERMISSION_CLASSES': (
@@ -186,4 +211,39 @@ STATIC_ROOT = os.path.join(BASE_DIR, '..', 'static')
 MEDIA_URL = '/uploads/'
 MEDIA_ROOT = os.path.join(BASE_DIR, '..', 'uploads')
 
+# Uploads past FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to a temporary file
+# instead of being held in memory; the other fields of a request body are
+# capped by DATA_UPLOAD_MAX_MEMORY_SIZE
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
+# Asset and banner uploads past it are refused before they are spooled
+ASSET_UPLOAD_MAX_SIZE = 60 * 1024 * 1024
+# Largest image decoded for the derivatives (~160MB as RGBA)
+ASSET_MAX_IMAGE_PIXELS = 40000000
+
+# Extra formats generated for each asset derivative level (1 high, 2 medium,
+# 3 low); formats the installed Pillow can't encode are skipped
+ASSET_DERIVATIVE_FORMATS = {
+    1: ['avif', 'webp', 'jpeg'],
+    2: ['avif', 'webp', 'jpeg'],
+    3: ['avif', 'webp', 'jpeg'],
+}
+ASSET_DERIVATIVE_QUALITY = {
+    'avif': 60,
+    'webp': 80,
+    'jpeg': 85,
+}
+
+# Payment gateway HTTP client: each plugin keeps one pooled keep-alive
+# session per process; timeouts are (connect, read) seconds and idempotent
+# calls are retried with exponential backoff on 429/5xx and connection errors
+GATEWAY_POOL_SIZE = 10
+GATEWAY_TIMEOUT = (3.05, 30)
+GATEWAY_MAX_RETRIES = 3
+GATEWAY_RETRY_BACKOFF = 0.5
+
+# HTTP Basic credentials configured for the webhooks on the Pagar.me dashboard
+PAGARME_WEBHOOK_USERNAME = os.getenv('PAGARME_WEBHOOK_USERNAME')
+PAGARME_WEBHOOK_PASSWORD = os.getenv('PAGARME_WEBHOOK_PASSWORD')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Asset, Banner, Spot
+from .models import Asset, AssetDerivative, Banner, Spot
 
 # Register your models here.
 admin.site.register(Asset)
+admin.site.register(AssetDerivative)
 admin.site.register(Banner)
 admin.site.register(Spot)
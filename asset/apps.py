@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class AssetConfig(AppConfig):
     name = 'asset'
+
+    def ready(self):
+        from django.conf import settings
+        from PIL import Image
+        from . import signals  # noqa: F401
+
+        # bounds the memory a single decode may take
+        Image.MAX_IMAGE_PIXELS = settings.ASSET_MAX_IMAGE_PIXELS
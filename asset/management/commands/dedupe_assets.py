@@ -0,0 +1,88 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from asset.models import Asset
+from asset.utils import content_hash
+
+
+def stored_files(asset):
+    files = [asset.file_high, asset.file_medium, asset.file_low, asset.file_original]
+    files += [derivative.file for derivative in asset.derivatives.all()]
+    return {file.name: file.storage for file in files if file}
+
+
+def file_size(storage, name):
+    try:
+        return storage.size(name)
+    except Exception:
+        return 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Back-fill the content hash of assets and point image assets with the same content '
+        'at the files of the oldest ready one, deleting the duplicate files.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be collapsed without changing anything.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        hashed = 0
+        for asset in Asset.objects.filter(content_hash__isnull=True).iterator():
+            source = asset.file_original or asset.file_high
+            try:
+                with source.open('rb') as file:
+                    digest = content_hash(file)
+            except Exception as error:
+                self.stderr.write(f'Asset {asset.id}: {error}')
+                continue
+
+            if not dry_run:
+                Asset.objects.filter(id=asset.id).update(content_hash=digest)
+            else:
+                asset.content_hash = digest
+            hashed += 1
+
+        self.stdout.write(f'{hashed} assets hashed.')
+
+        if dry_run:
+            self.stdout.write('Dry run: hashes were not saved, duplicates are only searched among hashed assets.')
+
+        digests = (
+            Asset.objects.filter(file_type=1, content_hash__isnull=False)
+            .values('content_hash').annotate(total=Count('id')).filter(total__gt=1)
+            .values_list('content_hash', flat=True)
+        )
+
+        shared = 0
+        reclaimed = 0
+        for digest in digests:
+            assets = list(Asset.objects.filter(file_type=1, content_hash=digest).prefetch_related('derivatives').order_by('id'))
+            keep = next((asset for asset in assets if asset.status == 2), None)
+            if keep is None:
+                continue
+            kept_files = stored_files(keep)
+
+            for duplicate in assets:
+                files = {name: storage for name, storage in stored_files(duplicate).items() if name not in kept_files}
+                if duplicate.id == keep.id or not files:
+                    continue
+
+                size = sum(file_size(storage, name) for name, storage in files.items())
+
+                if not dry_run:
+                    # every row stays with its owner, only the files are shared
+                    duplicate.share_files_of(keep)
+                    for name, storage in files.items():
+                        storage.delete(name)
+
+                shared += 1
+                reclaimed += size
+
+        action = 'would be' if dry_run else 'were'
+        self.stdout.write(self.style.SUCCESS(
+            f'{shared} duplicate assets {action} pointed at shared files, {reclaimed / (1024 * 1024):.2f} MiB {action} reclaimed.'
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from asset.models import Asset
+from asset.tasks import generate_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Generate the configured derivative formats for image assets that have none yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Regenerate every image asset.')
+
+    def handle(self, *args, **options):
+        assets = Asset.objects.filter(file_type=1)
+        if not options['all']:
+            assets = assets.filter(derivatives__isnull=True)
+
+        total = 0
+        for asset in assets.iterator():
+            # assets uploaded before file_original existed use file_high as source
+            if not asset.file_original:
+                Asset.objects.filter(id=asset.id).update(file_original=asset.file_high.name)
+            generate_derivatives(asset.id)
+            total += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{total} assets processed.'))
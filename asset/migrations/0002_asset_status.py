@@ -0,0 +1,30 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:00
+
+import asset.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asset', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='file_original',
+            field=models.FileField(editable=False, null=True, upload_to=asset.models.upload_directory_path, verbose_name='Arquivo (original)'),
+        ),
+        # existing assets already have their derivatives
+        migrations.AddField(
+            model_name='asset',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'ready'), (3, 'failed')], default=2, editable=False, verbose_name='Situação'),
+        ),
+        migrations.AlterField(
+            model_name='asset',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'ready'), (3, 'failed')], default=1, editable=False, verbose_name='Situação'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:30
+
+import asset.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asset', '0002_asset_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetDerivative',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField(choices=[(1, 'high'), (2, 'medium'), (3, 'low')], verbose_name='Tamanho')),
+                ('format', models.CharField(choices=[('avif', 'AVIF'), ('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=10, verbose_name='Formato')),
+                ('file', models.FileField(upload_to=asset.models.upload_directory_path, verbose_name='Arquivo')),
+                ('size', models.PositiveIntegerField(verbose_name='Tamanho em bytes')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='derivatives', to='asset.asset', verbose_name='Arquivo')),
+            ],
+            options={
+                'verbose_name': 'Derivado de arquivo',
+                'verbose_name_plural': 'Derivados de arquivos',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='assetderivative',
+            constraint=models.UniqueConstraint(fields=('asset', 'level', 'format'), name='asset_derivative_unique_level_format'),
+        ),
+    ]
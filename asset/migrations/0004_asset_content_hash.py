@@ -0,0 +1,18 @@
+# Generated by Django 3.2.18 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asset', '0003_assetderivative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='content_hash',
+            field=models.CharField(db_index=True, editable=False, max_length=64, null=True, verbose_name='Hash do conteúdo'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.18 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('asset', '0004_asset_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='banner',
+            index=models.Index(fields=['spot', 'expires'], name='banner_spot_expires_idx'),
+        ),
+    ]
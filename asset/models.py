@@ -1,6 +1,9 @@
-from django.db import models
+import os
+from django.core.files import File
+from django.db import models, transaction
 from random import getrandbits
-from .utils import resize_and_crop_file
+from core.dispatch import enqueue
+from .utils import content_hash as file_content_hash
 
 
 def upload_directory_path(instance, filename):
@@ -8,6 +11,14 @@ def upload_directory_path(instance, filename):
     return f'{HASH}-{filename}'
 
 
+class AssetQuerySet(models.QuerySet):
+    def duplicate_of(self, digest):
+        '''
+        Ready image asset already stored with the same content, if any
+        '''
+        return self.filter(file_type=1, content_hash=digest, status=2).order_by('id').first()
+
+
 class Asset(models.Model):
     FILE_CHOICES = (
         (1, 'image'),
@@ -15,6 +26,12 @@ class Asset(models.Model):
         (3, 'other'),
     )
 
+    STATUS_CHOICES = (
+        (1, 'pending'),
+        (2, 'ready'),
+        (3, 'failed'),
+    )
+
     file_type = models.PositiveSmallIntegerField(
         'Tipo de Arquivo',
         choices=FILE_CHOICES,
@@ -37,8 +54,29 @@ class Asset(models.Model):
         upload_to=upload_directory_path,
         null=True,
     )
+    file_original = models.FileField(
+        'Arquivo (original)',
+        upload_to=upload_directory_path,
+        null=True,
+        editable=False,
+    )
+    content_hash = models.CharField(
+        'Hash do conteúdo',
+        max_length=64,
+        null=True,
+        editable=False,
+        db_index=True,
+    )
+    status = models.PositiveSmallIntegerField(
+        'Situação',
+        choices=STATUS_CHOICES,
+        default=1,
+        editable=False,
+    )
     uploaded_at = models.DateTimeField('Data de Entrada', auto_now_add=True)
 
+    objects = AssetQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Arquivo"
         verbose_name_plural = "Arquivos"
@@ -47,22 +85,94 @@ class Asset(models.Model):
         return f'{self.id}: {self.file_high}'
 
     def save(self, *args, **kwargs):
-        if self.file_type == 1:
-            self.file_high = resize_and_crop_file(
-                self.file_high, multiplier=1,
-            )
-            self.file_medium = resize_and_crop_file(
-                self.file_high, multiplier=2,
-            )
-            self.file_low = resize_and_crop_file(
-                self.file_high, multiplier=3,
-            )
-        else:
+        if self.file_high and not isinstance(self.file_high, File):
+            # plain file objects (scripts, fixtures) get wrapped like uploads
+            self.file_high = File(self.file_high, name=os.path.basename(self.file_high.name))
+
+        new_upload = self.file_high and not self.file_high._committed
+        new_image = new_upload and self.file_type == 1
+
+        if new_upload and not (self._state.adding and self.content_hash):
+            # a replaced file_high must not keep the hash of the file it
+            # replaced; a new asset may come with the hash of its upload
+            self.content_hash = file_content_hash(self.file_high)
+
+        if new_image:
+            # the upload is stored once and shared by file_original and
+            # file_high until the derivatives replace file_high
+            self.file_original = self.file_high
+            self.status = 1
+        elif self.file_type != 1:
             self.file_medium = None
             self.file_low = None
+            self.status = 2
 
         super(Asset, self).save(*args, **kwargs)
 
+        if new_image:
+            from .tasks import generate_derivatives
+            enqueue(generate_derivatives, self.id)
+
+    def share_files_of(self, asset):
+        '''
+        Point this asset at the stored files and derivatives of ``asset``,
+        an image with the same content. The rows stay apart, each with its
+        own references, while the files are stored once: deleting a row
+        never deletes its files, so either asset can go without the other.
+
+        Returns:
+            asset(Asset): self, saved
+        '''
+        with transaction.atomic():
+            for field in ('file_high', 'file_medium', 'file_low', 'file_original'):
+                setattr(self, field, getattr(asset, field).name or None)
+            self.file_type = asset.file_type
+            self.content_hash = asset.content_hash
+            self.status = asset.status
+            self.save()
+
+            self.derivatives.all().delete()
+            AssetDerivative.objects.bulk_create([
+                AssetDerivative(
+                    asset=self, level=derivative.level, format=derivative.format, file=derivative.file.name, size=derivative.size,
+                )
+                for derivative in asset.derivatives.all()
+            ])
+
+        return self
+
+
+class AssetDerivative(models.Model):
+    LEVEL_CHOICES = (
+        (1, 'high'),
+        (2, 'medium'),
+        (3, 'low'),
+    )
+
+    FORMAT_CHOICES = (
+        ('avif', 'AVIF'),
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    )
+
+    asset = models.ForeignKey(
+        'asset.Asset', verbose_name='Arquivo', related_name='derivatives', on_delete=models.CASCADE,
+    )
+    level = models.PositiveSmallIntegerField('Tamanho', choices=LEVEL_CHOICES)
+    format = models.CharField('Formato', choices=FORMAT_CHOICES, max_length=10)
+    file = models.FileField('Arquivo', upload_to=upload_directory_path)
+    size = models.PositiveIntegerField('Tamanho em bytes')
+
+    class Meta:
+        verbose_name = "Derivado de arquivo"
+        verbose_name_plural = "Derivados de arquivos"
+        constraints = [
+            models.UniqueConstraint(fields=['asset', 'level', 'format'], name='asset_derivative_unique_level_format'),
+        ]
+
+    def __str__(self):
+        return f'{self.id}: {self.asset_id} {self.get_level_display()} ({self.format})'
+
 
 class Banner(models.Model):
     asset = models.OneToOneField(
@@ -84,6 +194,9 @@ class Banner(models.Model):
     class Meta:
         verbose_name = 'Banner'
         verbose_name_plural = 'Banners'
+        indexes = [
+            models.Index(fields=['spot', 'expires'], name='banner_spot_expires_idx'),
+        ]
 
     def __str__(self):
         return f'Hyperlink {self.id}: {self.hyperlink}'
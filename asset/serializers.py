@@ -1,14 +1,69 @@
+from django.conf import settings
 from django.utils import timezone
 from django.forms.models import model_to_dict
+from PIL import Image
 from rest_framework import serializers
 from .models import Asset, Banner, Spot
+from .utils import accepted_image_formats, content_hash, image_pixels
 
 
 class AssetSerializer(serializers.ModelSerializer):
+    LEVEL_FIELDS = {1: 'file_high', 2: 'file_medium', 3: 'file_low'}
+
     class Meta:
         model = Asset
         fields = '__all__'
 
+    def validate_file_high(self, file):
+        if file.size > settings.ASSET_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'O arquivo deve ter no máximo {settings.ASSET_UPLOAD_MAX_SIZE // (1024 * 1024)}MB.'
+            )
+
+        try:
+            pixels = image_pixels(file)
+        except Image.DecompressionBombError:
+            pixels = Image.MAX_IMAGE_PIXELS + 1
+
+        if pixels is not None and pixels > Image.MAX_IMAGE_PIXELS:
+            raise serializers.ValidationError('A imagem possui resolução maior que a permitida.')
+
+        return file
+
+    def create(self, validated_data):
+        if validated_data.get('file_type', 1) != 1:
+            return super().create(validated_data)
+
+        # the same photo uploaded again gets its own asset over the stored files and derivatives
+        digest = content_hash(validated_data['file_high'])
+        duplicate = Asset.objects.duplicate_of(digest)
+        if duplicate is not None:
+            return Asset().share_files_of(duplicate)
+
+        # saved along, so the upload is not read again to hash it
+        return super().create({**validated_data, 'content_hash': digest})
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        request = self.context.get('request')
+
+        if request is None:
+            return data
+
+        # swap each size for the smallest encoding the client accepts
+        accepted = accepted_image_formats(request.META.get('HTTP_ACCEPT', ''))
+        smallest = {}
+        for derivative in instance.derivatives.all():
+            if derivative.format in accepted and (
+                derivative.level not in smallest or derivative.size < smallest[derivative.level].size
+            ):
+                smallest[derivative.level] = derivative
+
+        for level, derivative in smallest.items():
+            data[self.LEVEL_FIELDS[level]] = request.build_absolute_uri(derivative.file.url)
+
+        return data
+
 
 class BannerSerializer(serializers.ModelSerializer):
     asset = serializers.FileField(write_only=True)
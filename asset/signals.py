@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import invalidate_on_commit
+
+from .models import Asset, Banner, Spot
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_delete, sender=Asset)
+def invalidate_assets(sender, **kwargs):
+    # ads and spot banners embed their assets
+    invalidate_on_commit('places', 'spots')
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+@receiver(post_save, sender=Spot)
+@receiver(post_delete, sender=Spot)
+def invalidate_spots(sender, **kwargs):
+    invalidate_on_commit('spots')
@@ -0,0 +1,46 @@
+import logging
+
+from celery import task
+from django.db import transaction
+
+from .models import Asset, AssetDerivative
+from .utils import derivative_formats, encode_image, image_to_file, resize_and_crop_images
+
+logger = logging.getLogger(__name__)
+
+
+@task(name='generate_asset_derivatives')
+def generate_derivatives(asset_id):
+    asset = Asset.objects.get(id=asset_id)
+
+    # files written to the storage so far, removed again if a later step fails
+    stored = []
+    try:
+        with asset.file_original.open('rb') as source:
+            images = resize_and_crop_images(source)
+            name = source.name
+
+        derivatives = []
+        for level, (field, image) in enumerate(zip(['file_high', 'file_medium', 'file_low'], images), start=1):
+            png = image_to_file(image, name, level)
+            getattr(asset, field).save(png.name, png, save=False)
+            stored.append(getattr(asset, field))
+
+            for format in derivative_formats(level):
+                encoded = encode_image(image, name, level, format)
+                derivative = AssetDerivative(asset=asset, level=level, format=format, size=encoded.size)
+                derivative.file.save(encoded.name, encoded, save=False)
+                stored.append(derivative.file)
+                derivatives.append(derivative)
+
+        with transaction.atomic():
+            asset.derivatives.all().delete()
+            AssetDerivative.objects.bulk_create(derivatives)
+
+            asset.status = 2
+            asset.save(update_fields=['file_high', 'file_medium', 'file_low', 'status'])
+    except Exception:
+        logger.exception('Could not generate derivatives for asset %s', asset_id)
+        for file in stored:
+            file.storage.delete(file.name)
+        Asset.objects.filter(id=asset_id).update(status=3)
@@ -1,9 +1,25 @@
+import shutil
+import tracemalloc
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.test import TransactionTestCase, override_settings
+from django.test.client import ClientHandler
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from PIL import Image
 import tempfile
 
+from django.core.files import File
+from django.core.management import call_command
+from model_bakery import baker
+from unittest import mock
+from io import StringIO
+
+from asset.models import Asset, AssetDerivative
+from asset.tasks import generate_derivatives
+from asset.utils import content_hash, encode_image, resize_and_crop_sizes
+
 
 class AssetTests(APITestCase):
 
@@ -23,6 +39,256 @@ class AssetTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_upload_image_generates_derivatives_after_commit(self):
+        image = Image.new(mode='RGB', size=(800, 400), color='blue')
+        url = reverse('asset_urls:assets-list')
+
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(tmp_file, format='jpeg')
+        tmp_file.seek(0)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url, {'file_high': tmp_file}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 1)
+        asset = Asset.objects.get(id=response.data['id'])
+        self.assertEqual(asset.file_high.name, asset.file_original.name)
+        self.assertFalse(asset.file_medium)
+
+        for callback in callbacks:
+            callback()
+
+        asset = Asset.objects.get(id=response.data['id'])
+        self.assertEqual(asset.status, 2)
+        self.assertNotEqual(asset.file_high.name, asset.file_original.name)
+        for field, size in (('file_high', 500), ('file_medium', 300), ('file_low', 200)):
+            with Image.open(getattr(asset, field)) as derivative:
+                self.assertEqual(derivative.size, (size, size))
+        with Image.open(asset.file_original) as original:
+            self.assertEqual(original.size, (800, 400))
+
+    def test_failed_derivatives_mark_the_asset_and_remove_their_files(self):
+        image = Image.new(mode='RGB', size=(800, 400), color='blue')
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(tmp_file, format='jpeg')
+        tmp_file.seek(0)
+
+        with mock.patch.object(generate_derivatives, 'delay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                asset = Asset.objects.create(file_high=File(tmp_file, name='photo.jpg'))
+
+        storage = asset.file_original.storage
+        before = set(storage.listdir('')[1])
+        encodings = []
+
+        def encode_once(*args):
+            # the first encoding is stored, the second one crashes
+            if encodings:
+                raise OSError('encoder crashed')
+            encodings.append(encode_image(*args))
+            return encodings[-1]
+
+        with mock.patch('asset.tasks.encode_image', side_effect=encode_once):
+            generate_derivatives(asset.id)
+
+        asset.refresh_from_db()
+        self.assertEqual(asset.status, 3)
+        self.assertEqual(asset.file_high.name, asset.file_original.name)
+        self.assertFalse(asset.derivatives.exists())
+        self.assertEqual(len(encodings), 1)
+        self.assertEqual(set(storage.listdir('')[1]), before)
+        self.assertTrue(storage.exists(asset.file_original.name))
+
+    def test_asset_urls_follow_the_accepted_image_formats(self):
+        image = Image.effect_noise((800, 600), 40).convert('RGB')
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(tmp_file, format='jpeg')
+        tmp_file.seek(0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            asset = Asset.objects.create(file_high=File(tmp_file, name='photo.jpg'))
+
+        derivatives = AssetDerivative.objects.filter(asset=asset)
+        self.assertEqual(sorted(derivatives.values_list('level', 'format')), [
+            (1, 'jpeg'), (1, 'webp'), (2, 'jpeg'), (2, 'webp'), (3, 'jpeg'), (3, 'webp'),
+        ])
+        for derivative in derivatives:
+            self.assertEqual(derivative.size, derivative.file.size)
+
+        url = reverse('asset_urls:assets-detail', args=[asset.id])
+
+        response = self.client.get(url, format='json', HTTP_ACCEPT='application/json')
+        self.assertTrue(response.data['file_high'].endswith('.png'))
+
+        response = self.client.get(url, format='json', HTTP_ACCEPT='application/json, image/webp, */*')
+        smallest = min(derivatives.filter(level=1), key=lambda derivative: derivative.size)
+        self.assertTrue(response.data['file_high'].endswith(smallest.file.url))
+        self.assertTrue(response.data['file_low'].endswith(('.webp', '.jpg')))
+
+        response = self.client.get(url, format='json', HTTP_ACCEPT='application/json, image/webp;q=0, image/jpeg')
+        self.assertTrue(response.data['file_medium'].endswith('.jpg'))
+
+    def test_uploading_the_same_image_twice_shares_the_stored_files(self):
+        image = Image.new(mode='RGB', size=(800, 400), color='green')
+        url = reverse('asset_urls:assets-list')
+
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        image.save(tmp_file, format='jpeg')
+
+        with mock.patch.object(generate_derivatives, 'delay', wraps=generate_derivatives) as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                tmp_file.seek(0)
+                first = self.client.post(url, {'file_high': tmp_file}, format='multipart')
+            with self.captureOnCommitCallbacks(execute=True):
+                tmp_file.seek(0)
+                second = self.client.post(url, {'file_high': tmp_file}, format='multipart')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(first.data['id'], second.data['id'])
+        delay.assert_called_once_with(first.data['id'])
+
+        first_asset, second_asset = Asset.objects.get(id=first.data['id']), Asset.objects.get(id=second.data['id'])
+        self.assertEqual(second_asset.status, 2)
+        for field in ('file_high', 'file_medium', 'file_low', 'file_original'):
+            self.assertEqual(getattr(first_asset, field).name, getattr(second_asset, field).name)
+        self.assertEqual(
+            sorted(first_asset.derivatives.values_list('level', 'format', 'file')),
+            sorted(second_asset.derivatives.values_list('level', 'format', 'file')),
+        )
+
+        # the second uploader removes their asset, the first one keeps its files
+        response = self.client.delete(reverse('asset_urls:assets-detail', args=[second_asset.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        first_asset.refresh_from_db()
+        self.assertTrue(first_asset.file_high.storage.exists(first_asset.file_high.name))
+        self.assertEqual(first_asset.derivatives.count(), 6)
+
+    def test_an_upload_is_hashed_once(self):
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        Image.new(mode='RGB', size=(800, 400), color='red').save(tmp_file, format='jpeg')
+        tmp_file.seek(0)
+
+        with mock.patch('asset.serializers.content_hash', wraps=content_hash) as serializer_hash, \
+                mock.patch('asset.models.file_content_hash', wraps=content_hash) as model_hash:
+            response = self.client.post(reverse('asset_urls:assets-list'), {'file_high': tmp_file}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        serializer_hash.assert_called_once()
+        model_hash.assert_not_called()
+        tmp_file.seek(0)
+        self.assertEqual(Asset.objects.get().content_hash, content_hash(tmp_file))
+
+    def test_replacing_the_file_of_an_asset_updates_its_content_hash(self):
+        url = reverse('asset_urls:assets-list')
+        files = {}
+        for color in ('green', 'blue'):
+            files[color] = tempfile.NamedTemporaryFile(suffix='.jpg')
+            Image.new(mode='RGB', size=(800, 400), color=color).save(files[color], format='jpeg')
+            files[color].seek(0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'file_high': files['green']}, format='multipart')
+        asset = Asset.objects.get(id=response.data['id'])
+        green_hash = asset.content_hash
+
+        response = self.client.put(
+            reverse('asset_urls:assets-detail', args=[asset.id]), {'file_high': files['blue']}, format='multipart',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        # the test transaction never commits, so the task queued by the upload
+        # still counts as pending for the same asset: run it for the new file
+        generate_derivatives(asset.id)
+        asset.refresh_from_db()
+        self.assertEqual(asset.status, 2)
+        files['blue'].seek(0)
+        self.assertEqual(asset.content_hash, content_hash(files['blue']))
+        self.assertNotEqual(asset.content_hash, green_hash)
+
+        # the new file is found again, the replaced one is not
+        for color in ('blue', 'green'):
+            files[color].seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, {'file_high': files[color]}, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            files[color].seek(0)
+            self.assertEqual(Asset.objects.get(id=response.data['id']).content_hash, content_hash(files[color]))
+
+        asset.refresh_from_db()
+        blue, green = Asset.objects.exclude(id=asset.id).order_by('id')
+        self.assertEqual(blue.file_original.name, asset.file_original.name)
+        self.assertNotEqual(green.file_original.name, asset.file_original.name)
+
+    def test_dedupe_assets_shares_the_files_of_duplicates(self):
+        image = Image.new(mode='RGB', size=(600, 600), color='yellow')
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.png')
+        image.save(tmp_file, format='png')
+
+        assets = []
+        for _ in range(3):
+            tmp_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                assets.append(Asset.objects.create(file_high=File(tmp_file, name='photo.png')))
+        Asset.objects.update(content_hash=None)
+
+        place_ads = baker.make('places.PlaceAds')
+        place_ads.images.set(assets[1:])
+        other_place_ads = baker.make('places.PlaceAds')
+        other_place_ads.images.set(assets[:2])
+        user = baker.make('authentication.User', asset=assets[2])
+
+        duplicate_file = assets[1].file_high
+        stdout = StringIO()
+        call_command('dedupe_assets', stdout=stdout)
+
+        self.assertIn('2 duplicate assets were pointed at shared files', stdout.getvalue())
+        self.assertEqual(list(Asset.objects.order_by('id')), assets)
+        self.assertEqual(list(place_ads.images.order_by('id')), assets[1:])
+        self.assertEqual(list(other_place_ads.images.order_by('id')), assets[:2])
+        user.refresh_from_db()
+        self.assertEqual(user.asset, assets[2])
+
+        kept = Asset.objects.get(id=assets[0].id)
+        for asset in Asset.objects.all():
+            self.assertTrue(asset.content_hash)
+            self.assertEqual(asset.file_high.name, kept.file_high.name)
+            self.assertEqual(asset.derivatives.count(), kept.derivatives.count())
+        self.assertFalse(duplicate_file.storage.exists(duplicate_file.name))
+
+        stdout = StringIO()
+        call_command('dedupe_assets', stdout=stdout)
+        self.assertIn('0 duplicate assets were pointed at shared files', stdout.getvalue())
+
+    def test_upload_rejects_images_past_the_pixel_limit(self):
+        image = Image.new(mode='1', size=(8000, 6000))
+        url = reverse('asset_urls:assets-list')
+
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.png')
+        image.save(tmp_file, format='png')
+        tmp_file.seek(0)
+
+        response = self.client.post(url, {'file_high': tmp_file}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file_high', response.data)
+        self.assertFalse(Asset.objects.exists())
+
+    def test_resize_and_crop_sizes_keeps_the_image_centered(self):
+        for image, format in ((Image.new('RGB', (1200, 300), 'red'), 'jpeg'), (Image.new('P', (120, 30)), 'png')):
+            tmp_file = tempfile.NamedTemporaryFile(suffix=f'.{format}')
+            image.save(tmp_file, format=format)
+            tmp_file.seek(0)
+
+            derivatives = resize_and_crop_sizes(tmp_file)
+
+            self.assertEqual(len(derivatives), 3)
+            for derivative, size in zip(derivatives, (500, 300, 200)):
+                with Image.open(derivative) as derivative_image:
+                    self.assertEqual(derivative_image.size, (size, size))
+                    self.assertEqual(derivative_image.getpixel((size // 2, size // 2))[3], 255)
+                    self.assertEqual(derivative_image.getpixel((0, 0))[3], 0)
+
     def test_created_spot(self):
 
         url = reverse('asset_urls:spot-list')
@@ -35,3 +301,86 @@ class AssetTests(APITestCase):
         response = self.client.post(url, body, format='json')
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class AssetUploadMemoryTests(TransactionTestCase):
+    UPLOAD_SIZE = 50 * 1024 * 1024
+    MEMORY_PEAK_LIMIT = 24 * 1024 * 1024
+
+    def multipart_body(self, photo):
+        boundary = 'BoUnDaRy'
+        body = tempfile.TemporaryFile()
+        body.write((
+            f'--{boundary}\r\n'
+            'Content-Disposition: form-data; name="file_high"; filename="huge.png"\r\n'
+            'Content-Type: image/png\r\n\r\n'
+        ).encode())
+        shutil.copyfileobj(photo, body)
+        body.write(f'\r\n--{boundary}--\r\n'.encode())
+        length = body.tell()
+        body.seek(0)
+        return body, length, f'multipart/form-data; boundary={boundary}'
+
+    def upload_environ(self, body, length, content_type):
+        return {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': reverse('asset_urls:assets-list'),
+            'CONTENT_TYPE': content_type,
+            'CONTENT_LENGTH': str(length),
+            'HTTP_ACCEPT': 'application/json',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'wsgi.input': body,
+            'wsgi.url_scheme': 'http',
+        }
+
+    def test_large_upload_is_streamed_to_disk(self):
+        photo = tempfile.TemporaryFile()
+        Image.new('RGB', (2000, 1500), 'red').save(photo, format='png')
+        # pad past the IEND chunk up to the upload size: decoders stop before it
+        photo.truncate(self.UPLOAD_SIZE)
+        photo.seek(0)
+        body, length, content_type = self.multipart_body(photo)
+
+        environ = self.upload_environ(body, length, content_type)
+
+        # the peak of the memory allocated while the request runs, from zero:
+        # a body read into memory counts in full, whatever the process used before
+        tracemalloc.start()
+        try:
+            with mock.patch.object(generate_derivatives, 'delay'):
+                response = ClientHandler()(environ)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertLess(peak, self.MEMORY_PEAK_LIMIT)
+        asset = Asset.objects.get()
+        self.assertEqual(asset.file_original.size, self.UPLOAD_SIZE)
+
+    @override_settings(ASSET_UPLOAD_MAX_SIZE=1024 * 1024, DATA_UPLOAD_MAX_MEMORY_SIZE=64 * 1024)
+    def test_oversized_upload_is_rejected_before_the_body_is_read(self):
+        photo = tempfile.TemporaryFile()
+        photo.truncate(2 * 1024 * 1024)
+        body, length, content_type = self.multipart_body(photo)
+
+        with mock.patch.object(TemporaryFileUploadHandler, 'new_file') as new_file:
+            response = ClientHandler()(self.upload_environ(body, length, content_type))
+
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(body.tell(), 0)
+        new_file.assert_not_called()
+        self.assertFalse(Asset.objects.exists())
+
+    @override_settings(ASSET_UPLOAD_MAX_SIZE=1024 * 1024, DATA_UPLOAD_MAX_MEMORY_SIZE=64 * 1024)
+    def test_oversized_file_is_rejected_while_it_is_streamed(self):
+        # the body fits the Content-Length allowance, the file alone does not
+        photo = tempfile.TemporaryFile()
+        photo.truncate(1024 * 1024 + 32 * 1024)
+        body, length, content_type = self.multipart_body(photo)
+
+        response = ClientHandler()(self.upload_environ(body, length, content_type))
+
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(Asset.objects.exists())
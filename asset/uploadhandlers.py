@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework import exceptions, status
+
+
+class AssetUploadTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_code = 'upload_too_large'
+
+    @property
+    def default_detail(self):
+        return f'O arquivo deve ter no máximo {settings.ASSET_UPLOAD_MAX_SIZE // (1024 * 1024)}MB.'
+
+
+class AssetUploadSizeHandler(FileUploadHandler):
+    '''
+    Reject uploads past ASSET_UPLOAD_MAX_SIZE before they are spooled: from
+    the Content-Length of the request, before the body is read, or while a
+    file is streamed when the request does not tell its length. The body
+    may carry the other fields of the form up to DATA_UPLOAD_MAX_MEMORY_SIZE
+    on top of the file.
+    '''
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > settings.ASSET_UPLOAD_MAX_SIZE + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            raise AssetUploadTooLarge()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.ASSET_UPLOAD_MAX_SIZE:
+            raise AssetUploadTooLarge()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
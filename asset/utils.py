@@ -1,41 +1,212 @@
-import sys
+import os
+from hashlib import sha256
+from tempfile import SpooledTemporaryFile
 from PIL import Image
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 
+DIMENSIONS = [500, 300, 200]
 
-def make_square(im, min_size=266, fill_color=(255, 255, 255, 0)):
-    x, y = im.size
-    size = max(min_size, x, y)
-    new_im = Image.new('RGBA', (size, size), fill_color)
-    new_im.paste(im, (int((size - x)/2), int((size - y)/2)))
-    return new_im
+FORMATS = {
+    'avif': {'pillow': 'AVIF', 'extension': 'avif', 'content_type': 'image/avif'},
+    'webp': {'pillow': 'WEBP', 'extension': 'webp', 'content_type': 'image/webp'},
+    'jpeg': {'pillow': 'JPEG', 'extension': 'jpg', 'content_type': 'image/jpeg'},
+}
 
 
-def resize_and_crop_file(uploaded_image, multiplier=1):
-    dimensions = [500, 300, 200]
-    dimension = dimensions[multiplier-1]
+def spooled_image(image, name, content_type, **params):
+    '''
+    Encode an image into a buffer that rolls over to a temporary file past
+    FILE_UPLOAD_MAX_MEMORY_SIZE, so storages read it back in chunks
 
+    Returns:
+        file(UploadedFile): the encoded image with its byte size
+    '''
+    output_stream = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    image.save(output_stream, **params)
+
+    size = output_stream.tell()
+    output_stream.seek(0)
+
+    return UploadedFile(output_stream, name, content_type, size)
+
+
+def image_to_file(image, filename, multiplier=1):
     name = {1: '', 2: '_medium', 3: '_low'}
 
+    return spooled_image(
+        image,
+        f"{os.path.basename(filename).split('.')[0]}{name[multiplier]}.png",
+        'image/png',
+        format='png', quality=int(100/multiplier),
+    )
+
+
+def resize_and_crop_images(uploaded_image, min_size=266, fill_color=(255, 255, 255, 0)):
+    '''
+    Build the high, medium and low derivative images from a single decode.
+
+    Same framing as the legacy make_square + resize chain kept in
+    benchmarks/legacy_resize.py: the image is centered on a square
+    of side max(min_size, width, height) scaled to the high dimension. JPEGs
+    are decoded at a reduced scale with Image.draft, the source is scaled
+    straight to its final size before being pasted on the square canvas,
+    and each smaller size is resized from the previous one.
+
+    Args:
+        uploaded_image(File): the original upload
+
+    Returns:
+        images(list): high, medium and low RGBA images
+    '''
     img_temp = Image.open(uploaded_image)
-    output_io_stream = BytesIO()
-    img_temp = make_square(img_temp)
 
-    img_temp_resized = img_temp.resize(
-        (dimension, dimension), Image.ANTIALIAS
-    )
+    x, y = img_temp.size
+    scale = DIMENSIONS[0] / max(min_size, x, y)
+    size = (max(1, round(x * scale)), max(1, round(y * scale)))
 
-    img_temp_resized.save(
-        output_io_stream, format='png', quality=int(100/multiplier)
-    )
+    if img_temp.format == 'JPEG' and scale < 1:
+        img_temp.draft(img_temp.mode, size)
 
-    uploaded_image = InMemoryUploadedFile(
-        output_io_stream,
-        'FileField',
-        f"{uploaded_image.name.split('.')[0]}{name[multiplier]}.png",
-        'image/png',
-        sys.getsizeof(output_io_stream), None
+    if img_temp.mode not in ('RGB', 'RGBA'):
+        img_temp = img_temp.convert('RGBA')
+
+    if img_temp.size != size:
+        img_temp = img_temp.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+    canvas = Image.new('RGBA', (DIMENSIONS[0], DIMENSIONS[0]), fill_color)
+    canvas.paste(img_temp, ((DIMENSIONS[0] - size[0]) // 2, (DIMENSIONS[0] - size[1]) // 2))
+
+    images = [canvas]
+    for dimension in DIMENSIONS[1:]:
+        images.append(images[-1].resize((dimension, dimension), Image.LANCZOS))
+
+    return images
+
+
+def resize_and_crop_sizes(uploaded_image):
+    '''
+    Args:
+        uploaded_image(File): the original upload
+
+    Returns:
+        derivatives(list): high, medium and low PNG files
+    '''
+    return [
+        image_to_file(image, uploaded_image.name, multiplier)
+        for multiplier, image in enumerate(resize_and_crop_images(uploaded_image), start=1)
+    ]
+
+
+def derivative_formats(level):
+    '''
+    Formats configured in ASSET_DERIVATIVE_FORMATS for a level that the
+    installed Pillow can encode
+    '''
+    Image.init()
+    return [
+        format for format in settings.ASSET_DERIVATIVE_FORMATS.get(level, [])
+        if FORMATS[format]['pillow'] in Image.SAVE
+    ]
+
+
+def encode_image(image, filename, multiplier, format):
+    '''
+    Encode a derivative image in one of the FORMATS
+
+    Returns:
+        file(UploadedFile): the encoded image with its byte size
+    '''
+    name = {1: '', 2: '_medium', 3: '_low'}
+
+    if format == 'jpeg':
+        # JPEG has no alpha: flatten the transparent padding on white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+        image = background
+
+    return spooled_image(
+        image,
+        f"{os.path.basename(filename).split('.')[0]}{name[multiplier]}.{FORMATS[format]['extension']}",
+        FORMATS[format]['content_type'],
+        format=FORMATS[format]['pillow'], quality=settings.ASSET_DERIVATIVE_QUALITY[format],
     )
 
-    return uploaded_image
+
+def accepted_image_formats(accept):
+    '''
+    FORMATS a client accepts according to an Accept header.
+
+    Modern formats must be listed explicitly (image/webp, image/avif);
+    wildcards only stand for JPEG, which every client decodes.
+
+    Returns:
+        formats(set): names from FORMATS
+    '''
+    formats = set()
+
+    for media_range in accept.split(','):
+        media_type, *params = [part.strip() for part in media_range.split(';')]
+        params = dict(param.split('=', 1) for param in params if '=' in param)
+        try:
+            if float(params.get('q', 1)) == 0:
+                continue
+        except ValueError:
+            pass
+
+        if media_type in ('*/*', 'image/*'):
+            formats.add('jpeg')
+
+        for format, options in FORMATS.items():
+            if media_type == options['content_type']:
+                formats.add(format)
+
+    return formats
+
+
+def image_formats_key(request):
+    '''
+    Cache key variation of responses with asset URLs, which depend on the
+    image formats the client accepts
+    '''
+    return sorted(accepted_image_formats(request.META.get('HTTP_ACCEPT', '')))
+
+
+def content_hash(file, chunk_size=64 * 1024):
+    '''
+    SHA-256 of a file read in chunks; the file is rewound afterwards
+
+    Returns:
+        digest(str): hex digest
+    '''
+    digest = sha256()
+
+    file.seek(0)
+    for chunk in iter(lambda: file.read(chunk_size), b''):
+        digest.update(chunk)
+    file.seek(0)
+
+    return digest.hexdigest()
+
+
+def image_pixels(file):
+    '''
+    Pixel count read from the image header, without decoding it; the file
+    is rewound afterwards
+
+    Raises:
+        DecompressionBombError: past twice Image.MAX_IMAGE_PIXELS
+
+    Returns:
+        pixels(int): width * height, None when the file is not an image
+    '''
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            width, height = image.size
+    except OSError:
+        return None
+    finally:
+        file.seek(0)
+
+    return width * height
@@ -1,19 +1,33 @@
 from rest_framework import viewsets
 
+from core.cache import cache_response
+
 from .models import Asset, Banner, Spot
 from .serializers import (
     AssetSerializer,
     BannerSerializer,
     SpotWithBannersSerializer,
 )
+from .uploadhandlers import AssetUploadSizeHandler
+from .utils import image_formats_key
+
+
+class AssetUploadSizeMixin:
+    '''
+    Check the size of uploads before the other upload handlers spool them
+    '''
 
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers.insert(0, AssetUploadSizeHandler(request))
+        return super().initialize_request(request, *args, **kwargs)
 
-class AssetViewSet(viewsets.ModelViewSet):
-    queryset = Asset.objects.all()
+
+class AssetViewSet(AssetUploadSizeMixin, viewsets.ModelViewSet):
+    queryset = Asset.objects.prefetch_related('derivatives')
     serializer_class = AssetSerializer
 
 
-class BannerViewSet(viewsets.ModelViewSet):
+class BannerViewSet(AssetUploadSizeMixin, viewsets.ModelViewSet):
     queryset = Banner.objects.all()
     serializer_class = BannerSerializer
 
@@ -22,3 +36,11 @@ class SpotViewSet(viewsets.ModelViewSet):
     queryset = Spot.objects.all()
     serializer_class = SpotWithBannersSerializer
     filterset_fields = ['location']
+
+    @cache_response('spots', vary=image_formats_key)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response('spots', vary=image_formats_key)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
@@ -1,13 +1,14 @@
 from django.dispatch import receiver
-from .tasks import send_email_password
+from core.notifications import notify
 
 from django_rest_passwordreset.signals import reset_password_token_created
 
 
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, *args, **kwargs):
-    send_email_password.delay(
-        "Recuperação de senha",
-        reset_password_token.key,
-        reset_password_token.user.email,
+    notify(
+        email=reset_password_token.user.email,
+        subject="Recuperação de senha",
+        message=f'Informe o seguinte código para redefinir sua senha: {reset_password_token.key}',
+        key=f'password-reset:{reset_password_token.id}',
     )
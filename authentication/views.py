@@ -5,7 +5,9 @@ from rest_framework.generics import UpdateAPIView
 from rest_framework_simplejwt.views import TokenViewBase
 from rest_framework.permissions import IsAuthenticated
 
-from checkout.models import Credit
+from checkout.models import Credit, GatewayUser
+from core.dispatch import enqueue
+from checkout.tasks import provision_gateway_user
 
 from .utils import have_conditions_to_register_user
 
@@ -52,7 +54,9 @@ class UserViewSet(viewsets.ModelViewSet):
         user = User.objects.get(email=request.data['email'])
 
         Credit.objects.create(user=user)
-        gateway.create_customer(user=user, address=address)
+        # the gateway customer is created by a task, off the signup request
+        GatewayUser.objects.create(gateway=gateway._gateway, user=user)
+        enqueue(provision_gateway_user, user.id)
 
         return return_data
 
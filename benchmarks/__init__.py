@@ -0,0 +1,11 @@
+"""
+Benchmarks for the hot paths of the API.
+
+Each module is a standalone script meant to be run from the project root with
+the same environment as ``manage.py test``, e.g.::
+
+    python -m benchmarks.places_near
+
+Scripts build a throwaway test database, seed it with synthetic data and print
+their timings; they never touch the configured database.
+"""
@@ -0,0 +1,43 @@
+"""
+Derivative bytes per format over a synthetic photo corpus.
+
+    python -m benchmarks.asset_formats [images]
+
+Encodes the high, medium and low derivatives of each image as PNG (the
+file_high/medium/low fields) and in every format derivative_formats() enables,
+then prints total bytes per level and the savings against PNG.
+No database is needed.
+"""
+import sys
+
+from benchmarks.asset_resize import corpus
+
+
+def main():
+    from asset.utils import derivative_formats, encode_image, image_to_file, resize_and_crop_images
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    totals = {}
+
+    for _, buffer in corpus(total):
+        buffer.seek(0)
+        for level, image in enumerate(resize_and_crop_images(buffer), start=1):
+            sizes = totals.setdefault(level, {})
+            png = image_to_file(image, buffer.name, level)
+            sizes['png'] = sizes.get('png', 0) + png.size
+
+            for format in derivative_formats(level):
+                sizes[format] = sizes.get(format, 0) + encode_image(image, buffer.name, level, format).size
+
+    print(f'{total} synthetic photos')
+    for level, sizes in totals.items():
+        png = sizes['png']
+        line = ', '.join(
+            f'{format} {size / 1024:.0f} KiB ({100 * (1 - size / png):.0f}% smaller)'
+            for format, size in sizes.items() if format != 'png'
+        )
+        print(f'level {level}: png {png / 1024:.0f} KiB, {line}')
+
+
+if __name__ == '__main__':
+    main()
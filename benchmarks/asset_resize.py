@@ -0,0 +1,72 @@
+"""
+Derivative generation over a corpus of synthetic 12MP photos.
+
+    python -m benchmarks.asset_resize [images]
+
+Compares the legacy chain (resize_and_crop_file for the high size, then again
+on its PNG output for medium and low) with resize_and_crop_sizes, which
+decodes once (at a reduced scale for JPEGs) and cascades the sizes.
+No database is needed.
+"""
+import sys
+from io import BytesIO
+
+from benchmarks.utils import measure, report
+
+
+def corpus(total):
+    from PIL import Image
+
+    images = []
+    shapes = [(4000, 3000, 'JPEG'), (3000, 4000, 'JPEG'), (4000, 3000, 'PNG')]
+
+    for index in range(total):
+        width, height, format = shapes[index % len(shapes)]
+        # coarse colour blobs survive downscaling like real scenes do, the
+        # fine grain stands in for sensor noise
+        bands = [
+            Image.effect_noise((width // 50, height // 50), 96 + 8 * band).resize((width, height), Image.BICUBIC)
+            for band in range(3)
+        ]
+        image = Image.merge('RGB', bands)
+        grain = Image.effect_noise((width, height), 24 + index).convert('RGB')
+        image = Image.blend(image, grain, 0.15)
+
+        buffer = BytesIO()
+        image.save(buffer, format=format, quality=90)
+        buffer.name = f'photo{index}.{format.lower()}'
+        images.append((format, buffer))
+
+    return images
+
+
+def main():
+    from asset.utils import resize_and_crop_sizes
+    from benchmarks.legacy_resize import resize_and_crop_file
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    images = corpus(total)
+
+    def legacy(buffer):
+        buffer.seek(0)
+        file_high = resize_and_crop_file(buffer, multiplier=1)
+        return [file_high, resize_and_crop_file(file_high, multiplier=2), resize_and_crop_file(file_high, multiplier=3)]
+
+    def single_decode(buffer):
+        buffer.seek(0)
+        return resize_and_crop_sizes(buffer)
+
+    print(f'{total} synthetic 12MP images')
+    for format in ('JPEG', 'PNG'):
+        buffers = [buffer for image_format, buffer in images if image_format == format]
+        if not buffers:
+            continue
+
+        for label, func in (('legacy chain', legacy), ('resize_and_crop_sizes', single_decode)):
+            timing = measure(lambda: [func(buffer) for buffer in buffers], repeat=3)
+            per_image = {key: value / len(buffers) for key, value in timing.items()}
+            report(f'{format} {label}, per image', per_image)
+
+
+if __name__ == '__main__':
+    main()
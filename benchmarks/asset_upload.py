@@ -0,0 +1,77 @@
+"""
+Latency of the asset upload request.
+
+    python -m benchmarks.asset_upload [width height]
+
+POSTs a synthetic photo (12MP by default) to /api/asset/assets/ and times the
+request when the derivatives are:
+
+* legacy: resized in the request, chaining resize_and_crop_file three times
+  like Asset.save used to
+* inline: generated in the request by the generate_derivatives task
+* queued: left to the Celery worker (the request only enqueues the task)
+"""
+import sys
+import tempfile
+from unittest import mock
+
+from benchmarks.utils import measure, report, test_database
+
+
+def synthetic_photo(width, height):
+    from PIL import Image
+
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    noise = Image.effect_noise((width, height), 64).convert('RGB')
+    image = Image.blend(image, noise, 0.5)
+
+    tmp_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+    image.save(tmp_file, format='jpeg', quality=90)
+    return tmp_file
+
+
+def legacy_derivatives(asset_id):
+    from asset.models import Asset
+    from benchmarks.legacy_resize import resize_and_crop_file
+
+    asset = Asset.objects.get(id=asset_id)
+    with asset.file_original.open('rb') as source:
+        file_high = resize_and_crop_file(source, multiplier=1)
+        file_medium = resize_and_crop_file(file_high, multiplier=2)
+        file_low = resize_and_crop_file(file_high, multiplier=3)
+
+    asset.file_high, asset.file_medium, asset.file_low = file_high, file_medium, file_low
+    for field in ('file_high', 'file_medium', 'file_low'):
+        getattr(asset, field).save(getattr(asset, field).name, getattr(asset, field).file, save=False)
+    asset.status = 2
+    asset.save(update_fields=['file_high', 'file_medium', 'file_low', 'status'])
+
+
+def main():
+    width, height = (int(value) for value in sys.argv[1:3]) if len(sys.argv) > 2 else (4000, 3000)
+
+    with test_database():
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        from asset.tasks import generate_derivatives
+
+        photo = synthetic_photo(width, height)
+        client = APIClient()
+
+        def upload():
+            photo.seek(0)
+            response = client.post('/api/asset/assets/', {'file_high': photo}, format='multipart')
+            assert response.status_code == 201, response.data
+
+        print(f'{width}x{height} JPEG upload')
+        with override_settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            with mock.patch.object(generate_derivatives, 'delay', legacy_derivatives):
+                report('legacy (3 chained resizes in request)', measure(upload))
+            with mock.patch.object(generate_derivatives, 'delay', generate_derivatives):
+                report('inline generate_derivatives', measure(upload))
+            with mock.patch.object(generate_derivatives, 'delay'):
+                report('queued to Celery', measure(upload))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Replay of a burst of Pagar.me webhooks.
+
+    python -m benchmarks.checkout_webhooks [orders]
+
+Seeds 1000 pending credit orders by default and replays their events
+shuffled, with a third of the deliveries sent twice. Most orders are paid,
+one in ten is paid and later canceled (the cancel of a paid order is
+ignored) and one in ten is only canceled. The deliveries are timed when the
+events are:
+
+* inline: applied in the request, like the webhook views used to
+* queued: only stored in the inbox, then applied by draining the queued
+  process_pagarme_webhooks calls
+
+Both runs are checked afterwards: each order credited at most once, in the
+order its events happened, and the balances match the ledger.
+"""
+import base64
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from benchmarks.utils import measure, report, test_database
+
+AUTHORIZATION = 'Basic ' + base64.b64encode(b'pagarme:secret').decode()
+
+
+def seed(prefix, total):
+    from model_bakery import baker
+    from authentication.models import User
+    from checkout.models import Credit, CreditOrder, CreditPack, Gateway, GatewayCreditOrder, PaymentMethod
+
+    gateway = Gateway.objects.first() or baker.make('checkout.Gateway')
+    credit_pack = CreditPack.objects.first() or baker.make('checkout.CreditPack', price=10)
+    payment_method = PaymentMethod.objects.first() or baker.make('checkout.PaymentMethod')
+    users = User.objects.bulk_create(baker.prepare('authentication.User', _quantity=total))
+    Credit.objects.bulk_create([Credit(user=user) for user in users])
+
+    credit_orders = CreditOrder.objects.bulk_create([
+        CreditOrder(user=user, credit_pack=credit_pack, payment_method=payment_method, status=1)
+        for user in users
+    ])
+    GatewayCreditOrder.objects.bulk_create([
+        GatewayCreditOrder(gateway=gateway, credit_order=credit_order, credit_order_on_gateway_id=f'{prefix}_{index}')
+        for index, credit_order in enumerate(credit_orders)
+    ])
+
+    return [f'{prefix}_{index}' for index in range(total)]
+
+
+def replay_stream(order_ids, seed=0):
+    '''
+    Returns:
+        deliveries(list): (url name, body) pairs, shuffled, some repeated
+        expected(dict): final status of each order once every event is applied
+    '''
+    randomizer = random.Random(seed)
+    start = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+    events, expected = [], {}
+
+    for index, order_id in enumerate(order_ids):
+        paid_at = start + timedelta(seconds=index)
+        kind = index % 10
+        if kind != 9:
+            events.append(('pagarme-webhook-order-paid-webhook', {
+                'id': f'hook_paid_{order_id}', 'created_at': paid_at.isoformat(), 'data': {'id': order_id},
+            }))
+        if kind in (8, 9):
+            canceled_at = paid_at + timedelta(minutes=1)
+            events.append(('pagarme-webhook-order-canceled-webhook', {
+                'id': f'hook_canceled_{order_id}', 'created_at': canceled_at.isoformat(), 'data': {'id': order_id},
+            }))
+        expected[order_id] = 3 if kind == 9 else 2
+
+    deliveries = events + randomizer.sample(events, len(events) // 3)
+    randomizer.shuffle(deliveries)
+    return deliveries, expected
+
+
+def arrival_statuses(deliveries):
+    '''
+    Final status of each order when its events are applied as they arrive:
+    the first event wins, a later one finds the order out of its reach
+    '''
+    statuses = {}
+    for url_name, body in deliveries:
+        statuses.setdefault(body['data']['id'], 2 if url_name.endswith('-paid-webhook') else 3)
+    return statuses
+
+
+def check(order_ids, deliveries, expected):
+    from django.db.models import Sum
+    from checkout.models import Credit, CreditOrder, CreditTransaction, PagarmeWebhookEvent
+
+    events = PagarmeWebhookEvent.objects.filter(credit_order_on_gateway_id__in=order_ids)
+    assert events.count() == len({body['id'] for _, body in deliveries}), 'an event was stored twice'
+    assert not events.filter(status=1).exists(), 'an event was left pending'
+
+    credit_orders = CreditOrder.objects.filter(gatewaycreditorder__credit_order_on_gateway_id__in=order_ids)
+    statuses = dict(credit_orders.values_list('gatewaycreditorder__credit_order_on_gateway_id', 'status'))
+    assert statuses == expected, 'an order ended in the wrong status'
+
+    purchases = CreditTransaction.objects.filter(kind=2, credit_order__in=credit_orders)
+    assert purchases.values('credit_order').distinct().count() == purchases.count(), 'an order was credited twice'
+    assert purchases.count() == sum(1 for status in expected.values() if status == 2), 'a paid order was not credited'
+
+    users = credit_orders.values('user')
+    balances = Credit.objects.filter(user__in=users).aggregate(total=Sum('amount'))['total']
+    assert balances == purchases.aggregate(total=Sum('amount'))['total'], 'balances drifted from the ledger'
+
+
+def replay(client, deliveries):
+    from django.urls import reverse
+
+    pending = iter(deliveries)
+
+    def deliver():
+        url_name, body = next(pending)
+        response = client.post(reverse(f'checkout_urls:{url_name}'), body, format='json', HTTP_AUTHORIZATION=AUTHORIZATION)
+        assert response.status_code == 200, response.data
+
+    return measure(deliver, repeat=len(deliveries))
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    with test_database():
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        from checkout.tasks import process_pagarme_webhooks
+        from checkout.webhooks import process_webhook_events
+        from core.tasks import flush_notifications
+
+        client = APIClient()
+        # the e-mails stay in the outbox, the notification worker isn't timed
+        with override_settings(PAGARME_WEBHOOK_USERNAME='pagarme', PAGARME_WEBHOOK_PASSWORD='secret'), \
+                mock.patch.object(flush_notifications, 'delay'):
+            order_ids = seed('inline', total)
+            deliveries, expected = replay_stream(order_ids)
+            print(f'{len(deliveries)} deliveries of {len({body["id"] for _, body in deliveries})} events for {total} orders')
+
+            with mock.patch.object(process_pagarme_webhooks, 'delay', process_webhook_events):
+                inline = replay(client, deliveries)
+            report('inline (applied in the request)', inline)
+            # applied as they arrive, the first event of an order decides it
+            check(order_ids, deliveries, arrival_statuses(deliveries))
+
+            order_ids = seed('queued', total)
+            deliveries, expected = replay_stream(order_ids)
+
+            with mock.patch.object(process_pagarme_webhooks, 'delay') as delay:
+                queued = replay(client, deliveries)
+            report('queued (stored in the inbox)', queued)
+
+            drain = iter(dict.fromkeys(call.args[0] for call in delay.call_args_list))
+            drained = measure(lambda: process_webhook_events(next(drain)), repeat=total)
+            report('worker, per order', drained)
+            check(order_ids, deliveries, expected)
+
+        for label, timing in (('inline', inline), ('queued', queued)):
+            print(f'{label:<10} {60000 / timing["median_ms"]:>10.0f} webhooks/min per worker process')
+
+
+if __name__ == '__main__':
+    main()
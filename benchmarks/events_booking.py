@@ -0,0 +1,74 @@
+"""
+Double-booking checks as a place accumulates bookings.
+
+    python -m benchmarks.events_booking [bookings ...]
+
+Times events.utils.booked_dates() (a lookup on the unique (place_ads, date)
+index) against scanning the accepted orders' dates_selected arrays, for a
+place with 1k, 10k and 100k booked days by default.
+"""
+import sys
+from datetime import date, datetime, timedelta
+
+from benchmarks.utils import measure, report, test_database
+
+
+def seed(place_ads, user, total):
+    from django.db import connection
+    from events.models import Booking, EventOrder
+
+    batch_size = 5000
+    created = Booking.objects.filter(place_ads=place_ads).count()
+    first_day = date(2000, 1, 1)
+
+    for start in range(created, total, batch_size):
+        days = [first_day + timedelta(days=offset) for offset in range(start, min(start + batch_size, total))]
+        event_orders = EventOrder.objects.bulk_create([
+            EventOrder(
+                user=user,
+                place_ads=place_ads,
+                dates_selected=[datetime.combine(day, datetime.min.time())],
+                title='Evento sintético',
+                description='Benchmark',
+                price=200,
+                status=2,
+                plan_type=1,
+            )
+            for day in days
+        ])
+        Booking.objects.bulk_create([
+            Booking(event_order=event_order, place_ads=place_ads, date=day)
+            for event_order, day in zip(event_orders, days)
+        ])
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [1000, 10000, 100000]
+
+    with test_database():
+        from model_bakery import baker
+        from events.models import EventOrder
+        from events.utils import booked_dates
+
+        user = baker.make('authentication.User')
+        place_ads = baker.make('places.PlaceAds')
+        requested = [date(2000, 1, 1) + timedelta(days=offset) for offset in (10, 500, 5000)]
+
+        for total in sorted(sizes):
+            seed(place_ads, user, total)
+            print(f'{total} bookings on one place')
+
+            report('booked_dates() on the unique index', measure(lambda: booked_dates(place_ads, requested)))
+
+            requested_datetimes = [datetime.combine(day, datetime.min.time()) for day in requested]
+            array_scan = EventOrder.objects.filter(
+                place_ads=place_ads, status=2, dates_selected__overlap=requested_datetimes,
+            )
+            report('dates_selected overlap scan', measure(lambda: list(array_scan.values_list('dates_selected', flat=True))))
+
+
+if __name__ == '__main__':
+    main()
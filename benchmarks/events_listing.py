@@ -0,0 +1,127 @@
+"""
+Listing the event orders a place owner is involved in.
+
+    python -m benchmarks.events_listing [ads] [orders] [background]
+
+Seeds one owner with 500 ads and 50k orders received on them (plus a few
+hundred placed as a guest elsewhere), among 200k orders between other users,
+and times COUNT(*) and the newest page of 20 for the owner and for a user
+with a single order:
+
+* with the OR across the join with places,
+  ``Q(user=user) | Q(place_ads__user=user)``
+* with the union of the ids of the two indexed lookups
+* with ``EventOrder.objects.involving(user)``, the OR on the denormalized
+  owner column
+
+and GET /api/events/event-orders/ for the owner at offset 0 and with ?cursor=.
+"""
+import sys
+from datetime import datetime, timedelta
+
+from benchmarks.utils import measure, report, test_database
+
+
+def seed(ads, orders, background):
+    from django.db import connection
+    from model_bakery import baker
+    from events.models import EventOrder
+    from places.models import PlaceAds
+
+    owner = baker.make('authentication.User')
+    guests = baker.make('authentication.User', _quantity=50)
+    address = baker.make('places.Address')
+
+    def place_ads(user, total):
+        return PlaceAds.objects.bulk_create([
+            PlaceAds(
+                user=user, address=address, place_title=f'Casa {index}', place_description='Casa sintética',
+                local_type=index % 4 + 1, capacity=10, status=1,
+            )
+            for index in range(total)
+        ])
+
+    owned = place_ads(owner, ads)
+    others = [place for guest in guests for place in place_ads(guest, 10)]
+
+    def make_orders(pairs):
+        batch = []
+        for user, place in pairs:
+            batch.append(EventOrder(
+                user=user, place_ads=place, owner_id=place.user_id, dates_selected=[datetime(2021, 1, 1)], title='Aniversário',
+                description='Festa sintética', price=200, plan_type=1,
+            ))
+            if len(batch) == 10000:
+                EventOrder.objects.bulk_create(batch)
+                batch = []
+        EventOrder.objects.bulk_create(batch)
+
+    make_orders((guests[index % len(guests)], owned[index % len(owned)]) for index in range(orders))
+    make_orders((owner, others[index % len(others)]) for index in range(orders // 100))
+    make_orders(
+        (guests[index % len(guests)], others[(index * 7) % len(others)]) for index in range(background)
+    )
+
+    # interleave the creation dates of every kind of order
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE events_eventorder SET created_at = %s + (id * 7919 %% 1000003) * interval \'1 second\'',
+            [datetime(2021, 1, 1) - timedelta(days=30)],
+        )
+        cursor.execute('ANALYZE')
+
+    light = baker.make('authentication.User')
+    baker.make('events.EventOrder', user=light, place_ads=others[0])
+
+    return owner, light
+
+
+def main():
+    ads = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    orders = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+    background = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+
+    with test_database():
+        from django.db.models import Q
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        from events.models import EventOrder
+
+        owner, light = seed(ads, orders, background)
+        print(f'owner with {ads} ads and {orders} orders received, {background} other orders')
+
+        for name, user in (('owner', owner), ('single order', light)):
+            placed = EventOrder.objects.filter(user=user).values('id')
+            received = EventOrder.objects.filter(place_ads__user=user).values('id')
+            querysets = {
+                'OR join': EventOrder.objects.filter(Q(user=user) | Q(place_ads__user=user)),
+                'union': EventOrder.objects.filter(id__in=placed.union(received)),
+                'involving': EventOrder.objects.involving(user),
+            }
+            assert len({queryset.count() for queryset in querysets.values()}) == 1
+
+            for label, queryset in querysets.items():
+                report(f'{name}, {label}, count', measure(queryset.count))
+            for label, queryset in querysets.items():
+                def first_page():
+                    return list(queryset.order_by('-created_at', '-id')[:20])
+                report(f'{name}, {label}, first page', measure(first_page))
+
+        client = APIClient()
+        client.force_authenticate(owner)
+
+        def get(params):
+            def request():
+                response = client.get('/api/events/event-orders/', params, format='json')
+                assert response.status_code == 200, response.data
+                assert len(response.data['results']) == 20
+            return request
+
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            report('API, limit/offset', measure(get({})))
+            report('API, count=false', measure(get({'count': 'false'})))
+            report('API, cursor', measure(get({'cursor': ''})))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+The resize chain assets used before resize_and_crop_sizes: one decode,
+square and resize per derivative. Kept as the baseline of the asset
+benchmarks.
+"""
+from PIL import Image
+
+from asset.utils import DIMENSIONS, image_to_file
+
+
+def make_square(im, min_size=266, fill_color=(255, 255, 255, 0)):
+    x, y = im.size
+    size = max(min_size, x, y)
+    new_im = Image.new('RGBA', (size, size), fill_color)
+    new_im.paste(im, (int((size - x)/2), int((size - y)/2)))
+    return new_im
+
+
+def resize_and_crop_file(uploaded_image, multiplier=1):
+    img_temp = make_square(Image.open(uploaded_image))
+    return resize_square(img_temp, uploaded_image.name, multiplier)
+
+
+def resize_square(img_temp, filename, multiplier=1):
+    dimension = DIMENSIONS[multiplier-1]
+
+    img_temp_resized = img_temp.resize(
+        (dimension, dimension), Image.ANTIALIAS
+    )
+
+    return image_to_file(img_temp_resized, filename, multiplier)
@@ -0,0 +1,88 @@
+"""
+Page latency of GET /api/places/places-ads/ near the start and deep into the
+listing.
+
+    python -m benchmarks.listing_pagination [ads] [depth]
+
+Seeds 150k ads by default and requests the page at offset 0 and at offset
+100k, newest first, with:
+
+* limit/offset (the default, with its COUNT(*))
+* limit/offset with ?count=false
+* ?cursor= keyset pages on (created_at, id), the deep one resumed from the
+  cursor of the row before it
+
+The response cache is disabled so every request reaches the database.
+"""
+import sys
+from datetime import datetime
+
+from benchmarks.utils import measure, report, test_database
+
+
+def seed(total):
+    from django.db import connection
+    from model_bakery import baker
+    from places.models import PlaceAds
+
+    user = baker.make('authentication.User')
+    address = baker.make('places.Address')
+    start = datetime(2020, 1, 1)
+
+    batch_size = 10000
+    for first in range(0, total, batch_size):
+        PlaceAds.objects.bulk_create([
+            PlaceAds(
+                user=user, address=address, place_title=f'Casa {index}', place_description='Casa sintética',
+                local_type=index % 4 + 1, capacity=10, status=1,
+            )
+            for index in range(first, min(first + batch_size, total))
+        ])
+
+    # spread the creation dates, a few seconds apart, some sharing a second
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE places_placeads SET created_at = %s + (id / 2) * interval \'7 seconds\'', [start],
+        )
+        cursor.execute('ANALYZE')
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 150000
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+    with test_database():
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        from core.pagination import ListingPagination
+        from places.models import PlaceAds
+
+        seed(total)
+        client = APIClient()
+        client.force_authenticate(PlaceAds.objects.first().user)
+        url = '/api/places/places-ads/'
+
+        before_deep_page = PlaceAds.objects.order_by('-created_at', '-id')[depth - 1]
+        pagination = ListingPagination()
+        pagination.cursor_field = 'created_at'
+        deep_cursor = pagination.encode_cursor(before_deep_page)
+
+        def get(params):
+            def request():
+                response = client.get(url, params, format='json')
+                assert response.status_code == 200, response.data
+                assert len(response.data['results']) == 20
+            return request
+
+        print(f'{total} ads, page of 20 at offset 0 and {depth}')
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            for offset in (0, depth):
+                params = {'ordering': '-created_at', 'offset': offset}
+                report(f'limit/offset, offset {offset}', measure(get(params)))
+                report(f'limit/offset count=false, offset {offset}', measure(get({**params, 'count': 'false'})))
+            report('cursor, first page', measure(get({'cursor': ''})))
+            report(f'cursor, page after row {depth}', measure(get({'cursor': deep_cursor})))
+
+
+if __name__ == '__main__':
+    main()
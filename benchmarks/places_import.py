@@ -0,0 +1,69 @@
+"""
+Catalog import and export throughput.
+
+    python -m benchmarks.places_import [ads] [batch_size]
+
+Writes a synthetic NDJSON catalog (100k ads with two plans each by default),
+loads it with manage.py import_places and writes it back with
+export_places, printing the rows/s of both.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from io import StringIO
+
+from benchmarks.utils import test_database
+
+
+def write_catalog(path, total, user_id):
+    with open(path, 'w') as file:
+        for index in range(total):
+            file.write(json.dumps({
+                'user': user_id,
+                'place_title': f'Casa {index}',
+                'place_description': 'Casa com piscina e churrasqueira perto da praia',
+                'local_type': index % 4 + 1,
+                'capacity': 10 + index % 50,
+                'address': {
+                    'map_string': f'Rua {index}', 'reference': 'Perto da praça', 'cep': '84268660',
+                    'latitude': -23.5 + index % 1000 / 1000, 'longitude': -46.6 + index % 700 / 1000,
+                },
+                'plans': [
+                    {'week_days': [0, 1, 2, 3, 4], 'plan_type': 1, 'name': 'Diária', 'price': 200},
+                    {'week_days': [5, 6], 'plan_type': 2, 'name': 'Fim de semana', 'price': 500},
+                ],
+            }) + '\n')
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    with test_database():
+        from django.core.management import call_command
+        from model_bakery import baker
+        from places.models import WeekDay
+
+        for day in range(7):
+            WeekDay.objects.create(day=day)
+        user = baker.make('authentication.User')
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'catalog.ndjson')
+        write_catalog(path, total, user.id)
+
+        start = time.perf_counter()
+        call_command('import_places', path, batch_size=batch_size, stdout=StringIO())
+        elapsed = time.perf_counter() - start
+        print(f'import_places: {total} ads in {elapsed:.1f}s ({total / elapsed:.0f} rows/s, batches of {batch_size})')
+
+        start = time.perf_counter()
+        call_command('export_places', os.path.join(directory, 'export.ndjson'), batch_size=batch_size, stdout=StringIO())
+        elapsed = time.perf_counter() - start
+        print(f'export_places: {total} ads in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Radius search over synthetic addresses.
+
+    python -m benchmarks.places_near [addresses]
+
+Compares PlaceAds.objects.near() (bounding box on the indexed lat/lng columns
+followed by the exact haversine check) against computing the haversine
+distance for every row.
+"""
+import random
+import sys
+
+from benchmarks.utils import measure, report, test_database
+
+
+def seed(total):
+    from model_bakery import baker
+    from places.models import Address, PlaceAds
+
+    random.seed(42)
+    user = baker.make('authentication.User')
+    batch_size = 5000
+
+    for start in range(0, total, batch_size):
+        addresses = Address.objects.bulk_create([
+            Address(
+                map_string='Rua sintética',
+                reference='Benchmark',
+                cep='59000000',
+                latitude=random.uniform(-10.0, -3.0),
+                longitude=random.uniform(-41.0, -34.5),
+            )
+            for _ in range(min(batch_size, total - start))
+        ])
+        PlaceAds.objects.bulk_create([
+            PlaceAds(
+                user=user,
+                address=address,
+                place_title='Anúncio sintético',
+                place_description='Benchmark',
+                local_type=1,
+                capacity=10,
+            )
+            for address in addresses
+        ])
+
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    with test_database():
+        from places.models import PlaceAds, distance_from
+
+        seed(total)
+        print(f'{total} addresses')
+
+        latitude, longitude = -5.7945, -35.2110
+        for radius_km in (5, 25, 100):
+            near = PlaceAds.objects.near(latitude, longitude, radius_km)
+            full_scan = PlaceAds.objects.annotate(
+                distance_km=distance_from(latitude, longitude),
+            ).filter(distance_km__lte=radius_km).order_by('distance_km')
+
+            count = near.count()
+            assert count == full_scan.count()
+
+            report(f'near() radius {radius_km} km ({count} ads), first page', measure(lambda: list(near[:20])))
+            report(f'haversine full scan radius {radius_km} km, first page', measure(lambda: list(full_scan[:20])))
+
+
+if __name__ == '__main__':
+    main()
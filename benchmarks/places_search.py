@@ -0,0 +1,90 @@
+"""
+Full-text search over synthetic ads.
+
+    python -m benchmarks.places_search [ads ...]
+
+Compares the ranked search on the GIN-indexed PlaceAds.search_vector against
+the ``icontains`` (ILIKE '%term%') lookups SearchFilter builds, for each
+catalog size (10k and 100k by default; pass 1000000 for the large run).
+"""
+import random
+import sys
+
+from benchmarks.utils import measure, report, test_database
+
+WORDS = [
+    'casa', 'praia', 'piscina', 'churrasqueira', 'sítio', 'chácara', 'lancha', 'passeio', 'rio',
+    'lagoa', 'mar', 'vista', 'jardim', 'quadra', 'salão', 'festa', 'campo', 'serra', 'varanda',
+    'cozinha', 'gourmet', 'família', 'amigos', 'aniversário', 'casamento', 'barco', 'trilha',
+]
+# long tail of rarer words so term frequencies look like a real catalog
+WORDS += [f'{word}{suffix}' for suffix in ('ense', 'eiro', 'ário', 'ista') for word in WORDS]
+WORDS += [f'palavra{index}' for index in range(5000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(WORDS))]
+
+
+def sentence(size):
+    return ' '.join(random.choices(WORDS, WEIGHTS, k=size))
+
+
+def seed(total, user, address):
+    from django.db import connection
+    from places.models import PlaceAds
+
+    batch_size = 5000
+    created = PlaceAds.objects.count()
+
+    for start in range(created, total, batch_size):
+        PlaceAds.objects.bulk_create([
+            PlaceAds(
+                user=user,
+                address=address,
+                place_title=sentence(4),
+                place_description=sentence(30),
+                local_type=1,
+                capacity=10,
+            )
+            for _ in range(min(batch_size, total - start))
+        ])
+
+    PlaceAds.objects.filter(search_vector__isnull=True).update_search_vector()
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10000, 100000]
+
+    with test_database():
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        from django.db.models import F, Q
+        from model_bakery import baker
+        from places.models import SEARCH_CONFIG, PlaceAds
+
+        random.seed(42)
+        user = baker.make('authentication.User')
+        address = baker.make('places.Address')
+
+        for total in sorted(sizes):
+            seed(total, user, address)
+            print(f'{total} ads')
+
+            for term in ('casa', 'casamento serra', 'palavra4321'):
+                query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+                full_text = PlaceAds.objects.filter(search_vector=query).annotate(
+                    search_rank=SearchRank(F('search_vector'), query),
+                ).order_by('-search_rank')
+
+                ilike = PlaceAds.objects.all()
+                for word in term.split():
+                    ilike = ilike.filter(Q(place_title__icontains=word) | Q(place_description__icontains=word))
+
+                report(f'full text "{term}" ({full_text.count()} ads), first page', measure(lambda: list(full_text[:20])))
+                report(f'full text "{term}", count', measure(full_text.count))
+                report(f'ilike "{term}" ({ilike.count()} ads), first page', measure(lambda: list(ilike[:20])))
+                report(f'ilike "{term}", count', measure(ilike.count))
+
+
+if __name__ == '__main__':
+    main()
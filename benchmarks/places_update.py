@@ -0,0 +1,107 @@
+"""
+Updating the plans of an ad.
+
+    python -m benchmarks.places_update [plans]
+
+Times the plan part of PlaceAdsViewSet.update for an ad with 30 plans (every
+week day each) when the request keeps most plans, renames a few, changes the
+days of a few, drops a few and adds one:
+
+* legacy: the previous loop (a get, a week_days.set() and a save per plan,
+  then one delete per dropped plan)
+* sync_plans: the prefetched diff applied with bulk queries
+
+Each run is rolled back so both start from the same rows.
+"""
+import sys
+
+from benchmarks.utils import measure, report, test_database
+
+
+def legacy_update(place_ads, request_plans):
+    from places.models import Plan, WeekDay
+
+    plans = Plan.objects.filter(place_ads=place_ads)
+    new_plans_id = []
+    all_week_days_obj = WeekDay.objects.all()
+    for request_plan in request_plans:
+        try:
+            week_days_list = [all_week_days_obj.get(day=day).id for day in request_plan['week_days']]
+            plan = plans.get(id=request_plan['id'])
+            plan.plan_type = request_plan['plan_type']
+            plan.name = request_plan['name']
+            plan.price = request_plan['price']
+            plan.week_days.set(week_days_list)
+            plan.save()
+        except Exception:
+            plan = Plan.objects.create(
+                place_ads=place_ads,
+                plan_type=request_plan['plan_type'],
+                name=request_plan['name'],
+                price=request_plan['price'],
+            )
+            Plan.week_days.through.objects.bulk_create([
+                Plan.week_days.through(weekday_id=all_week_days_obj.get(day=day).id, plan_id=plan.id)
+                for day in request_plan['week_days']
+            ])
+        new_plans_id.append(plan.id)
+
+    for plan in plans:
+        if plan.id not in new_plans_id:
+            plan.delete()
+
+
+def request_plans(plans):
+    body = []
+    for index, plan in enumerate(plans):
+        if index % 10 == 9:
+            continue
+        body.append({
+            'id': plan.id,
+            'week_days': [0, 6] if index % 10 == 5 else list(range(7)),
+            'plan_type': plan.plan_type,
+            'name': f'Plano {index} editado' if index % 10 == 0 else plan.name,
+            'price': plan.price,
+        })
+    body.append({'week_days': [5, 6], 'plan_type': 2, 'name': 'Fim de semana', 'price': 300})
+    return body
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+
+    with test_database() as connection:
+        from django.db import transaction
+        from django.test.utils import CaptureQueriesContext
+        from model_bakery import baker
+        from places.models import PlaceAds, Plan, WeekDay
+        from places.utils import sync_plans, week_day_map
+
+        week_days = [WeekDay.objects.create(day=day) for day in range(7)]
+        place_ads = baker.make('places.PlaceAds')
+        plans = baker.make('places.Plan', place_ads=place_ads, plan_type=1, price=100, week_days=week_days, _quantity=total)
+        body = request_plans(sorted(plans, key=lambda plan: plan.id))
+        week_day_map()
+
+        def rolled_back(func):
+            def run():
+                with transaction.atomic():
+                    func()
+                    transaction.set_rollback(True)
+            return run
+
+        print(f'{total} plans, {len(body)} in the request')
+        runs = (
+            ('legacy', lambda: legacy_update(place_ads, body)),
+            ('sync_plans', lambda: sync_plans(PlaceAds.objects.for_listing().get(id=place_ads.id), body)),
+        )
+        for label, func in runs:
+            with CaptureQueriesContext(connection) as context:
+                rolled_back(func)()
+            report(f'{label} ({len(context)} queries)', measure(rolled_back(func)))
+
+        assert Plan.objects.filter(place_ads=place_ads).count() == total
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aluguel_api.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment, teardown_test_environment  # noqa: E402
+
+
+@contextmanager
+def test_database():
+    '''
+    Create the test database for the duration of the block.
+    '''
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=5):
+    '''
+    Run ``func`` ``repeat`` times
+
+    Returns:
+        timing(dict): median and best wall time in milliseconds
+    '''
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {'median_ms': statistics.median(timings), 'best_ms': min(timings)}
+
+
+def report(label, timing):
+    print(f"{label:<50} median {timing['median_ms']:>10.2f} ms   best {timing['best_ms']:>10.2f} ms")
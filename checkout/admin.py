@@ -1,8 +1,12 @@
 from django.contrib import admin
-from .models import Credit, CreditPack, Gateway, GatewayUser, PaymentMethod, Card, GatewayCard, CreditOrder, GatewayCreditOrder, PagarmeWebhook
+from .models import (
+    Credit, CreditPack, CreditTransaction, Gateway, GatewayUser, PaymentMethod, Card, GatewayCard, CreditOrder,
+    GatewayCreditOrder, PagarmeWebhook, PagarmeWebhookEvent,
+)
 
 
 admin.site.register(Credit)
+admin.site.register(CreditTransaction)
 admin.site.register(CreditPack)
 admin.site.register(Gateway)
 admin.site.register(GatewayUser)
@@ -11,4 +15,5 @@ admin.site.register(Card)
 admin.site.register(GatewayCard)
 admin.site.register(CreditOrder)
 admin.site.register(GatewayCreditOrder)
-admin.site.register(PagarmeWebhook)
\ No newline at end of file
+admin.site.register(PagarmeWebhook)
+admin.site.register(PagarmeWebhookEvent)
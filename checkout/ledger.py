@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Credit, CreditTransaction
+
+
+class InsufficientCredits(Exception):
+    def __init__(self):
+        super().__init__('Créditos insuficientes.')
+
+
+def post_credit_transaction(user, amount, kind, **references):
+    '''
+    Append a transaction to the ledger of the user and move the balance by
+    its amount, both in one database transaction. The balance moves with a
+    single UPDATE ... SET amount = amount + x, so concurrent requests queue
+    on the row lock instead of overwriting each other; a debit only applies
+    while the balance covers it.
+
+    Args:
+        user(User): owner of the credits
+        amount(Decimal): positive to credit, negative to debit
+        kind(int): one of CreditTransaction.KIND_CHOICES
+        references: credit_order or event_order of the transaction
+
+    Returns:
+        credit_transaction(CreditTransaction)
+
+    Raises:
+        InsufficientCredits: a debit larger than the balance
+        Credit.DoesNotExist: the user has no credit balance
+    '''
+    with transaction.atomic():
+        credits = Credit.objects.filter(user=user)
+        if amount < 0:
+            credits = credits.filter(amount__gte=-amount)
+
+        if not credits.update(amount=F('amount') + amount, modified=timezone.now()):
+            if amount < 0 and Credit.objects.filter(user=user).exists():
+                raise InsufficientCredits()
+            raise Credit.DoesNotExist('O usuário não possui créditos.')
+
+        return CreditTransaction.objects.create(user=user, amount=amount, kind=kind, **references)
+
+
+def ledger_balances():
+    '''
+    Credits annotated with ``ledger_amount``, the sum of the transactions of
+    their user
+    '''
+    total = (
+        CreditTransaction.objects.filter(user=OuterRef('user')).order_by()
+        .values('user').annotate(total=Sum('amount')).values('total')
+    )
+    return Credit.objects.annotate(
+        ledger_amount=Coalesce(Subquery(total), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2)),
+    )
+
+
+def rebuild_credit_balances(dry_run=False):
+    '''
+    Set every balance that drifted from its ledger back to the sum of the
+    ledger
+
+    Returns:
+        credits(list): the credits whose balance differed, with ``amount``
+            set to the ledger sum
+    '''
+    with transaction.atomic():
+        drifted = list(ledger_balances().select_for_update(of=('self',)).exclude(amount=F('ledger_amount')))
+        for credit in drifted:
+            credit.amount = credit.ledger_amount
+
+        if not dry_run:
+            Credit.objects.bulk_update(drifted, ['amount'])
+
+    return drifted
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from checkout.ledger import rebuild_credit_balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the credit balances from the credit transaction ledger, fixing the ones that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the drifted balances without changing them.')
+
+    def handle(self, *args, **options):
+        drifted = rebuild_credit_balances(dry_run=options['dry_run'])
+
+        for credit in drifted:
+            self.stdout.write(f'Credit {credit.id} of user {credit.user_id}: ledger sum {credit.amount}.')
+
+        action = 'would be rebuilt' if options['dry_run'] else 'rebuilt'
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} credit balances {action}.'))
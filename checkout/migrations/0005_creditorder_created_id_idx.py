@@ -0,0 +1,17 @@
+# Generated by Django 3.2.18 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0004_auto_20230413_2341'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creditorder',
+            index=models.Index(fields=['created', 'id'], name='creditorder_created_id_idx'),
+        ),
+    ]
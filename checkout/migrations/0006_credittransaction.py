@@ -0,0 +1,53 @@
+# Generated by Django 3.2.18 on 2026-10-18 23:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_ledgers(apps, schema_editor):
+    Credit = apps.get_model('checkout', 'Credit')
+    CreditTransaction = apps.get_model('checkout', 'CreditTransaction')
+
+    # the balances so far become the first entry of each ledger
+    CreditTransaction.objects.bulk_create([
+        CreditTransaction(user_id=credit.user_id, amount=credit.amount, kind=1)
+        for credit in Credit.objects.exclude(amount=0).iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('events', '0006_eventorder_owner'),
+        ('checkout', '0005_creditorder_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditTransaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Valor')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'opening'), (2, 'purchase'), (3, 'unlock')], verbose_name='Tipo')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Data de entrada')),
+                ('credit_order', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='checkout.creditorder', verbose_name='Pedido de crédito')),
+                ('event_order', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='events.eventorder', verbose_name='Evento')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credit_transactions', to=settings.AUTH_USER_MODEL, verbose_name='Cliente')),
+            ],
+            options={
+                'verbose_name': 'Transação de crédito',
+                'verbose_name_plural': 'Transações de crédito',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='credittransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 2)), fields=('credit_order',), name='credittransaction_unique_purchase'),
+        ),
+        migrations.AddConstraint(
+            model_name='credittransaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 3)), fields=('event_order',), name='credittransaction_unique_unlock'),
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
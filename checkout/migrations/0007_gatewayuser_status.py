@@ -0,0 +1,58 @@
+# Generated by Django 3.2.18 on 2026-10-18 23:30
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def drop_duplicate_gateway_users(apps, schema_editor):
+    GatewayUser = apps.get_model('checkout', 'GatewayUser')
+
+    # signups and card flows could register a user twice: keep the customer
+    # created on the gateway, the oldest one when several or none were
+    duplicated = (
+        GatewayUser.objects.order_by().values('gateway_id', 'user_id')
+        .annotate(rows=Count('id')).filter(rows__gt=1)
+    )
+    for pair in duplicated.iterator():
+        rows = GatewayUser.objects.filter(gateway_id=pair['gateway_id'], user_id=pair['user_id'])
+        keep = (
+            rows.exclude(user_on_gateway_id__isnull=True).exclude(user_on_gateway_id='').order_by('id').first()
+            or rows.order_by('id').first()
+        )
+        rows.exclude(id=keep.id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0006_credittransaction'),
+    ]
+
+    operations = [
+        # the customers created so far are ready
+        migrations.AddField(
+            model_name='gatewayuser',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'ready'), (3, 'failed'), (4, 'provisioning')], default=2, verbose_name='Situação'),
+        ),
+        migrations.AlterField(
+            model_name='gatewayuser',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'ready'), (3, 'failed'), (4, 'provisioning')], default=1, verbose_name='Situação'),
+        ),
+        migrations.AddField(
+            model_name='gatewayuser',
+            name='claimed',
+            field=models.DateTimeField(null=True, verbose_name='Início do cadastro na gateway'),
+        ),
+        migrations.AlterField(
+            model_name='gatewayuser',
+            name='user_on_gateway_id',
+            field=models.CharField(max_length=128, null=True, verbose_name='ID de usuário no Gateway'),
+        ),
+        migrations.RunPython(drop_duplicate_gateway_users, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='gatewayuser',
+            constraint=models.UniqueConstraint(fields=('gateway', 'user'), name='gatewayuser_unique_gateway_user'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.18 on 2026-10-18 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0007_gatewayuser_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PagarmeWebhookEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=60, unique=True, verbose_name='ID do evento no Pagarme')),
+                ('type', models.CharField(max_length=60, verbose_name='Tipo')),
+                ('credit_order_on_gateway_id', models.CharField(max_length=150, verbose_name='ID do pedido de crédito no Gateway')),
+                ('payload', models.JSONField(verbose_name='Conteúdo')),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'processed'), (3, 'ignored')], default=1, verbose_name='Situação')),
+                ('occurred', models.DateTimeField(verbose_name='Data do evento')),
+                ('received', models.DateTimeField(auto_now_add=True, verbose_name='Data de recebimento')),
+                ('processed', models.DateTimeField(null=True, verbose_name='Data de processamento')),
+            ],
+            options={
+                'verbose_name': 'Evento de Webhook do Pagarme',
+                'verbose_name_plural': 'Eventos de Webhook do Pagarme',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pagarmewebhookevent',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['credit_order_on_gateway_id', 'occurred', 'id'], name='webhookevent_pending_idx'),
+        ),
+    ]
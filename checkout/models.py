@@ -27,6 +27,44 @@ class Credit(models.Model):
         return f'{self.user.username}: {self.amount} créditos'
 
 
+class CreditTransaction(models.Model):
+    KIND_CHOICES = [
+        (1, 'opening'),     #saldo anterior ao extrato
+        (2, 'purchase'),    #compra de créditos
+        (3, 'unlock'),      #aceite de evento
+    ]
+
+    user = models.ForeignKey(
+        'authentication.User', verbose_name="Cliente", related_name='credit_transactions', on_delete=models.CASCADE,
+    )
+    amount = models.DecimalField(verbose_name="Valor", max_digits=10, decimal_places=2, null=False)
+    kind = models.PositiveSmallIntegerField(verbose_name='Tipo', choices=KIND_CHOICES, null=False)
+    credit_order = models.ForeignKey(
+        'checkout.CreditOrder', verbose_name='Pedido de crédito', on_delete=models.SET_NULL, null=True,
+    )
+    event_order = models.ForeignKey('events.EventOrder', verbose_name='Evento', on_delete=models.SET_NULL, null=True)
+    created = models.DateTimeField(verbose_name='Data de entrada', auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Transação de crédito"
+        verbose_name_plural = "Transações de crédito"
+        constraints = [
+            # a paid order is credited and an event unlocked once, whatever the retries
+            models.UniqueConstraint(
+                fields=['credit_order'], condition=models.Q(kind=2), name='credittransaction_unique_purchase',
+            ),
+            models.UniqueConstraint(fields=['event_order'], condition=models.Q(kind=3), name='credittransaction_unique_unlock'),
+        ]
+
+    def __str__(self):
+        return f'{self.id}: {self.user_id} {self.amount:+} ({self.get_kind_display()})'
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Credit transactions are append-only.')
+        super().save(*args, **kwargs)
+
+
 class CreditPack(models.Model):
     STATUS_CHOICES = [
         (1, "activated"),
@@ -62,6 +100,11 @@ class CreditOrder(models.Model):
     status = models.PositiveSmallIntegerField(verbose_name='Situação', choices=STATUS_CHOICES, null=False, default=1)
     created = models.DateTimeField(verbose_name='Data de entrada', auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created', 'id'], name='creditorder_created_id_idx'),
+        ]
+
 
 class GatewayCreditOrder(models.Model):
     gateway = models.ForeignKey('checkout.Gateway', verbose_name='Gateway', on_delete=models.PROTECT)
@@ -77,14 +120,26 @@ class GatewayCreditOrder(models.Model):
 
 
 class GatewayUser(models.Model):
+    STATUS_CHOICES = [
+        (1, 'pending'),     #aguardando cadastro na gateway
+        (2, 'ready'),       #cadastrado
+        (3, 'failed'),      #recusado pela gateway
+        (4, 'provisioning'),    #sendo cadastrado na gateway
+    ]
+
     gateway = models.ForeignKey('checkout.Gateway', verbose_name='Gateway', on_delete=models.PROTECT)
     user = models.ForeignKey('authentication.User', verbose_name='Usuário', on_delete=models.CASCADE)
-    user_on_gateway_id = models.CharField(verbose_name='ID de usuário no Gateway', max_length=128, null=False)
+    user_on_gateway_id = models.CharField(verbose_name='ID de usuário no Gateway', max_length=128, null=True)
     receiver_id = models.CharField(verbose_name='Conta do usuário no Gateway', max_length=150, null=True)
+    status = models.PositiveSmallIntegerField(verbose_name='Situação', choices=STATUS_CHOICES, null=False, default=1)
+    claimed = models.DateTimeField(verbose_name='Início do cadastro na gateway', null=True)
 
     class Meta:
         verbose_name = 'Usuário no Gateway'
         verbose_name_plural = 'Usuários no Gateway'
+        constraints = [
+            models.UniqueConstraint(fields=['gateway', 'user'], name='gatewayuser_unique_gateway_user'),
+        ]
 
     def __str__(self):
         return f'{self.id}: {self.user} - {self.gateway}'
@@ -144,4 +199,34 @@ class PagarmeWebhook(models.Model):
         verbose_name_plural = 'Pagarme Webhooks'
 
     def __str__(self):
-        return f'{self.id}: {self.pagarme_id} - {self.description}'
\ No newline at end of file
+        return f'{self.id}: {self.pagarme_id} - {self.description}'
+
+
+class PagarmeWebhookEvent(models.Model):
+    STATUS_CHOICES = [
+        (1, 'pending'),     #aguardando processamento
+        (2, 'processed'),   #aplicado ao pedido
+        (3, 'ignored'),     #o pedido já estava em outro estado
+    ]
+
+    event_id = models.CharField(verbose_name='ID do evento no Pagarme', max_length=60, unique=True)
+    type = models.CharField(verbose_name='Tipo', max_length=60, null=False)
+    credit_order_on_gateway_id = models.CharField(verbose_name='ID do pedido de crédito no Gateway', max_length=150, null=False)
+    payload = models.JSONField(verbose_name='Conteúdo', null=False)
+    status = models.PositiveSmallIntegerField(verbose_name='Situação', choices=STATUS_CHOICES, null=False, default=1)
+    occurred = models.DateTimeField(verbose_name='Data do evento', null=False)
+    received = models.DateTimeField(verbose_name='Data de recebimento', auto_now_add=True)
+    processed = models.DateTimeField(verbose_name='Data de processamento', null=True)
+
+    class Meta:
+        verbose_name = 'Evento de Webhook do Pagarme'
+        verbose_name_plural = 'Eventos de Webhook do Pagarme'
+        indexes = [
+            models.Index(
+                fields=['credit_order_on_gateway_id', 'occurred', 'id'], condition=models.Q(status=1),
+                name='webhookevent_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.id}: {self.event_id} - {self.type}'
@@ -1,6 +1,10 @@
-from rest_framework import permissions
+import base64
+import binascii
+import hmac
 
-from .models import PagarmeWebhook
+from django.conf import settings
+from rest_framework import permissions
+from rest_framework.authentication import get_authorization_header
 
 class CreditOrderPermisions(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -23,19 +27,31 @@ class CreditOrderPermisions(permissions.BasePermission):
                     return False
                 
 
+def is_pagarme_request(request):
+    '''
+    The request carries the HTTP Basic credentials configured for the
+    webhooks on the Pagar.me dashboard
+    '''
+    username, password = settings.PAGARME_WEBHOOK_USERNAME, settings.PAGARME_WEBHOOK_PASSWORD
+    if not username or not password:
+        return False
+
+    try:
+        scheme, credentials = get_authorization_header(request).split()
+        credentials = base64.b64decode(credentials, validate=True)
+    except (ValueError, binascii.Error):
+        return False
+
+    return scheme.lower() == b'basic' and hmac.compare_digest(credentials, f'{username}:{password}'.encode())
+
+
 class PagarmeWebhookPermission(permissions.BasePermission):
+    webhook_actions = ('order_paid_webhook', 'order_canceled_webhook')
+
     def has_permission(self, request, view):
         if request.user.is_superuser:
             return True
-        try:
-            return PagarmeWebhook.objects.get(pagarme_id=request.data['id'])
-        except:
-            return False
-        
+        return view.action in self.webhook_actions and is_pagarme_request(request)
+
     def has_object_permission(self, request, view, obj):
-        if request.user.is_superuser:
-            return True
-        try:
-            return PagarmeWebhook.objects.get(pagarme_id=request.data['id'])
-        except:
-            return False
\ No newline at end of file
+        return request.user.is_superuser
@@ -1,11 +1,27 @@
 import json
+import logging
+import os
+import time
+from collections import deque, namedtuple
+
 import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+GatewayCall = namedtuple('GatewayCall', ['method', 'route', 'status', 'elapsed'])
 
 
 class GatewayBase:
     """
     Gateway base class
     """
+    _pool_size = settings.GATEWAY_POOL_SIZE
+    _timeout = settings.GATEWAY_TIMEOUT
+    _max_retries = settings.GATEWAY_MAX_RETRIES
+    _retry_backoff = settings.GATEWAY_RETRY_BACKOFF
 
     def __init__(self, **kwargs):
         """
@@ -14,6 +30,38 @@ class GatewayBase:
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+        # latest calls of this process, for metrics
+        self.calls = deque(maxlen=1000)
+
+    @property
+    def session(self):
+        '''
+        Keep-alive session of this plugin, one per process: a session
+        inherited through fork would share its sockets with the parent
+        '''
+        if getattr(self, '_session_pid', None) != os.getpid():
+            self._session = self._build_session()
+            self._session_pid = os.getpid()
+
+        return self._session
+
+    def _build_session(self):
+        # POST is not retried on errors once the request was sent, only when
+        # the connection could not be opened
+        retry = Retry(
+            total=self._max_retries,
+            backoff_factor=self._retry_backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size, max_retries=retry)
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
     def _request_api(self, route:str, method:str='GET', data:dict={}, headers:dict={}) -> dict:
         '''
         Request to Gateway API
@@ -33,9 +81,17 @@ class GatewayBase:
             raise Exception('Request incorrect')
 
         url = f'{self._base_url}/{route}'
-        
-        response = requests.request(method=method, url=url, data=json.dumps(data), headers=headers,)
-        
+
+        status = None
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method=method, url=url, data=json.dumps(data), headers=headers, timeout=self._timeout)
+            status = response.status_code
+        finally:
+            elapsed = time.perf_counter() - start
+            self.calls.append(GatewayCall(method, route, status, elapsed))
+            logger.info('%s %s %s %s in %.1f ms', type(self).__name__, method, route, status, elapsed * 1000)
+
         return response
 
     def create_customer(self, *args, **kwargs):
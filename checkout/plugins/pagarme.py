@@ -3,7 +3,7 @@ from base64 import b64encode
 from dotenv import load_dotenv
 
 from checkout.plugins.base import GatewayBase
-from checkout.models import Gateway, GatewayUser
+from checkout.models import Gateway
 
 from checkout.payment_settings import TOKEN_GATEWAY
 
@@ -35,6 +35,7 @@ class Pagarme(GatewayBase):
             document_type='CPF'
         
         customer_data = {
+            'code': str(user.id),
             'name': name,
             'email': user.email,
             'document': user.cpf_cnpj,
@@ -57,19 +58,7 @@ class Pagarme(GatewayBase):
             }
         }
         
-        customer_request = self._request_api(method='POST', route='customers/', data=customer_data, headers=self.headers)
-        customer_data = customer_request.json()
-
-        if customer_request.status_code == 200:
-            GatewayUser.objects.create(
-                gateway=self._gateway,
-                user=user,
-                user_on_gateway_id=customer_data.get('id')
-            )
-            
-            return customer_data
-
-        return False
+        return self._request_api(method='POST', route='customers/', data=customer_data, headers=self.headers)
 
 
     def create_card(self, *args, **kwargs):
@@ -134,6 +123,8 @@ class Pagarme(GatewayBase):
                 "quantity": 1,
                 "code": credit_order.credit_pack.id
             }],
+            # the local order: its webhooks find it even when the charge was never answered
+            "code": str(credit_order.id),
             "customer_id": gateway_user.user_on_gateway_id,
             "payments": [payment_data],
             "closed": True,
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.db import models
+from django.utils import timezone
+from requests.exceptions import RequestException
+
+from .models import GatewayUser
+
+CLAIM_TIMEOUT = timedelta(minutes=2)
+
+
+class GatewayCustomerError(Exception):
+    def __init__(self):
+        super().__init__('Não foi possível cadastrar o cliente na gateway de pagamento.')
+
+
+class GatewayUnavailable(GatewayCustomerError):
+    '''
+    The gateway timed out, could not be reached or failed (429/5xx): the
+    customer stays pending and provisioning can be tried again
+    '''
+
+
+def ensure_gateway_user(user):
+    '''
+    Gateway customer of the user, created on the gateway first when the
+    signup task has not done it yet. Safe to call again and concurrently:
+    the GatewayUser row is claimed (provisioning) before the gateway is
+    called, so each user becomes one customer, and no transaction stays
+    open during the call. A claim older than CLAIM_TIMEOUT was left by a
+    crashed worker and can be taken over.
+
+    Returns:
+        gateway_user(GatewayUser): a ready customer
+
+    Raises:
+        GatewayUnavailable: the customer stays pending, or another worker
+            is creating it right now
+        GatewayCustomerError: the gateway refused the customer, now failed
+    '''
+    from .plugins import gateway
+
+    gateway_user, _ = GatewayUser.objects.get_or_create(gateway=gateway._gateway, user=user)
+    if gateway_user.status == 2:
+        return gateway_user
+
+    claimed = timezone.now()
+    # pending or failed, or a stale provisioning claim
+    claimable = models.Q(status__in=[1, 3]) | models.Q(status=4, claimed__lt=claimed - CLAIM_TIMEOUT)
+    if not GatewayUser.objects.filter(claimable, id=gateway_user.id).update(status=4, claimed=claimed):
+        gateway_user.refresh_from_db()
+        if gateway_user.status == 2:
+            return gateway_user
+        raise GatewayUnavailable()
+
+    # only the worker holding this claim records the result
+    claim = GatewayUser.objects.filter(id=gateway_user.id, status=4, claimed=claimed)
+
+    try:
+        response = gateway.create_customer(user=user, address=user.address)
+    except RequestException as error:
+        claim.update(status=1)
+        raise GatewayUnavailable() from error
+
+    if response is None or response.status_code == 429 or response.status_code >= 500:
+        claim.update(status=1)
+        raise GatewayUnavailable()
+
+    if response.status_code != 200:
+        claim.update(status=3)
+        raise GatewayCustomerError()
+
+    claim.update(status=2, user_on_gateway_id=response.json()['id'])
+    gateway_user.refresh_from_db()
+    return gateway_user
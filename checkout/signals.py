@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import invalidate_on_commit
+
+from .models import CreditPack, PaymentMethod
+
+
+@receiver(post_save, sender=CreditPack)
+@receiver(post_delete, sender=CreditPack)
+def invalidate_credit_packs(sender, **kwargs):
+    invalidate_on_commit('credit-packs')
+
+
+@receiver(post_save, sender=PaymentMethod)
+@receiver(post_delete, sender=PaymentMethod)
+def invalidate_payment_methods(sender, **kwargs):
+    invalidate_on_commit('payment-methods')
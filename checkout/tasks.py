@@ -1,18 +1,65 @@
+import logging
+from datetime import timedelta
+
 from celery import task
-from django.core.mail import send_mail
-from aluguel_api.settings import EMAIL_HOST_USER
-
-
-@task(name='send_user_email')
-def send_user_email(*args, **kwargs):
-    message = kwargs.get('message')
-    title = kwargs.get('title')
-    email = kwargs.get('email')
-
-    send_mail(
-        subject=title,
-        message=message,
-        from_email=EMAIL_HOST_USER,
-        recipient_list=[email],
-        fail_silently=True,
-    )
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+STALE_WEBHOOK_EVENTS = timedelta(minutes=5)
+
+
+@task(name='provision_gateway_user', bind=True, max_retries=5)
+def provision_gateway_user(self, user_id):
+    from authentication.models import User
+    from .provisioning import GatewayCustomerError, GatewayUnavailable, ensure_gateway_user
+
+    try:
+        ensure_gateway_user(User.objects.select_related('address').get(id=user_id))
+    except GatewayUnavailable as error:
+        # 30s, 1min, 2min... once they run out the customer stays pending and
+        # is created when the user first adds a card or buys credits
+        raise self.retry(exc=error, countdown=30 * 2 ** self.request.retries)
+    except GatewayCustomerError:
+        # ensure_gateway_user left the GatewayUser failed: the card and credit
+        # views try again with the data the user has then, and report a new
+        # refusal to them
+        logger.warning('Gateway refused the customer of user %s', user_id)
+
+
+@task(name='process_pagarme_webhooks', bind=True, max_retries=5)
+def process_pagarme_webhooks(self, credit_order_on_gateway_id):
+    from .models import CreditOrder
+    from .webhooks import process_webhook_events
+
+    try:
+        return process_webhook_events(credit_order_on_gateway_id)
+    except CreditOrder.DoesNotExist as error:
+        # the gateway can notify before the order it charged is saved; once
+        # the retries run out retry_pagarme_webhooks picks the events up
+        raise self.retry(exc=error, countdown=2 ** self.request.retries)
+
+
+@task(name='retry_pagarme_webhooks')
+def retry_pagarme_webhooks():
+    '''
+    Apply the events still pending STALE_WEBHOOK_EVENTS after they were
+    received, left by process_pagarme_webhooks calls whose retries ran out
+    or whose worker crashed. Run by the CELERYBEAT_SCHEDULE.
+
+    Returns:
+        processed(int): events applied
+    '''
+    from .models import CreditOrder, PagarmeWebhookEvent
+    from .webhooks import process_webhook_events
+
+    stale = PagarmeWebhookEvent.objects.filter(status=1, received__lt=timezone.now() - STALE_WEBHOOK_EVENTS)
+
+    processed = 0
+    for credit_order_on_gateway_id in stale.order_by().values_list('credit_order_on_gateway_id', flat=True).distinct():
+        try:
+            processed += process_webhook_events(credit_order_on_gateway_id)
+        except CreditOrder.DoesNotExist:
+            logger.warning('Webhook events of credit order %s wait for the order', credit_order_on_gateway_id)
+
+    return processed
@@ -1,14 +1,46 @@
-import os, tempfile
+import base64
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta
+from io import StringIO
 from PIL import Image
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
 from model_bakery import baker
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from requests.exceptions import ReadTimeout
 from django.urls import reverse
 from rest_framework import status
 
-from checkout.models import Card, Credit, CreditOrder, Gateway, GatewayCard, Gateway, GatewayUser
+from checkout.constants import UNLOCK_PRICE
+from checkout.ledger import InsufficientCredits, post_credit_transaction
+from checkout.plugins import gateway
+from checkout.plugins.base import GatewayBase
+from checkout.provisioning import CLAIM_TIMEOUT, GatewayUnavailable, ensure_gateway_user
+from checkout.tasks import STALE_WEBHOOK_EVENTS, process_pagarme_webhooks, provision_gateway_user, retry_pagarme_webhooks
+from checkout.webhooks import process_webhook_events, receive_webhook_event
+from checkout.models import (
+    Card, Credit, CreditOrder, CreditTransaction, Gateway, GatewayCard, GatewayUser, PagarmeWebhookEvent,
+)
+from core.models import Notification
+from events.models import EventOrder
 from authentication.models import User
 
 GATEWAY = 'pagarme'
+WEBHOOK_CREDENTIALS = {'PAGARME_WEBHOOK_USERNAME': 'pagarme', 'PAGARME_WEBHOOK_PASSWORD': 'secret'}
+WEBHOOK_AUTHORIZATION = 'Basic ' + base64.b64encode(b'pagarme:secret').decode()
 
 class GatewayTests(APITestCase):
     def test_create_gateway(self):
@@ -324,4 +356,690 @@ class CreditOrderTests(APITestCase):
         self.client.force_authenticate(self.user)
         url = f"{reverse('checkout_urls:credit-order-order-canceled-webhook')}"
         response = self.client.patch(url, body, format='json')
-        
\ No newline at end of file
+
+
+class CreditLedgerTests(APITestCase):
+    def setUp(self):
+        self.user = baker.make('authentication.User')
+        self.credit = Credit.objects.create(user=self.user)
+
+    def test_post_credit_transactions(self):
+        post_credit_transaction(self.user, 10, 2)
+        post_credit_transaction(self.user, -4, 3)
+
+        self.assertEqual(Credit.objects.get(id=self.credit.id).amount, 6)
+        self.assertEqual(list(self.user.credit_transactions.order_by('id').values_list('amount', flat=True)), [10, -4])
+
+        with self.assertRaises(InsufficientCredits):
+            post_credit_transaction(self.user, -7, 3)
+        self.assertEqual(Credit.objects.get(id=self.credit.id).amount, 6)
+        self.assertEqual(self.user.credit_transactions.count(), 2)
+
+    def test_rebuild_credit_balances_from_the_ledger(self):
+        post_credit_transaction(self.user, 10, 2)
+        post_credit_transaction(self.user, -UNLOCK_PRICE, 3)
+        other_credit = Credit.objects.create(user=baker.make('authentication.User'), amount=5)
+        Credit.objects.filter(id=self.credit.id).update(amount=100)
+
+        output = StringIO()
+        call_command('rebuild_credits', stdout=output)
+
+        self.assertIn('2 credit balances rebuilt', output.getvalue())
+        self.assertEqual(Credit.objects.get(id=self.credit.id).amount, 10 - UNLOCK_PRICE)
+        self.assertEqual(Credit.objects.get(id=other_credit.id).amount, 0)
+
+
+@override_settings(**WEBHOOK_CREDENTIALS)
+class CreditOrderNotificationTests(APITestCase):
+    def test_paid_webhook_mails_after_the_request(self):
+        user = baker.make('authentication.User', email='user@hotmail.com')
+        Credit.objects.create(user=user)
+        credit_order = baker.make(
+            'checkout.CreditOrder', user=user, credit_pack=baker.make('checkout.CreditPack', price=10), status=1,
+            payment_method=baker.make('checkout.PaymentMethod', method=1),
+        )
+        gateway_credit_order = baker.make('checkout.GatewayCreditOrder', credit_order=credit_order)
+
+        url = reverse('checkout_urls:pagarme-webhook-order-paid-webhook')
+        body = {'id': 'hook_paid', 'data': {'id': gateway_credit_order.credit_order_on_gateway_id}}
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch('core.notifications.get_connection') as connection, self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(url, body, format='json', HTTP_AUTHORIZATION=WEBHOOK_AUTHORIZATION)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            connection.assert_not_called()
+            self.assertEqual(mail.outbox, [])
+
+            # the worker processes the event once the inbox commits
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@hotmail.com'])
+        self.assertEqual(mail.outbox[0].subject, 'Compra de créditos concluída')
+
+    def test_failed_webhook_leaves_no_side_effect(self):
+        user = baker.make('authentication.User', email='user@hotmail.com')
+        credit_order = baker.make(
+            'checkout.CreditOrder', user=user, credit_pack=baker.make('checkout.CreditPack', price=10), status=1,
+            payment_method=baker.make('checkout.PaymentMethod', method=1),
+        )
+        gateway_credit_order = baker.make('checkout.GatewayCreditOrder', credit_order=credit_order)
+
+        url = reverse('checkout_urls:pagarme-webhook-order-paid-webhook')
+        body = {'id': 'hook_paid', 'data': {'id': gateway_credit_order.credit_order_on_gateway_id}}
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url, body, format='json', HTTP_AUTHORIZATION=WEBHOOK_AUTHORIZATION)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # the user has no balance to credit, so the purchase rolls back
+        with self.captureOnCommitCallbacks() as side_effects:
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(side_effects, [])
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(PagarmeWebhookEvent.objects.get().status, 1)
+        credit_order.refresh_from_db()
+        self.assertEqual(credit_order.status, 1)
+
+
+@override_settings(**WEBHOOK_CREDENTIALS)
+class PagarmeWebhookTests(APITestCase):
+    def setUp(self):
+        user = baker.make('authentication.User', email='user@hotmail.com')
+        Credit.objects.create(user=user)
+        self.credit_order = baker.make(
+            'checkout.CreditOrder', user=user, credit_pack=baker.make('checkout.CreditPack', price=10), status=1,
+            payment_method=baker.make('checkout.PaymentMethod', method=1),
+        )
+        self.order_id = baker.make('checkout.GatewayCreditOrder', credit_order=self.credit_order).credit_order_on_gateway_id
+
+    def event(self, event_id, minute):
+        return {'id': event_id, 'created_at': f'2026-10-18T12:{minute:02}:00Z', 'data': {'id': self.order_id}}
+
+    def test_webhooks_need_the_pagarme_credentials(self):
+        url = reverse('checkout_urls:pagarme-webhook-order-paid-webhook')
+        wrong_authorization = 'Basic ' + base64.b64encode(b'pagarme:wrong').decode()
+
+        for headers in ({}, {'HTTP_AUTHORIZATION': wrong_authorization}, {'HTTP_AUTHORIZATION': 'Basic ???'}):
+            response = self.client.post(url, self.event('hook_1', 0), format='json', **headers)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with override_settings(PAGARME_WEBHOOK_USERNAME=None, PAGARME_WEBHOOK_PASSWORD=None):
+            response = self.client.post(url, self.event('hook_1', 0), format='json', HTTP_AUTHORIZATION=WEBHOOK_AUTHORIZATION)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.assertFalse(PagarmeWebhookEvent.objects.exists())
+
+    def test_events_are_acknowledged_before_they_are_applied(self):
+        url = reverse('checkout_urls:pagarme-webhook-order-paid-webhook')
+
+        with mock.patch.object(process_pagarme_webhooks, 'delay') as delay, self.captureOnCommitCallbacks(execute=True):
+            for delivery in range(2):
+                response = self.client.post(url, self.event('hook_1', 0), format='json', HTTP_AUTHORIZATION=WEBHOOK_AUTHORIZATION)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            response = self.client.post(url, {'id': 'hook_2'}, format='json', HTTP_AUTHORIZATION=WEBHOOK_AUTHORIZATION)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        delay.assert_called_with(self.order_id)
+        event = PagarmeWebhookEvent.objects.get()
+        self.assertEqual((event.event_id, event.type, event.status), ('hook_1', 'order.paid', 1))
+        self.credit_order.refresh_from_db()
+        self.assertEqual(self.credit_order.status, 1)
+
+    def test_event_times_are_stored_in_the_local_time_zone(self):
+        url = reverse('checkout_urls:pagarme-webhook-order-paid-webhook')
+
+        with mock.patch.object(process_pagarme_webhooks, 'delay'):
+            response = self.client.post(url, self.event('hook_1', 0), format='json', HTTP_AUTHORIZATION=WEBHOOK_AUTHORIZATION)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            PagarmeWebhookEvent.objects.get().occurred,
+            timezone.make_naive(datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc)),
+        )
+
+    def test_events_of_an_order_are_applied_in_the_order_they_happened(self):
+        with mock.patch.object(process_pagarme_webhooks, 'delay'):
+            receive_webhook_event('order.canceled', self.event('hook_canceled', 30))
+            receive_webhook_event('order.paid', self.event('hook_paid', 10))
+            receive_webhook_event('order.paid', self.event('hook_paid', 10))
+
+            self.assertEqual(process_webhook_events(self.order_id), 1)
+
+            # paid before it was canceled, so it was credited once and stays paid
+            self.credit_order.refresh_from_db()
+            self.assertEqual(self.credit_order.status, 2)
+            self.assertEqual(CreditTransaction.objects.filter(credit_order=self.credit_order, kind=2).count(), 1)
+
+            receive_webhook_event('order.paid', self.event('hook_late', 20))
+            self.assertEqual(process_webhook_events(self.order_id), 0)
+
+        self.assertEqual(
+            list(PagarmeWebhookEvent.objects.order_by('occurred').values_list('event_id', 'status')),
+            [('hook_paid', 2), ('hook_late', 3), ('hook_canceled', 3)],
+        )
+
+    def test_a_cancel_after_the_payment_keeps_the_credits(self):
+        with mock.patch.object(process_pagarme_webhooks, 'delay'), self.captureOnCommitCallbacks(execute=True):
+            receive_webhook_event('order.paid', self.event('hook_paid', 10))
+            self.assertEqual(process_webhook_events(self.order_id), 1)
+            receive_webhook_event('order.canceled', self.event('hook_canceled', 20))
+            self.assertEqual(process_webhook_events(self.order_id), 0)
+
+        self.credit_order.refresh_from_db()
+        self.assertEqual(self.credit_order.status, 2)
+        self.assertEqual(PagarmeWebhookEvent.objects.get(event_id='hook_canceled').status, 3)
+        self.assertEqual(Credit.objects.get(user=self.credit_order.user).amount, 10)
+        self.assertEqual(list(Notification.objects.values_list('key', flat=True)), [f'credit-order-paid:{self.credit_order.id}'])
+
+    def test_pending_events_are_retried_periodically(self):
+        schedule = [entry['task'] for entry in settings.CELERYBEAT_SCHEDULE.values()]
+        self.assertIn(retry_pagarme_webhooks.name, schedule)
+
+        with mock.patch.object(process_pagarme_webhooks, 'delay'):
+            receive_webhook_event('order.paid', self.event('hook_paid', 10))
+            receive_webhook_event('order.paid', {'id': 'hook_unknown', 'data': {'id': 'or_unsaved'}})
+
+        # recent events are still in the hands of process_pagarme_webhooks
+        self.assertEqual(retry_pagarme_webhooks(), 0)
+
+        PagarmeWebhookEvent.objects.update(received=timezone.now() - STALE_WEBHOOK_EVENTS - timedelta(seconds=1))
+        self.assertEqual(retry_pagarme_webhooks(), 1)
+
+        self.credit_order.refresh_from_db()
+        self.assertEqual(self.credit_order.status, 2)
+        self.assertEqual(PagarmeWebhookEvent.objects.get(event_id='hook_unknown').status, 1)
+
+    def test_events_wait_for_their_credit_order(self):
+        with mock.patch.object(process_pagarme_webhooks, 'delay'):
+            receive_webhook_event('order.paid', {'id': 'hook_early', 'data': {'id': 'or_unsaved'}})
+
+        with self.assertRaises(CreditOrder.DoesNotExist):
+            process_webhook_events('or_unsaved')
+
+        event = PagarmeWebhookEvent.objects.get()
+        self.assertEqual(event.status, 1)
+        self.assertLessEqual(event.occurred, timezone.now())
+
+
+class CreditOrderLockTests(TransactionTestCase):
+    client_class = APIClient
+
+    def setUp(self):
+        baker.make('checkout.Gateway', id=gateway._gateway.id, name=GATEWAY)
+
+        # a payment that takes 0.5s to be answered
+        self.server = start_gateway_stub(self, handshake_delay=0)
+        self.server.delays['/orders'] = 0.5
+        self.server.bodies['/orders'] = {
+            'charges': [{'last_transaction': {'gateway_response': {'code': '200', 'errors': []}}}],
+        }
+        patcher = mock.patch.object(gateway, '_base_url', f'http://127.0.0.1:{self.server.server_address[1]}')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = baker.make('authentication.User', email='user@hotmail.com')
+        baker.make('checkout.GatewayUser', gateway_id=gateway._gateway.id, user=self.user, user_on_gateway_id='cus_1', status=2)
+        self.card = baker.make('checkout.Card', user=self.user)
+        baker.make('checkout.GatewayCard', gateway_id=gateway._gateway.id, card=self.card, card_on_gateway_id='card_1')
+
+        self.body = {
+            "credit_pack": baker.make('checkout.CreditPack', price=20, credit_amount=100).id,
+            "card": self.card.id,
+            "payment_method": baker.make('checkout.PaymentMethod', method=1).id,
+            "installments": 1,
+        }
+        self.client.force_authenticate(self.user)
+
+    def post_timing_transactions(self):
+        '''
+        Returns:
+            response, elapsed(float): the request and the seconds it took
+            transactions(list): seconds each transaction of the request was open
+        '''
+        transactions, begun = [], []
+        set_autocommit = connection.set_autocommit
+
+        def timed_set_autocommit(autocommit, *args, **kwargs):
+            if not autocommit:
+                begun.append(time.perf_counter())
+            elif begun:
+                transactions.append(time.perf_counter() - begun.pop())
+            return set_autocommit(autocommit, *args, **kwargs)
+
+        with mock.patch.object(connection, 'set_autocommit', timed_set_autocommit):
+            start = time.perf_counter()
+            response = self.client.post(reverse('checkout_urls:credit-order-list'), self.body, format='json')
+            elapsed = time.perf_counter() - start
+
+        return response, elapsed, transactions
+
+    def test_no_transaction_is_open_while_the_card_is_charged(self):
+        response, elapsed, transactions = self.post_timing_transactions()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertGreaterEqual(elapsed, 0.5)
+        self.assertTrue(transactions)
+        self.assertLess(max(transactions), 0.1)
+
+        credit_order = CreditOrder.objects.get()
+        self.assertEqual(credit_order.gatewaycreditorder_set.get().credit_order_on_gateway_id, 'stub_1')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Compra de creditos aguardando pagamento')
+
+    def test_the_pending_order_is_saved_before_the_card_is_charged(self):
+        credit_card_payment = gateway.credit_card_payment
+
+        def charge(*args, **kwargs):
+            # visible to other connections, like the one of a webhook worker
+            self.assertEqual(CreditOrder.objects.get(id=kwargs['credit_order'].id).status, 1)
+            self.assertFalse(connection.in_atomic_block)
+            return credit_card_payment(*args, **kwargs)
+
+        with mock.patch.object(gateway, 'credit_card_payment', side_effect=charge):
+            response, elapsed, transactions = self.post_timing_transactions()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(CreditOrder.objects.get().status, 1)
+
+    def test_gateway_errors_cancel_the_order_without_side_effects(self):
+        self.server.statuses['/orders'] = [400]
+
+        response, elapsed, transactions = self.post_timing_transactions()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        credit_order = CreditOrder.objects.get()
+        self.assertEqual(credit_order.status, 3)
+        self.assertFalse(credit_order.gatewaycreditorder_set.exists())
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(mail.outbox, [])
+
+    def test_unanswered_charges_stay_pending_for_their_webhook(self):
+        Credit.objects.create(user=self.user)
+        self.server.delays['/orders'] = 0.5
+
+        with mock.patch.object(gateway, '_timeout', (1, 0.2)):
+            response, elapsed, transactions = self.post_timing_transactions()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED, response.data)
+        credit_order = CreditOrder.objects.get()
+        self.assertEqual(credit_order.status, 1)
+        self.assertFalse(credit_order.gatewaycreditorder_set.exists())
+        self.assertEqual(self.server.payloads[-1]['code'], str(credit_order.id))
+
+        # the gateway charged the card all the same
+        with mock.patch.object(process_pagarme_webhooks, 'delay'):
+            receive_webhook_event('order.paid', {'id': 'hook_paid', 'data': {'id': 'stub_1', 'code': str(credit_order.id)}})
+        self.assertEqual(process_webhook_events('stub_1'), 1)
+
+        credit_order.refresh_from_db()
+        self.assertEqual(credit_order.status, 2)
+        self.assertEqual(credit_order.gatewaycreditorder_set.get().credit_order_on_gateway_id, 'stub_1')
+        self.assertEqual(Credit.objects.get(user=self.user).amount, 20)
+
+    def test_refused_charges_keep_the_canceled_order(self):
+        self.server.bodies['/orders'] = {
+            'charges': [{'last_transaction': {'gateway_response': {'code': '400', 'errors': ['recusado']}}}],
+        }
+
+        response, elapsed, transactions = self.post_timing_transactions()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        credit_order = CreditOrder.objects.get()
+        self.assertEqual(response.data['credit_order'], str(credit_order.id))
+        self.assertEqual(credit_order.status, 3)
+        self.assertEqual(credit_order.gatewaycreditorder_set.get().credit_order_on_gateway_id, 'stub_1')
+        self.assertLess(max(transactions), 0.1)
+        self.assertFalse(Notification.objects.exists())
+
+
+@override_settings(**WEBHOOK_CREDENTIALS)
+class CreditLedgerConcurrencyTests(TransactionTestCase):
+    def test_concurrent_accepts_and_payments_keep_the_balance_exact(self):
+        owner = baker.make('authentication.User')
+        place_ads = baker.make('places.PlaceAds', user=owner)
+        Credit.objects.create(user=owner)
+        post_credit_transaction(owner, 30 * UNLOCK_PRICE, 1)
+
+        event_orders = [
+            baker.make(
+                'events.EventOrder', place_ads=place_ads, status=1, dates_selected=[datetime(2030, 1, 1) + timedelta(days=day)],
+            )
+            for day in range(30)
+        ]
+        credit_pack = baker.make('checkout.CreditPack', price=10, credit_amount=10)
+        payment_method = baker.make('checkout.PaymentMethod', method=1)
+        gateway_ids = []
+        for index in range(20):
+            credit_order = baker.make(
+                'checkout.CreditOrder', user=owner, credit_pack=credit_pack, payment_method=payment_method, status=1)
+            gateway_ids.append(baker.make('checkout.GatewayCreditOrder', credit_order=credit_order).credit_order_on_gateway_id)
+
+        # every payment webhook is delivered twice
+        requests = [('accept', event_order.id) for event_order in event_orders] + [('paid', id) for id in gateway_ids * 2]
+        random.Random(0).shuffle(requests)
+
+        def send(request):
+            kind, id = request
+            client = APIClient()
+            try:
+                if kind == 'accept':
+                    client.force_authenticate(owner)
+                    response = client.patch(reverse('accept-order'), {'event_order': id}, format='json')
+                else:
+                    url = reverse('checkout_urls:pagarme-webhook-order-paid-webhook')
+                    body = {'id': f'hook_{gateway_ids.index(id)}', 'data': {'id': id}}
+                    response = client.post(url, body, format='json', HTTP_AUTHORIZATION=WEBHOOK_AUTHORIZATION)
+                return kind, response.status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(send, requests))
+
+        self.assertEqual(responses.count(('accept', status.HTTP_200_OK)), 30)
+        self.assertEqual(responses.count(('paid', status.HTTP_200_OK)), 40)
+        self.assertEqual(PagarmeWebhookEvent.objects.filter(status=2).count(), 20)
+
+        self.assertEqual(Credit.objects.get(user=owner).amount, 20 * 10)
+        self.assertEqual(CreditTransaction.objects.filter(user=owner).aggregate(total=Sum('amount'))['total'], 20 * 10)
+        self.assertEqual(EventOrder.objects.filter(status=2).count(), 30)
+        self.assertEqual(CreditTransaction.objects.filter(kind=3).count(), 30)
+        self.assertEqual(CreditTransaction.objects.filter(kind=2).count(), 20)
+
+
+class GatewayStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+        # stands in for the TCP and TLS handshake of a new connection
+        time.sleep(self.server.handshake_delay)
+
+    def respond(self):
+        payload = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.requests.append((self.command, self.path))
+        self.server.payloads.append(json.loads(payload or b'{}'))
+
+        time.sleep(self.server.delays.get(self.path, 0))
+        statuses = self.server.statuses.get(self.path)
+        status = statuses.pop(0) if statuses else 200
+
+        body = json.dumps({
+            'id': f'stub_{len(self.server.requests)}', 'path': self.path, **self.server.bodies.get(self.path, {}),
+        }).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client timed out and left
+            self.close_connection = True
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = respond
+
+    def log_message(self, *args):
+        pass
+
+
+def start_gateway_stub(test, handshake_delay):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GatewayStubHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.handshake_delay = handshake_delay
+    server.requests = []
+    server.payloads = []
+    server.statuses = {}
+    server.delays = {'/slow': 0.5}
+    server.bodies = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server
+
+
+class GatewaySessionTests(SimpleTestCase):
+    def setUp(self):
+        self.server = start_gateway_stub(self, handshake_delay=0.05)
+
+        self.gateway = GatewayBase(
+            _base_url=f'http://127.0.0.1:{self.server.server_address[1]}', _timeout=(1, 0.2), _retry_backoff=0,
+        )
+        self.addCleanup(self.gateway.session.close)
+
+    def test_calls_reuse_one_connection(self):
+        for index in range(10):
+            response = self.gateway._request_api(method='POST', route=f'customers/{index}', data={'name': 'Cliente'})
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.server.connections, 1)
+        first, *others = [call.elapsed for call in self.gateway.calls]
+        self.assertGreaterEqual(first, self.server.handshake_delay)
+        self.assertLess(max(others), self.server.handshake_delay)
+        self.assertEqual(self.gateway.calls[-1].route, 'customers/9')
+
+    def test_retry_idempotent_calls_only(self):
+        self.server.statuses = {'/cards/1': [503, 502], '/orders': [503]}
+
+        response = self.gateway._request_api(method='DELETE', route='cards/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.requests.count(('DELETE', '/cards/1')), 3)
+
+        response = self.gateway._request_api(method='POST', route='orders')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.requests.count(('POST', '/orders')), 1)
+
+    def test_read_timeout(self):
+        with self.assertRaises(ReadTimeout):
+            self.gateway._request_api(method='POST', route='slow')
+
+        self.assertIsNone(self.gateway.calls[-1].status)
+        self.assertEqual(self.server.requests.count(('POST', '/slow')), 1)
+
+
+class GatewayUserProvisioningTests(APITestCase):
+    def setUp(self):
+        if not Gateway.objects.filter(id=gateway._gateway.id).exists():
+            baker.make('checkout.Gateway', id=gateway._gateway.id, name=gateway._gateway.name)
+
+        # a gateway that takes 2s to answer a new connection
+        self.server = start_gateway_stub(self, handshake_delay=2)
+        patcher = mock.patch.object(gateway, '_base_url', f'http://127.0.0.1:{self.server.server_address[1]}')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = baker.make(
+            'authentication.User', cpf_cnpj='12345678910', phone='84988887777', address=baker.make('places.Address'),
+        )
+
+    def test_signup_does_not_wait_for_the_gateway(self):
+        image = Image.new(mode='RGB', size=(200, 20), color='blue')
+        tmp_file = tempfile.NamedTemporaryFile(suffix='.png')
+        image.save(tmp_file)
+        tmp_file.seek(0)
+
+        body = {
+            "asset": baker.make('asset.Asset', file_high=tmp_file).id,
+            "address": {
+                "map_string": "Rua das Carlotas, 123",
+                "reference": "Em frente ao atacado varejo",
+                "cep": "84268660",
+                "latitude": -5.820903,
+                "longitude": -35.188911
+            },
+            "cpf_cnpj": "10987654321",
+            "email": "user@hotmail.com",
+            "username": "user",
+            "phone": "84977776666",
+            "whatsapp": "84977776666",
+            "first_name": "New",
+            "last_name": "User",
+            "password": "user",
+        }
+
+        url = reverse('authentication_urls:users-list')
+        with self.captureOnCommitCallbacks() as callbacks:
+            start = time.perf_counter()
+            response = self.client.post(url, body, format='json')
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertLess(elapsed, self.server.handshake_delay)
+        self.assertEqual(self.server.requests, [])
+        gateway_user = GatewayUser.objects.get(user__email=body['email'])
+        self.assertEqual(gateway_user.status, 1)
+
+        for callback in callbacks:
+            callback()
+
+        gateway_user.refresh_from_db()
+        self.assertEqual(gateway_user.status, 2)
+        self.assertEqual(gateway_user.user_on_gateway_id, 'stub_1')
+        self.assertEqual(self.server.requests, [('POST', '/customers/')])
+
+    def test_provisioning_task_retries_an_unavailable_gateway(self):
+        self.server.handshake_delay = 0
+        self.server.statuses = {'/customers/': [503, 503]}
+        GatewayUser.objects.create(gateway=gateway._gateway, user=self.user)
+
+        provision_gateway_user.delay(self.user.id)
+        provision_gateway_user.delay(self.user.id)
+
+        gateway_user = GatewayUser.objects.get(user=self.user)
+        self.assertEqual(gateway_user.status, 2)
+        self.assertEqual(self.server.requests.count(('POST', '/customers/')), 3)
+
+    def test_provisioning_task_records_a_refused_customer(self):
+        self.server.handshake_delay = 0
+        self.server.statuses = {'/customers/': [400]}
+        GatewayUser.objects.create(gateway=gateway._gateway, user=self.user)
+
+        with self.assertLogs('checkout.tasks', 'WARNING'):
+            provision_gateway_user.delay(self.user.id)
+
+        gateway_user = GatewayUser.objects.get(user=self.user)
+        self.assertEqual(gateway_user.status, 3)
+        self.assertIsNone(gateway_user.user_on_gateway_id)
+
+    def test_first_card_creates_the_customer_once_the_task_gave_up(self):
+        self.server.handshake_delay = 0
+        self.server.statuses = {'/customers/': [503]}
+        GatewayUser.objects.create(gateway=gateway._gateway, user=self.user)
+
+        # the last retry of the task
+        result = provision_gateway_user.apply(args=[self.user.id], retries=provision_gateway_user.max_retries)
+
+        self.assertTrue(result.failed())
+        self.assertEqual(type(result.result).__name__, 'GatewayUnavailable')
+        self.assertEqual(GatewayUser.objects.get(user=self.user).status, 1)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse('checkout_urls:card-list'), {
+            "number": "4000000000000010",
+            "holder_name": "Tony Stark",
+            "holder_document": "96958343026",
+            "exp_month": 1,
+            "exp_year": 30,
+            "cvv": "351",
+            "brand": "Mastercard",
+            "label": "renner",
+            "billing_address": self.user.address.id,
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        gateway_user = GatewayUser.objects.get(user=self.user)
+        self.assertEqual(gateway_user.status, 2)
+        self.assertEqual(
+            self.server.requests[-2:],
+            [('POST', '/customers/'), ('POST', f'/customers/{gateway_user.user_on_gateway_id}/cards')],
+        )
+        self.assertEqual(Card.objects.get().user, self.user)
+
+    def test_card_creation_provisions_a_pending_customer(self):
+        self.server.handshake_delay = 0
+        self.server.statuses = {'/customers/': [400]}
+        GatewayUser.objects.create(gateway=gateway._gateway, user=self.user)
+        body = {
+            "number": "4000000000000010",
+            "holder_name": "Tony Stark",
+            "holder_document": "96958343026",
+            "exp_month": 1,
+            "exp_year": 30,
+            "cvv": "351",
+            "brand": "Mastercard",
+            "label": "renner",
+            "billing_address": self.user.address.id,
+        }
+
+        self.client.force_authenticate(self.user)
+        url = reverse('checkout_urls:card-list')
+        response = self.client.post(url, body, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(GatewayUser.objects.get(user=self.user).status, 3)
+        self.assertFalse(Card.objects.exists())
+
+        response = self.client.post(url, body, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        gateway_user = GatewayUser.objects.get(user=self.user)
+        self.assertEqual(gateway_user.status, 2)
+        self.assertEqual(
+            self.server.requests[1:],
+            [('POST', '/customers/'), ('POST', f'/customers/{gateway_user.user_on_gateway_id}/cards')],
+        )
+
+
+class GatewayUserClaimTests(TransactionTestCase):
+    def setUp(self):
+        baker.make('checkout.Gateway', id=gateway._gateway.id, name=gateway._gateway.name)
+
+        # a gateway that takes 0.5s to answer a new connection
+        self.server = start_gateway_stub(self, handshake_delay=0.5)
+        patcher = mock.patch.object(gateway, '_base_url', f'http://127.0.0.1:{self.server.server_address[1]}')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = baker.make(
+            'authentication.User', cpf_cnpj='12345678910', phone='84988887777', address=baker.make('places.Address'),
+        )
+
+    def test_no_lock_is_held_while_the_customer_is_created(self):
+        def provision():
+            try:
+                return ensure_gateway_user(self.user)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            provisioning = pool.submit(provision)
+            while not self.server.connections:
+                time.sleep(0.01)
+
+            with transaction.atomic():
+                gateway_user = GatewayUser.objects.select_for_update(nowait=True).get(user=self.user)
+            self.assertEqual(gateway_user.status, 4)
+
+            # the claim keeps a second worker from creating another customer
+            with self.assertRaises(GatewayUnavailable):
+                ensure_gateway_user(self.user)
+
+            self.assertEqual(provisioning.result().status, 2)
+
+        self.assertEqual(self.server.requests, [('POST', '/customers/')])
+
+    def test_a_stale_claim_is_taken_over(self):
+        self.server.handshake_delay = 0
+        GatewayUser.objects.create(
+            gateway=gateway._gateway, user=self.user, status=4, claimed=timezone.now() - CLAIM_TIMEOUT - timedelta(seconds=1),
+        )
+
+        gateway_user = ensure_gateway_user(self.user)
+
+        self.assertEqual((gateway_user.status, gateway_user.user_on_gateway_id), (2, 'stub_1'))
@@ -1,14 +1,20 @@
 import os
 from django.db import transaction
+from requests.exceptions import RequestException
 from rest_framework import viewsets, status
 from rest_framework import mixins
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.authentication import SessionAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from core.cache import cache_response
+from core.notifications import notify
 from places.models import Address
-from .tasks import send_user_email
+from .provisioning import GatewayCustomerError, ensure_gateway_user
+from .webhooks import InvalidWebhookEvent, receive_webhook_event
 from .models import (
     Credit, 
     PagarmeWebhook,
@@ -36,6 +42,14 @@ from .permissions import CreditOrderPermisions, PagarmeWebhookPermission
 from .plugins import gateway
 GATEWAY = os.getenv('GATEWAY')
 
+
+def gateway_user_or_error(user):
+    try:
+        return ensure_gateway_user(user)
+    except GatewayCustomerError as error:
+        raise ValidationError(error)
+
+
 class CreditViewSet(
     mixins.ListModelMixin,
     viewsets.GenericViewSet
@@ -52,12 +66,20 @@ class PaymentMethodViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = PaymentMethodSerializer
     permission_classes = [IsAuthenticated]
 
+    @cache_response('payment-methods')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 
 class CreditPackViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     queryset = CreditPack.objects.all()
     serializer_class = CreditPackSerializer
     permission_classes = [IsAuthenticated]
 
+    @cache_response('credit-packs')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 
 class CardViewSet(
     mixins.CreateModelMixin,
@@ -71,19 +93,30 @@ class CardViewSet(
     def get_queryset(self):
         return Card.objects.filter(user=self.request.user)
 
-    @transaction.atomic
     def create(self, request, *args, **kwargs):
+        # outside the transaction: the gateway customer outlives a refused card
+        gateway_user = gateway_user_or_error(request.user)
+
         try:
             data = request.data
-            gateway_user = GatewayUser.objects.get(user=request.user)
             address = Address.objects.get(id=data['billing_address'])
-            
+
+            # no transaction is open while the gateway is called
             gateway_card_request = gateway.create_card(gateway_user=gateway_user, data=data, address=address)
             gateway_card_data = gateway_card_request.json()
-            
-            if gateway_card_request.status_code != status.HTTP_200_OK:
-                return Response(data={"gateway_error": gateway_card_data}, status=status.HTTP_400_BAD_REQUEST)
-            
+
+        except Exception as error:
+            raise ValidationError(error)
+
+        if gateway_card_request.status_code != status.HTTP_200_OK:
+            return Response(data={"gateway_error": gateway_card_data}, status=status.HTTP_400_BAD_REQUEST)
+
+        return self.create_card(request, address, gateway_card_data['id'])
+
+    @transaction.atomic
+    def create_card(self, request, address, card_on_gateway_id):
+        try:
+            data = request.data
             card = Card.objects.create(
                 user=request.user,
                 brand=data['brand'],
@@ -95,7 +128,7 @@ class CardViewSet(
             GatewayCard.objects.create(
                 gateway=Gateway.objects.get(name=GATEWAY),
                 card=card,
-                card_on_gateway_id=gateway_card_data['id']
+                card_on_gateway_id=card_on_gateway_id
             )
 
             return Response(data=CardSerializer(instance=card).data, status=status.HTTP_201_CREATED)
@@ -130,54 +163,80 @@ class CardViewSet(
 class CreditOrderViewSet(viewsets.ModelViewSet):
     serializer_class = CreditOrderSerializer
     permission_classes = [IsAuthenticated, CreditOrderPermisions]
+    cursor_field = 'created'
 
     def get_queryset(self):
         if self.request.user.is_superuser:
             return CreditOrder.objects.all()
         return CreditOrder.objects.filter(user=self.request.user)
 
-    @transaction.atomic
     def create(self, request, *args, **kwargs):
+        # outside the transaction: the gateway customer outlives a failed payment
+        gateway_user = gateway_user_or_error(request.user)
+
         try:
-            credit_pack = CreditPack.objects.get(id=request.data['credit_pack'])
-            payment_method = PaymentMethod.objects.get(id=request.data['payment_method'])
             card = Card.objects.get(id=request.data['card'])
-
+            # the pending order is saved before the card is charged, so a
+            # charge never happens without a local order to match it
             credit_order = CreditOrder.objects.create(
-                user = request.user,
-                credit_pack = credit_pack ,
-                payment_method = payment_method,
-                card = card,
+                user=request.user,
+                credit_pack=CreditPack.objects.get(id=request.data['credit_pack']),
+                payment_method=PaymentMethod.objects.get(id=request.data['payment_method']),
+                card=card,
             )
+        except Exception as error:
+            raise ValidationError(error)
 
+        # no transaction stays open while the gateway answers
+        try:
             payment_response = gateway.credit_card_payment(
                 credit_order=credit_order,
                 card=card,
-                gateway_user=GatewayUser.objects.get(user=request.user),
+                gateway_user=gateway_user,
                 installments=request.data.get('installments', 1),
             )
+        except RequestException:
+            # the gateway may have charged the card before the connection
+            # failed: the order stays pending until its webhook, which finds
+            # it by the code sent with the charge, settles it
+            return Response(data=CreditOrderSerializer(instance=credit_order).data, status=status.HTTP_202_ACCEPTED)
+        except Exception as error:
+            # refused before anything was sent to the gateway
+            self.cancel_credit_order(credit_order)
+            raise ValidationError(error)
+
+        if payment_response.status_code != status.HTTP_200_OK:
+            self.cancel_credit_order(credit_order)
+            raise ValidationError({"erro": "Erro na gateway de pagamento"})
 
-            if payment_response.status_code != status.HTTP_200_OK:
-                transaction.set_rollback(True)
-                raise ValidationError({"erro": "Erro na gateway de pagamento"})
-            
-            if payment_response.json()['charges'][0]['last_transaction']['gateway_response']['code'] != '200':
-                transaction.set_rollback(True)
-                raise ValidationError({
-                    "message": "Order created, but with status failed", 
-                    "errors": payment_response.json()['charges'][0]['last_transaction']['gateway_response']['errors'],
-                })
+        payment = payment_response.json()
+        if payment['charges'][0]['last_transaction']['gateway_response']['code'] != '200':
+            self.cancel_credit_order(credit_order, payment['id'])
+            raise ValidationError({
+                "message": "Order created, but with status failed",
+                "credit_order": credit_order.id,
+                "errors": payment['charges'][0]['last_transaction']['gateway_response']['errors'],
+            })
 
+        return self.save_credit_order(request, credit_order, payment['id'])
+
+    @transaction.atomic
+    def save_credit_order(self, request, credit_order, credit_order_on_gateway_id):
+        try:
             GatewayCreditOrder.objects.create(
                 gateway=Gateway.objects.get(name=GATEWAY),
                 credit_order=credit_order,
-                credit_order_on_gateway_id=payment_response.json()['id']
+                credit_order_on_gateway_id=credit_order_on_gateway_id
             )
 
-            send_user_email(
+            notify(
                 email=request.user.email,
-                title="Compra de creditos aguardando pagamento",
-                message="Estamos aguardando o pagamento para adicionar seus créditos. Caso o pagamento não seja realizado sua compra será cancelada."
+                subject="Compra de creditos aguardando pagamento",
+                message=(
+                    "Estamos aguardando o pagamento para adicionar seus créditos. "
+                    "Caso o pagamento não seja realizado sua compra será cancelada."
+                ),
+                key=f'credit-order-pending:{credit_order.id}',
             )
 
             return Response(data=CreditOrderSerializer(instance=credit_order).data, status=status.HTTP_201_CREATED)
@@ -186,54 +245,44 @@ class CreditOrderViewSet(viewsets.ModelViewSet):
             transaction.set_rollback(True)
             raise ValidationError(error)
 
+    @transaction.atomic
+    def cancel_credit_order(self, credit_order, credit_order_on_gateway_id=None):
+        '''
+        Keep the order of a refused payment as canceled, linked to the order
+        the gateway created for it if there is one
+        '''
+        CreditOrder.objects.filter(id=credit_order.id, status=1).update(status=3)
+
+        if credit_order_on_gateway_id:
+            GatewayCreditOrder.objects.create(
+                gateway=Gateway.objects.get(name=GATEWAY),
+                credit_order=credit_order,
+                credit_order_on_gateway_id=credit_order_on_gateway_id
+            )
+
 
 class PagarmeWebhookViewSet(viewsets.ModelViewSet):
     queryset = PagarmeWebhook.objects.all()
     serializer_class = PagarmeWebhookSerializer
     permission_classes = [PagarmeWebhookPermission]
+    # the HTTP Basic credentials of Pagar.me are not a user, PagarmeWebhookPermission checks them
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
 
-    @transaction.atomic
-    @action(methods=['POST'], detail=False, url_path='order-paid')
-    def order_paid_webhook(self, request, *args, **kwargs):
+    def receive_event(self, event_type, request):
+        '''
+        Acknowledge the event once it is in the inbox, a worker applies it
+        '''
         try:
-            credit_order = GatewayCreditOrder.objects.get(credit_order_on_gateway_id=request.data['data']['id']).credit_order
-
-            if credit_order.status != 1:
-                raise ValidationError({ "message": "Order already completed"})
-
-            credit_order.status = 2
-            credit_order.save()
-
-            credit = Credit.objects.get(user=credit_order.user)
-            credit.amount += credit_order.credit_pack.price
-            credit.save()
-            
-            send_user_email(
-                "Compra de créditos concluída",
-                "Seu pagamento foi realizado e seus créditos já foram adicionados à sua conta!!!\n Obrigado por usar nosso aplicativo.",
-                credit_order.user.email,
-            )
-
-            return Response(status=status.HTTP_200_OK)
-        except Exception as error:
-            transaction.set_rollback(True)
+            receive_webhook_event(event_type, request.data)
+        except InvalidWebhookEvent as error:
             raise ValidationError(error)
 
-    @transaction.atomic
-    @action(methods=['POST'], detail=False, url_path='order-canceled')
-    def order_canceled_webhook(self, request, *args, **kwargs):
-        try:
-            credit_order = GatewayCreditOrder.objects.get(credit_order_on_gateway_id=request.data['data']['id']).credit_order
-            credit_order.status = 3
-            credit_order.save()
+        return Response(status=status.HTTP_200_OK)
 
-            send_user_email(
-                email=request.user.email,
-                title="Compra de créditos cancelada",
-                message="Infelizmente sua compra foi cancelada."
-            )
+    @action(methods=['POST'], detail=False, url_path='order-paid')
+    def order_paid_webhook(self, request, *args, **kwargs):
+        return self.receive_event('order.paid', request)
 
-            return Response(status=status.HTTP_200_OK)
-        except Exception as error:
-            transaction.set_rollback(True)
-            raise ValidationError(error)
\ No newline at end of file
+    @action(methods=['POST'], detail=False, url_path='order-canceled')
+    def order_canceled_webhook(self, request, *args, **kwargs):
+        return self.receive_event('order.canceled', request)
@@ -0,0 +1,169 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.dispatch import enqueue
+from core.notifications import notify
+from .ledger import post_credit_transaction
+from .models import CreditOrder, Gateway, GatewayCreditOrder, PagarmeWebhookEvent
+from .tasks import process_pagarme_webhooks
+
+
+class InvalidWebhookEvent(Exception):
+    def __init__(self):
+        super().__init__('Evento de webhook inválido.')
+
+
+def receive_webhook_event(event_type, payload):
+    '''
+    Store a Pagar.me event in the inbox and queue the processing of its
+    credit order. A redelivered event (same ``id``) is stored once: the
+    insert is a single INSERT ... ON CONFLICT DO NOTHING.
+
+    Args:
+        event_type(str): 'order.paid' or 'order.canceled'
+        payload(dict): the webhook body
+
+    Raises:
+        InvalidWebhookEvent: the payload has no event or order id
+    '''
+    try:
+        event_id = str(payload['id'])
+        credit_order_on_gateway_id = str(payload['data']['id'])
+        occurred = parse_datetime(payload.get('created_at') or '')
+    except (KeyError, TypeError, ValueError):
+        raise InvalidWebhookEvent()
+
+    if len(event_id) > 60 or len(credit_order_on_gateway_id) > 150:
+        raise InvalidWebhookEvent()
+
+    if occurred is None:
+        occurred = timezone.now()
+    else:
+        if timezone.is_naive(occurred):
+            occurred = timezone.make_aware(occurred, timezone.utc)
+        if not settings.USE_TZ:
+            # stored in local TIME_ZONE like every other datetime, timezone.now() included
+            occurred = timezone.make_naive(occurred)
+
+    PagarmeWebhookEvent.objects.bulk_create([
+        PagarmeWebhookEvent(
+            event_id=event_id,
+            type=event_type,
+            credit_order_on_gateway_id=credit_order_on_gateway_id,
+            payload=payload,
+            occurred=occurred,
+        )
+    ], ignore_conflicts=True)
+
+    enqueue(process_pagarme_webhooks, credit_order_on_gateway_id)
+
+
+def order_paid(credit_order):
+    if credit_order.status != 1:
+        return False
+
+    credit_order.status = 2
+    credit_order.save()
+
+    post_credit_transaction(credit_order.user, credit_order.credit_pack.price, 2, credit_order=credit_order)     #purchase
+
+    notify(
+        email=credit_order.user.email,
+        subject="Compra de créditos concluída",
+        message=(
+            "Seu pagamento foi realizado e seus créditos já foram adicionados à sua conta!!!\n"
+            " Obrigado por usar nosso aplicativo."
+        ),
+        key=f'credit-order-paid:{credit_order.id}',
+    )
+    return True
+
+
+def order_canceled(credit_order):
+    # a paid order was already credited: canceling it would leave the user
+    # with the credits of a canceled purchase
+    if credit_order.status != 1:
+        return False
+
+    credit_order.status = 3
+    credit_order.save()
+
+    notify(
+        email=credit_order.user.email,
+        subject="Compra de créditos cancelada",
+        message="Infelizmente sua compra foi cancelada.",
+        key=f'credit-order-canceled:{credit_order.id}',
+    )
+    return True
+
+
+EVENT_HANDLERS = {
+    'order.paid': order_paid,
+    'order.canceled': order_canceled,
+}
+
+
+def link_credit_order(credit_orders, credit_order_on_gateway_id, events):
+    '''
+    The credit order whose charge got no answer, named by the ``code`` the
+    gateway echoes in its events, linked to the gateway order the events
+    belong to
+
+    Raises:
+        CreditOrder.DoesNotExist: no event names an order still without a link
+    '''
+    from .plugins.pagarme import GATEWAY
+
+    codes = {str((event.payload.get('data') or {}).get('code') or '') for event in events}
+    credit_order = credit_orders.get(
+        id__in=[code for code in codes if code.isdigit()], gatewaycreditorder__isnull=True,
+    )
+
+    GatewayCreditOrder.objects.create(
+        gateway=Gateway.objects.get_or_create(name=GATEWAY)[0],
+        credit_order=credit_order,
+        credit_order_on_gateway_id=credit_order_on_gateway_id,
+    )
+    return credit_order
+
+
+def process_webhook_events(credit_order_on_gateway_id):
+    '''
+    Apply the pending events of a credit order in the order they happened
+    on the gateway. The credit order stays locked meanwhile, so workers
+    holding events of the same order run one after the other. Events that
+    find the order already out of their reach (a paid event for a canceled
+    order, a cancel for a paid one, a repeated cancel) are marked ignored.
+
+    Returns:
+        processed(int): events applied to the order
+
+    Raises:
+        CreditOrder.DoesNotExist: the order is not saved, or not linked and not
+            named by the code of its events yet; its events stay pending
+    '''
+    with transaction.atomic():
+        credit_orders = CreditOrder.objects.select_for_update(of=('self',)).select_related('credit_pack', 'user')
+        events = list(
+            PagarmeWebhookEvent.objects
+            .filter(credit_order_on_gateway_id=credit_order_on_gateway_id, status=1)
+            .order_by('occurred', 'id')
+        )
+
+        try:
+            credit_order = credit_orders.get(gatewaycreditorder__credit_order_on_gateway_id=credit_order_on_gateway_id)
+        except CreditOrder.DoesNotExist:
+            credit_order = link_credit_order(credit_orders, credit_order_on_gateway_id, events)
+
+        processed = 0
+        for event in events:
+            applied = EVENT_HANDLERS[event.type](credit_order)
+            event.status = 2 if applied else 3     #processed / ignored
+            event.processed = timezone.now()
+            processed += applied
+
+        PagarmeWebhookEvent.objects.bulk_update(events, ['status', 'processed'])
+
+    return processed
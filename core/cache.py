@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from hashlib import md5
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from core import dispatch
+
+CACHE_TIMEOUT = 60 * 5
+CACHE_GROUPS = ['places', 'week-days', 'spots', 'credit-packs', 'payment-methods']
+STATS_FLUSH_INTERVAL = 30
+
+# hits and misses of this process not yet added to the shared counters
+_counts = Counter()
+_counts_flushed = [time.monotonic()]
+_counts_lock = threading.Lock()
+
+
+def group_version_key(group):
+    return f'cache:{group}:version'
+
+
+def group_stats_key(group, result):
+    return f'cache:{group}:{result}'
+
+
+def group_version(group):
+    return cache.get_or_set(group_version_key(group), 1, timeout=None)
+
+
+def cache_key(group, *parts):
+    '''
+    Key of an entry inside a group; bumping the group version orphans every
+    entry created with the previous one
+    '''
+    digest = md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'cache:{group}:v{group_version(group)}:{digest}'
+
+
+def invalidate(*groups):
+    for group in groups:
+        key = group_version_key(group)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def invalidate_on_commit(*groups):
+    '''
+    Invalidate now and again once the current transaction commits, so a
+    concurrent request can't cache the rows that are about to change
+    '''
+    invalidate(*groups)
+    dispatch.on_commit(invalidate, *groups)
+
+
+def count(group, result):
+    '''
+    Count a hit or a miss in this process; the counts reach the shared
+    counters at most every STATS_FLUSH_INTERVAL seconds, so a cached
+    response does not pay a cache round trip for its statistics
+    '''
+    with _counts_lock:
+        _counts[group_stats_key(group, result)] += 1
+        due = time.monotonic() - _counts_flushed[0] >= STATS_FLUSH_INTERVAL
+
+    if due:
+        flush_counts()
+
+
+def flush_counts():
+    with _counts_lock:
+        counts = dict(_counts)
+        _counts.clear()
+        _counts_flushed[0] = time.monotonic()
+
+    for key, delta in counts.items():
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # the first count of the group, unless a concurrent one added it
+            if not cache.add(key, delta, timeout=None):
+                cache.incr(key, delta)
+
+
+def stats(groups=CACHE_GROUPS):
+    '''
+    Returns:
+        stats(dict): hits and misses counted for each group; the other
+            processes report theirs within STATS_FLUSH_INTERVAL seconds
+    '''
+    flush_counts()
+    keys = [group_stats_key(group, result) for group in groups for result in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    return {
+        group: {
+            'hits': values.get(group_stats_key(group, 'hits'), 0),
+            'misses': values.get(group_stats_key(group, 'misses'), 0),
+        }
+        for group in groups
+    }
+
+
+def request_cache_key(group, request, vary=None):
+    '''
+    Key of a GET request: host (URLs in responses are absolute), path, the
+    query string with parameters and values sorted, and what ``vary``
+    returns for the request
+    '''
+    query = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    parts = [request.get_host(), request.path, query]
+    if vary is not None:
+        parts.append(vary(request))
+    return cache_key(group, *parts)
+
+
+def cache_response(group, timeout=CACHE_TIMEOUT, vary=None):
+    '''
+    Cache the data of successful responses of a viewset action.
+
+    Authentication and permissions run before the action, so only requests
+    that would be served reach the cache. Responses carry ``X-Cache: HIT``
+    or ``X-Cache: MISS``.
+
+    ``vary`` is an optional callable of the request returning anything else
+    the response depends on, such as a header the serializers read; each
+    value it returns gets its own entry.
+    '''
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            key = request_cache_key(group, request, vary)
+            data = cache.get(key)
+
+            if data is not None:
+                count(group, 'hits')
+                response = Response(data=data, status=status.HTTP_200_OK)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            count(group, 'misses')
+            response = func(view, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, timeout)
+            response['X-Cache'] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
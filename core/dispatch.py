@@ -0,0 +1,100 @@
+import weakref
+
+from django.db import transaction
+
+
+class SideEffect:
+    '''
+    A call deferred to the commit of the current transaction. Calls of the
+    same function with the same arguments are equal.
+    '''
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __eq__(self, other):
+        return isinstance(other, SideEffect) and (self.func, self.args, self.kwargs) == (other.func, other.args, other.kwargs)
+
+    def __call__(self):
+        return self.func(*self.args, **self.kwargs)
+
+    def __repr__(self):
+        return f'SideEffect({self.func!r}, {self.args!r}, {self.kwargs!r})'
+
+
+class PendingSideEffects:
+    '''
+    The side effects added to the current transaction, each with the
+    savepoints open when it was added. It is registered with
+    transaction.on_commit itself, so Django drops it along with the
+    callbacks when the transaction commits or rolls back. Registered inside
+    a savepoint that rolls back, it goes away early: the calls still waiting
+    may then be added once more, which the tasks queued this way tolerate.
+    '''
+    def __init__(self):
+        self.entries = []
+
+    def __contains__(self, entry):
+        return entry in self.entries
+
+    def add(self, entry):
+        self.entries.append(entry)
+
+    def __call__(self):
+        self.entries.clear()
+
+
+_pending = weakref.WeakKeyDictionary()
+
+
+def on_commit(func, *args, **kwargs):
+    '''
+    Call ``func(*args, **kwargs)`` once the current transaction commits, or
+    right away outside of one. Nothing runs when the transaction or the
+    savepoint of the call rolls back, and a call already waiting for the
+    same commit from the same savepoint is not added twice.
+    '''
+    side_effect = SideEffect(func, args, kwargs)
+    connection = transaction.get_connection()
+
+    if not connection.in_atomic_block:
+        transaction.on_commit(side_effect)
+        return
+
+    # savepoint ids are never reused on a connection: an entry with the same
+    # ids was added in savepoints that are all still open, so its call is
+    # still waiting. Blocks without a savepoint (None) roll back with the
+    # enclosing one.
+    entry = (tuple(sid for sid in connection.savepoint_ids if sid is not None), side_effect)
+    pending = _pending_side_effects(connection)
+    if entry in pending:
+        return
+
+    pending.add(entry)
+    transaction.on_commit(side_effect)
+
+
+def _pending_side_effects(connection):
+    '''
+    The PendingSideEffects of the transaction open on ``connection``. Only a
+    weak reference is kept here: once Django drops it, the next call starts
+    a new one.
+    '''
+    reference = _pending.get(connection)
+    pending = reference() if reference is not None else None
+
+    if pending is None:
+        pending = PendingSideEffects()
+        transaction.on_commit(pending)
+        _pending[connection] = weakref.ref(pending)
+
+    return pending
+
+
+def enqueue(task, *args, **kwargs):
+    '''
+    Queue a Celery task once the current transaction commits, so the worker
+    sees the rows it was queued for and a rolled back request queues nothing
+    '''
+    on_commit(task.delay, *args, **kwargs)
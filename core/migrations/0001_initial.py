@@ -0,0 +1,36 @@
+# Generated by Django 3.2.18 on 2026-10-18 23:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254, verbose_name='E-mail')),
+                ('subject', models.CharField(max_length=255, verbose_name='Assunto')),
+                ('message', models.TextField(verbose_name='Mensagem')),
+                ('key', models.CharField(max_length=150, unique=True, verbose_name='Chave')),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'sent'), (3, 'failed')], default=1, verbose_name='Situação')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Tentativas')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+                ('sent', models.DateTimeField(null=True, verbose_name='Data de envio')),
+            ],
+            options={
+                'verbose_name': 'Notificação',
+                'verbose_name_plural': 'Notificações',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['id'], name='notification_pending_idx'),
+        ),
+    ]
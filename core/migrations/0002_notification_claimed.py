@@ -0,0 +1,23 @@
+# Generated by Django 3.2.18 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='claimed',
+            field=models.DateTimeField(null=True, verbose_name='Início do envio'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'pending'), (2, 'sent'), (3, 'failed'), (4, 'sending')], default=1, verbose_name='Situação'),
+        ),
+    ]
@@ -1,3 +1,30 @@
 from django.db import models
 
-# Create your models here.
+
+class Notification(models.Model):
+    STATUS_CHOICES = [
+        (1, 'pending'),     #aguardando envio
+        (2, 'sent'),        #enviada
+        (3, 'failed'),      #falhou após as tentativas
+        (4, 'sending'),     #sendo enviada
+    ]
+
+    email = models.EmailField(verbose_name='E-mail', null=False)
+    subject = models.CharField(verbose_name='Assunto', max_length=255, null=False)
+    message = models.TextField(verbose_name='Mensagem', null=False)
+    key = models.CharField(verbose_name='Chave', max_length=150, unique=True)
+    status = models.PositiveSmallIntegerField(verbose_name='Situação', choices=STATUS_CHOICES, null=False, default=1)
+    attempts = models.PositiveSmallIntegerField(verbose_name='Tentativas', null=False, default=0)
+    created = models.DateTimeField(verbose_name='Data de criação', auto_now_add=True)
+    sent = models.DateTimeField(verbose_name='Data de envio', null=True)
+    claimed = models.DateTimeField(verbose_name='Início do envio', null=True)
+
+    class Meta:
+        verbose_name = 'Notificação'
+        verbose_name_plural = 'Notificações'
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(status=1), name='notification_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id}: {self.email} - {self.subject}'
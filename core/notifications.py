@@ -0,0 +1,136 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import models, transaction
+from django.utils import timezone
+
+from .dispatch import enqueue
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def notify(email, subject, message, key):
+    '''
+    Queue an e-mail in the notification outbox, in the transaction of the
+    caller, and flush the outbox from a Celery worker once it commits: no
+    SMTP work happens on the request. The CELERYBEAT_SCHEDULE flush sends
+    what a failed or crashed flush left pending.
+
+    Args:
+        key(str): names the event that triggers the e-mail (e.g.
+            ``credit-order-paid:<id>``): a notification is sent once per key,
+            so retries of the same event don't send it twice
+    '''
+    from .tasks import flush_notifications
+
+    Notification.objects.bulk_create(
+        [Notification(email=email, subject=subject, message=message, key=key)], ignore_conflicts=True,
+    )
+    # one flush for all the notifications of the transaction
+    enqueue(flush_notifications)
+
+
+def claim_notifications(after_id, batch_size):
+    '''
+    Mark the next pending notifications as being sent, in a transaction
+    that ends before any of them is. Rows are picked with SKIP LOCKED, so
+    concurrent flushes never claim the same one; a claim older than
+    CLAIM_TIMEOUT was left by a crashed worker and is taken over.
+
+    Returns:
+        claimed(datetime): the claim, to record the results with
+        batch(list): the claimed notifications, attempts already counted
+    '''
+    claimed = timezone.now()
+    claimable = models.Q(status=1) | models.Q(status=4, claimed__lt=claimed - CLAIM_TIMEOUT)
+
+    with transaction.atomic():
+        pending = Notification.objects.select_for_update(skip_locked=True).filter(claimable, id__gt=after_id)
+        batch = list(pending.order_by('id')[:batch_size])
+        Notification.objects.filter(id__in=[notification.id for notification in batch]).update(
+            status=4, claimed=claimed, attempts=models.F('attempts') + 1,
+        )
+
+    for notification in batch:
+        notification.attempts += 1
+
+    return claimed, batch
+
+
+def release_notifications(claimed, batch, sent_ids=()):
+    '''
+    Record the results of a claimed batch: the sent ones are done, the others
+    are tried again by a later flush until they reach MAX_ATTEMPTS. Only the
+    worker still holding the claim records them.
+    '''
+    claim = Notification.objects.filter(status=4, claimed=claimed)
+    failed = [notification for notification in batch if notification.id not in sent_ids]
+
+    claim.filter(id__in=sent_ids).update(status=2, sent=timezone.now())
+    claim.filter(id__in=[notification.id for notification in failed if notification.attempts >= MAX_ATTEMPTS]).update(status=3)
+    claim.filter(id__in=[notification.id for notification in failed if notification.attempts < MAX_ATTEMPTS]).update(status=1)
+
+
+def send_pending_notifications(batch_size=100):
+    '''
+    Send the pending notifications over a single SMTP connection, a batch
+    at a time. Each batch is claimed before it is sent and its results are
+    recorded afterwards, so no row stays locked while the SMTP server
+    answers. The connection is only opened once there is something to
+    send; a failed message is tried again on the next flush, MAX_ATTEMPTS
+    times.
+
+    Returns:
+        sent(int): notifications sent
+    '''
+    sent = 0
+    last_id = 0
+    connection = None
+    try:
+        while True:
+            claimed, batch = claim_notifications(last_id, batch_size)
+            if not batch:
+                break
+
+            sent_ids = set()
+            try:
+                if connection is None:
+                    connection = get_connection()
+                    connection.open()
+
+                for notification in batch:
+                    email = EmailMessage(
+                        subject=notification.subject,
+                        body=notification.message,
+                        from_email=getattr(settings, 'EMAIL_HOST_USER', None),
+                        to=[notification.email],
+                        connection=connection,
+                    )
+                    try:
+                        email.send()
+                    except Exception:
+                        logger.exception('Could not send notification %s', notification.id)
+                        continue
+                    sent_ids.add(notification.id)
+            except Exception:
+                # the SMTP server could not be reached: the batch counts the attempt
+                logger.exception('Could not connect to send notifications')
+                break
+            finally:
+                release_notifications(claimed, batch, sent_ids)
+
+            sent += len(sent_ids)
+            last_id = batch[-1].id
+            if len(batch) < batch_size:
+                break
+    finally:
+        if connection is not None:
+            connection.close()
+
+    return sent
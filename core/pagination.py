@@ -0,0 +1,112 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ListingPagination(LimitOffsetPagination):
+    '''
+    Limit/offset pagination with two opt-in modes:
+
+    * ``?count=false`` skips the COUNT(*) query; ``next`` is found by
+      fetching one row past the page
+    * ``?cursor=`` (empty for the first page) pages by keyset, newest first,
+      on ``(view.cursor_field, id)``: each page is an index range scan
+      whatever its depth. Only views that set ``cursor_field`` accept it and
+      the requested ordering is ignored in this mode.
+    '''
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.cursor_field = getattr(view, 'cursor_field', None)
+        self.use_cursor = self.cursor_field is not None and self.cursor_query_param in request.query_params
+        self.use_count = request.query_params.get(self.count_query_param, 'true').lower() not in ('false', '0')
+
+        if self.use_cursor:
+            return self.paginate_by_cursor(queryset, request)
+
+        if self.use_count:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.offset = self.get_offset(request)
+        self.count = None
+        page = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(page) > self.limit
+        return page[:self.limit]
+
+    def paginate_by_cursor(self, queryset, request):
+        field = self.cursor_field
+        queryset = queryset.order_by(f'-{field}', '-id')
+
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            # the lte bound is an index range, the or only filters its edge
+            queryset = queryset.filter(Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(id__lt=pk)))
+
+        page = list(queryset[:self.limit + 1])
+        self.has_next = len(page) > self.limit
+        page = page[:self.limit]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def encode_cursor(self, instance):
+        value = getattr(instance, self.cursor_field)
+        data = json.dumps([value.isoformat(), instance.id]).encode()
+        return urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            value, pk = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return value, pk
+
+    def get_next_link(self):
+        if self.use_count and not self.use_cursor:
+            return super().get_next_link()
+
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        if self.use_cursor:
+            return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_previous_link(self):
+        # keyset pages only go forward; the first page has an empty cursor
+        if self.use_cursor:
+            return None
+        return super().get_previous_link()
+
+    def get_paginated_response(self, data):
+        if self.use_count and not self.use_cursor:
+            return super().get_paginated_response(data)
+
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
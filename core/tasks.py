@@ -0,0 +1,8 @@
+from celery import task
+
+
+@task(name='flush_notifications')
+def flush_notifications():
+    from .notifications import send_pending_notifications
+
+    return send_pending_notifications()
@@ -1,3 +1,417 @@
-from django.test import TestCase
+import json
+from datetime import datetime
+from smtplib import SMTPException
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+from model_bakery import baker
+
+from asset.models import Banner
+from core import dispatch
+from core.cache import flush_counts
+from core.models import Notification
+from core.notifications import notify, send_pending_notifications
+from core.tasks import flush_notifications
+from events.models import Cancellation, EventOrder
+from places.filters import LocalTypeFilter, StatusFilter, UserFilter
+from places.models import PlaceAds
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        flush_counts()
+        cache.clear()
+        self.user = baker.make('authentication.User')
+
+    def test_list_place_ads_is_cached_until_a_place_ads_changes(self):
+        place_ads = baker.make('places.PlaceAds', place_title='Casa de praia', local_type=1, status=1)
+
+        self.client.force_authenticate(self.user)
+        url = reverse("places_urls:places-ads-list")
+        response = self.client.get(url, {'status': 1, 'local_type': [2, 1]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'local_type': [1, 2], 'status': 1}, format='json')
+
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['results'][0]['place_title'], 'Casa de praia')
+
+        place_ads.place_title = 'Chácara'
+        place_ads.save()
+        response = self.client.get(url, {'status': 1, 'local_type': [2, 1]}, format='json')
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['place_title'], 'Chácara')
+
+    def test_only_responses_with_assets_vary_by_the_accepted_image_formats(self):
+        baker.make('places.PlaceAds', local_type=1, status=1)
+        self.client.force_authenticate(self.user)
+
+        url = reverse("places_urls:days-list")
+        self.assertEqual(self.client.get(url, format='json', HTTP_ACCEPT='application/json')['X-Cache'], 'MISS')
+        response = self.client.get(url, format='json', HTTP_ACCEPT='application/json, image/webp')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        url = reverse("places_urls:places-ads-list")
+        self.assertEqual(self.client.get(url, format='json', HTTP_ACCEPT='application/json')['X-Cache'], 'MISS')
+        response = self.client.get(url, format='json', HTTP_ACCEPT='application/json, image/webp')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response = self.client.get(url, format='json', HTTP_ACCEPT='application/json, image/webp;q=1')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_credit_packs_are_cached_after_permission_checks(self):
+        baker.make('checkout.CreditPack')
+        url = reverse("checkout_urls:credit-pack-list")
+
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(url, format='json')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url, format='json')['X-Cache'], 'HIT')
+
+        self.client.force_authenticate(None)
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_stats(self):
+        url = reverse("places_urls:days-list")
+        with mock.patch('core.cache.STATS_FLUSH_INTERVAL', 3600), mock.patch('core.cache.cache.incr', wraps=cache.incr) as incr:
+            self.client.get(url, format='json')
+            self.client.get(url, format='json')
+            self.client.get(url, format='json')
+
+        # the counts wait in the process until the stats are read
+        incr.assert_not_called()
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('cache-stats'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(baker.make('authentication.User', is_staff=True))
+        response = self.client.get(reverse('cache-stats'), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['week-days'], {'hits': 2, 'misses': 1})
+
+
+class ListingPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = baker.make('authentication.User')
+        self.client.force_authenticate(self.user)
+        self.url = reverse("places_urls:places-ads-list")
+
+        place_ads = baker.make('places.PlaceAds', local_type=1, _quantity=5)
+        # two ads share a timestamp: the id breaks the tie
+        for ads, day in zip(place_ads, [1, 2, 2, 3, 4]):
+            type(ads).objects.filter(id=ads.id).update(created_at=datetime(2026, 1, day, 12))
+        self.newest_first = [place_ads[4].id, place_ads[3].id, place_ads[2].id, place_ads[1].id, place_ads[0].id]
+
+    def test_cursor_pages_follow_created_at_and_id(self):
+        ids = []
+        url = f'{self.url}?cursor=&limit=2'
+        while url:
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            self.assertIsNone(response.data['previous'])
+            ids += [ads['id'] for ads in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(ids, self.newest_first)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'nope'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_count_false_skips_the_count_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, {'limit': 2, 'offset': 2, 'count': 'false'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIn('offset=4', response.data['next'])
+        self.assertNotIn('offset', response.data['previous'])
+        self.assertFalse([query for query in context.captured_queries if 'COUNT(' in query['sql']])
+
+        response = self.client.get(self.url, {'limit': 2, 'offset': 4, 'count': 'false'}, format='json')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_is_ignored_without_a_cursor_field(self):
+        response = self.client.get(reverse("places_urls:days-list"), {'cursor': ''}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('count', response.data)
+
+
+def full_scans(queryset):
+    '''
+    Tables a query reads in full once sequential scans are disabled
+
+    With enable_seqscan off the planner takes any index path that exists, so
+    a Seq Scan left in the plan, or an index scan without an Index Cond on a
+    non-partial index, means no index serves the filter.
+
+    Returns:
+        tables(set): names of the tables read in full
+    '''
+    sql, params = queryset.query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT indexname, tablename, indexdef FROM pg_indexes')
+        indexes = {name: (table, ' WHERE ' in definition) for name, table, definition in cursor.fetchall()}
+
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+    tables = set()
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        nodes += node.get('Plans', [])
+
+        if node['Node Type'] == 'Seq Scan':
+            tables.add(node['Relation Name'])
+        elif 'Index Name' in node and 'Index Cond' not in node:
+            table, partial = indexes[node['Index Name']]
+            if not partial:
+                tables.add(table)
+
+    return tables
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans are checked on PostgreSQL')
+class QueryPlanTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # thousands of rows spread over many owners, types and statuses, and a
+        # user with a handful of them: the statistics then favour selective
+        # paths over reading a small table whole
+        users = baker.make('authentication.User', _quantity=50)
+        address = baker.make('places.Address')
+        cls.user = baker.make('authentication.User')
+
+        place_ads = PlaceAds.objects.bulk_create([
+            PlaceAds(user=users[index % 50], address=address, place_title='Casa', place_description='Casa',
+                     local_type=index % 4 + 1, capacity=10, status=1 if index % 10 == 0 else 2)
+            for index in range(2000)
+        ])
+        own_place_ads = baker.make('places.PlaceAds', user=cls.user, address=address, _quantity=2)
+
+        event_orders = EventOrder.objects.bulk_create([
+            EventOrder(user=user, place_ads=ads, owner=ads.user, dates_selected=[datetime(2026, 1, 1)],
+                       title='Evento', description='Evento', price=100, plan_type=1)
+            for user, ads in [(users[index % 50], place_ads[index * 7 % 2000]) for index in range(4000)]
+            + [(cls.user, place_ads[0]), (cls.user, place_ads[1]), (users[0], own_place_ads[0]), (users[1], own_place_ads[1])]
+        ])
+        Cancellation.objects.bulk_create([
+            Cancellation(event_order=event_order, justification='Motivo') for event_order in event_orders[::2]
+        ])
+
+        cls.spot = baker.make('asset.Spot')
+        baker.make('asset.Banner', spot=cls.spot, expires=iter(datetime(2025, 1 + index % 12, 1) for index in range(200)),
+                   _quantity=200)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def filtered_place_ads(self, params):
+        request = Request(APIRequestFactory().get('/', params))
+        queryset = PlaceAds.objects.all()
+        for backend in (LocalTypeFilter, UserFilter, StatusFilter):
+            queryset = backend().filter_queryset(request, queryset, None)
+        return queryset.order_by('-created_at')
+
+    def test_open_place_ads_by_type(self):
+        queryset = self.filtered_place_ads({'status': 1, 'local_type': [1, 2]})
+        self.assertNotIn('places_placeads', full_scans(queryset))
+
+    def test_place_ads_of_a_user(self):
+        queryset = self.filtered_place_ads({'user': self.user.id})
+        self.assertNotIn('places_placeads', full_scans(queryset))
+
+    def test_event_orders_involving_a_user(self):
+        self.assertEqual(full_scans(EventOrder.objects.involving(self.user).order_by('-created_at')), set())
+
+    def test_cancellations_involving_a_user(self):
+        queryset = Cancellation.objects.filter(event_order__in=EventOrder.objects.involving(self.user))
+        self.assertEqual(full_scans(queryset), set())
+
+    def test_banners_of_a_spot(self):
+        queryset = Banner.objects.filter(spot=self.spot, expires__gt=datetime(2026, 1, 1))
+        self.assertEqual(full_scans(queryset), set())
+
+    def test_or_across_the_join_reads_every_order(self):
+        # the query EventOrderViewSet.list used to run: the check must catch it
+        queryset = EventOrder.objects.filter(Q(user=self.user) | Q(place_ads__user=self.user))
+        self.assertIn('events_eventorder', full_scans(queryset))
+
+
+class NotificationTests(APITestCase):
+    def test_notifications_are_sent_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            notify('user@hotmail.com', 'Assunto', 'Mensagem', key='test:1')
+
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Notification.objects.get().status, 1)
+
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@hotmail.com'])
+        self.assertEqual(Notification.objects.get().status, 2)
+
+    def test_notifications_are_sent_once_per_key(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notify('user@hotmail.com', 'Recuperação de senha', 'Código', key='password-reset:1')
+            notify('user@hotmail.com', 'Recuperação de senha', 'Código', key='password-reset:1')
+            # the same text for another event is sent again
+            notify('user@hotmail.com', 'Recuperação de senha', 'Código', key='password-reset:2')
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_pending_notifications_are_flushed_periodically(self):
+        schedule = [entry['task'] for entry in settings.CELERYBEAT_SCHEDULE.values()]
+        self.assertIn(flush_notifications.name, schedule)
+
+    def test_flush_sends_batches_over_one_connection(self):
+        for index in range(5):
+            notify(f'user{index}@hotmail.com', 'Assunto', 'Mensagem', key=f'test:{index}')
+
+        with mock.patch('core.notifications.get_connection', wraps=get_connection) as connection:
+            sent = send_pending_notifications(batch_size=2)
+
+        self.assertEqual(sent, 5)
+        self.assertEqual(connection.call_count, 1)
+        self.assertEqual([message.to[0] for message in mail.outbox], [f'user{index}@hotmail.com' for index in range(5)])
+        self.assertEqual(send_pending_notifications(), 0)
+
+    def test_failed_notifications_are_tried_on_the_next_flushes(self):
+        notify('user@hotmail.com', 'Assunto', 'Mensagem', key='test:1')
+
+        with mock.patch.object(EmailMessage, 'send', side_effect=SMTPException):
+            for attempt in range(3):
+                self.assertEqual(send_pending_notifications(), 0)
+
+        notification = Notification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), (3, 3))
+
+    def test_flush_connects_only_when_something_is_pending(self):
+        with mock.patch('core.notifications.get_connection', wraps=get_connection) as connection:
+            self.assertEqual(send_pending_notifications(), 0)
+
+        connection.assert_not_called()
+
+    def test_unreachable_smtp_server_counts_the_attempts(self):
+        notify('user@hotmail.com', 'Assunto', 'Mensagem', key='test:1')
+
+        broken = mock.Mock(**{'open.side_effect': SMTPException})
+        with mock.patch('core.notifications.get_connection', return_value=broken):
+            for attempt in range(3):
+                self.assertEqual(send_pending_notifications(), 0)
+
+        notification = Notification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), (3, 3))
+        self.assertEqual(broken.close.call_count, 3)
+
+    def test_notifications_are_sent_outside_the_claiming_transaction(self):
+        notify('user@hotmail.com', 'Assunto', 'Mensagem', key='test:1')
+        outside = len(connection.savepoint_ids)
+        send = EmailMessage.send
+        during_send = []
+
+        def record_send(message, *args, **kwargs):
+            during_send.append((len(connection.savepoint_ids), Notification.objects.get().status))
+            return send(message, *args, **kwargs)
+
+        with mock.patch.object(EmailMessage, 'send', autospec=True, side_effect=record_send):
+            self.assertEqual(send_pending_notifications(), 1)
+
+        # no transaction of the flush is open, and the row is claimed as sending
+        self.assertEqual(during_send, [(outside, 4)])
+        self.assertEqual(Notification.objects.get().status, 2)
+
+
+class SideEffectDispatchTests(APITestCase):
+    def test_side_effects_wait_for_the_commit(self):
+        side_effect = mock.Mock()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                dispatch.on_commit(side_effect, 1, key='a')
+                dispatch.on_commit(side_effect, 1, key='a')
+                dispatch.on_commit(side_effect, 2)
+
+            side_effect.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(side_effect.call_args_list, [mock.call(1, key='a'), mock.call(2)])
+
+    def test_side_effects_of_a_rollback_never_run(self):
+        side_effect = mock.Mock()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    dispatch.on_commit(side_effect, 1)
+                    raise ValueError
+            except ValueError:
+                pass
+
+            # a call dropped with its savepoint is added again by a later one
+            with transaction.atomic():
+                with transaction.atomic():
+                    dispatch.on_commit(side_effect, 2)
+                    transaction.set_rollback(True)
+                dispatch.on_commit(side_effect, 2)
+
+        self.assertEqual(side_effect.call_args_list, [mock.call(2)])
+
+    def test_tasks_are_queued_once_per_commit(self):
+        task = mock.Mock()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for index in range(3):
+                dispatch.enqueue(task, 7)
+
+        task.delay.assert_called_once_with(7)
+
+    def test_side_effects_are_added_again_once_their_record_rolled_back(self):
+        side_effect = mock.Mock()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # the first call of the transaction starts its record inside the savepoint
+            try:
+                with transaction.atomic():
+                    dispatch.on_commit(side_effect, 1)
+                    raise ValueError
+            except ValueError:
+                pass
+
+            dispatch.on_commit(side_effect, 1)
+            with transaction.atomic(savepoint=False):
+                dispatch.on_commit(side_effect, 1)
+
+        side_effect.assert_called_once_with(1)
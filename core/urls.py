@@ -1,9 +1,10 @@
 from django.urls import path, include
-from .views import api, public
+from .views import api, cache_stats, public
 
 urlpatterns = [
     path('', public, name='public'),
     path('api/', api, name='api'),
+    path('api/cache-stats/', cache_stats, name='cache-stats'),
     path('api/asset/', include('asset.urls')),
     path('api/authentication/', include('authentication.urls')),
     path('api/events/', include('events.urls')),
@@ -1,5 +1,10 @@
 
 from django.shortcuts import redirect, render
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .cache import stats
 
 # Create your views here.
 
@@ -10,3 +15,9 @@ def api(request):
 
 def public(request):
     return render(request, 'public.html', {})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response(data=stats())
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import EventOrder, Cancellation, History
+from .models import EventOrder, Booking, Cancellation, History
 
 # Register your models here.
 admin.site.register(EventOrder)
+admin.site.register(Booking)
 admin.site.register(Cancellation)
 admin.site.register(History)
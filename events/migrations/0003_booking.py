@@ -0,0 +1,46 @@
+# Generated by Django 3.2.18 on 2026-10-18 17:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def book_accepted_orders(apps, schema_editor):
+    EventOrder = apps.get_model('events', 'EventOrder')
+    Booking = apps.get_model('events', 'Booking')
+
+    # oldest accepted order keeps a date that was double booked before
+    bookings = []
+    for event_order in EventOrder.objects.filter(status=2).order_by('id').iterator():
+        for date in sorted({date.date() for date in event_order.dates_selected}):
+            bookings.append(Booking(event_order_id=event_order.id, place_ads_id=event_order.place_ads_id, date=date))
+
+    Booking.objects.bulk_create(bookings, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0014_placeads_search_vector'),
+        ('events', '0002_auto_20211128_1124'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Booking',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Data reservada')),
+                ('event_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='events.eventorder', verbose_name='Evento')),
+                ('place_ads', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='places.placeads', verbose_name='Anúncio')),
+            ],
+            options={
+                'verbose_name': 'Reserva',
+                'verbose_name_plural': 'Reservas',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(fields=('place_ads', 'date'), name='booking_unique_place_date'),
+        ),
+        migrations.RunPython(book_accepted_orders, migrations.RunPython.noop),
+    ]
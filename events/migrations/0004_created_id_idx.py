@@ -0,0 +1,21 @@
+# Generated by Django 3.2.18 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_booking'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cancellation',
+            index=models.Index(fields=['created_at', 'id'], name='cancellation_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventorder',
+            index=models.Index(fields=['created_at', 'id'], name='eventorder_created_id_idx'),
+        ),
+    ]
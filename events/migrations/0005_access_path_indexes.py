@@ -0,0 +1,21 @@
+# Generated by Django 3.2.18 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventorder',
+            index=models.Index(fields=['user', 'status'], name='eventorder_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventorder',
+            index=models.Index(fields=['place_ads', 'status'], name='eventorder_place_status_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.18 on 2026-10-18 22:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def copy_place_owners(apps, schema_editor):
+    EventOrder = apps.get_model('events', 'EventOrder')
+    PlaceAds = apps.get_model('places', 'PlaceAds')
+
+    EventOrder.objects.update(owner=Subquery(PlaceAds.objects.filter(id=OuterRef('place_ads')).values('user')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('places', '0016_access_path_indexes'),
+        ('events', '0005_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventorder',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='received_event_orders', to='authentication.user', verbose_name='Dono'),
+        ),
+        migrations.RunPython(copy_place_owners, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='eventorder',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='received_event_orders', to='authentication.user', verbose_name='Dono'),
+        ),
+        migrations.AddIndex(
+            model_name='eventorder',
+            index=models.Index(fields=['owner', 'status'], name='eventorder_owner_status_idx'),
+        ),
+    ]
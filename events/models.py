@@ -5,6 +5,17 @@ from django.contrib.postgres.fields import ArrayField
 # Create your models here.
 
 
+class EventOrderQuerySet(models.QuerySet):
+    def involving(self, user):
+        '''
+        Orders the user placed or received as owner of the place
+
+        Both sides are columns of the order itself, so the OR is served by
+        the user and owner indexes instead of a join with places.
+        '''
+        return self.filter(models.Q(user=user) | models.Q(owner=user))
+
+
 class EventOrder(models.Model):
     STATUS = [
         (1, "open"),
@@ -20,6 +31,9 @@ class EventOrder(models.Model):
 
     user = models.ForeignKey('authentication.User', verbose_name="Cliente", on_delete=models.CASCADE)
     place_ads = models.ForeignKey('places.PlaceAds', verbose_name="Anúncio",on_delete=models.CASCADE, null=False, blank=False)
+    # copy of place_ads.user, kept in sync by save() and the places signals
+    owner = models.ForeignKey(
+        'authentication.User', verbose_name="Dono", related_name='received_event_orders', on_delete=models.CASCADE)
     dates_selected = ArrayField(models.DateTimeField(verbose_name="Data de criação"))
     title = models.CharField(verbose_name='Título do evento', max_length=45, null=False)
     description = models.CharField(verbose_name='Descrição do evento', max_length=255, null=False)
@@ -28,14 +42,45 @@ class EventOrder(models.Model):
     plan_type = models.PositiveSmallIntegerField(verbose_name='Tipo de plano', choices=PLAN_TYPE, null=False)
     created_at = models.DateTimeField(verbose_name="Data de criação", auto_now_add=True)
 
+    objects = EventOrderQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Evento"
         verbose_name_plural = "Eventos"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='eventorder_created_id_idx'),
+            models.Index(fields=['user', 'status'], name='eventorder_user_status_idx'),
+            models.Index(fields=['place_ads', 'status'], name='eventorder_place_status_idx'),
+            models.Index(fields=['owner', 'status'], name='eventorder_owner_status_idx'),
+        ]
 
     def __str__(self):
         return f'{self.id}: {self.title} - {self.created_at}'
 
+    def save(self, *args, **kwargs):
+        # orders never move to another place; its owner changes go through
+        # the places signals
+        if self._state.adding:
+            self.owner_id = self.place_ads.user_id
+        super().save(*args, **kwargs)
+
 
+class Booking(models.Model):
+    event_order = models.ForeignKey(
+        'events.EventOrder', verbose_name='Evento', related_name='bookings', on_delete=models.CASCADE)
+    place_ads = models.ForeignKey(
+        'places.PlaceAds', verbose_name="Anúncio", related_name='bookings', on_delete=models.CASCADE)
+    date = models.DateField(verbose_name="Data reservada")
+
+    class Meta:
+        verbose_name = "Reserva"
+        verbose_name_plural = "Reservas"
+        constraints = [
+            models.UniqueConstraint(fields=['place_ads', 'date'], name='booking_unique_place_date'),
+        ]
+
+    def __str__(self):
+        return f'{self.id}: {self.place_ads_id} - {self.date}'
 
 
 class Cancellation(models.Model):
@@ -52,6 +97,9 @@ class Cancellation(models.Model):
     class Meta:
         verbose_name = "Cancelamento"
         verbose_name_plural = "Cancelamentos"
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='cancellation_created_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.id} in {self.event_order.title}: "{self.justification}"'
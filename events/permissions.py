@@ -1,7 +1,7 @@
 from rest_framework import permissions
 from rest_framework.exceptions import ValidationError
 
-from events.models import EventOrder
+from events.utils import get_event_order
 from places.models import PlaceAds
 
 
@@ -22,7 +22,7 @@ class EventOrderPermissions(permissions.BasePermission):
             return True
         
         elif request.method in permissions.SAFE_METHODS:
-            return obj.user == request.user or obj.place_ads.user == request.user
+            return request.user.id in (obj.user_id, obj.owner_id)
         
         else:
             return False
@@ -35,10 +35,8 @@ class CancellationPermissions(permissions.BasePermission):
                 return request.user.is_authenticated 
 
             if request.method in ['POST']:
-                event_order = EventOrder.objects.get(id=request.data['event_order'])
-                user_orderer = event_order.user
-                user_owner = event_order.place_ads.user
-                return request.user.is_authenticated and (user_orderer == request.user or user_owner == request.user)
+                event_order = get_event_order(request)
+                return request.user.is_authenticated and request.user.id in (event_order.user_id, event_order.owner_id)
 
         except Exception as error:
             raise ValidationError(error)
@@ -48,9 +46,8 @@ class UpdateStatusPermissions(permissions.BasePermission):
     def has_permission(self, request, view):
         try:
             if request.method in ['PATCH']:
-                event_order = EventOrder.objects.get(id=request.data['event_order'])
-                user_owner = event_order.place_ads.user
-                return request.user.is_authenticated and user_owner==request.user
+                event_order = get_event_order(request)
+                return request.user.is_authenticated and event_order.owner_id == request.user.id
         
         except Exception as error:
             raise ValidationError(error)
@@ -60,9 +57,8 @@ class UpdateDatesSelectedPermissions(permissions.BasePermission):
     def has_permission(self, request, view):
         try:
             if request.method in ['PATCH']:
-                event_order = EventOrder.objects.get(id=request.data['event_order'])
-                user_orderer = event_order.user
-                return request.user.is_authenticated and user_orderer == request.user 
+                event_order = get_event_order(request)
+                return request.user.is_authenticated and event_order.user_id == request.user.id
         
         except Exception as error:
             raise ValidationError(error)
\ No newline at end of file
@@ -5,6 +5,7 @@ from places.models import Plan
 from places.serializers import PlaceAdsSerializer
 
 from .models import EventOrder, Cancellation, History
+from .utils import DatesAlreadyBooked, booked_dates, dates_from_timestamps, get_event_order
 
 
 class EventOrderSerializer(serializers.ModelSerializer):
@@ -13,6 +14,7 @@ class EventOrderSerializer(serializers.ModelSerializer):
     price = serializers.FloatField(read_only=True, label="Preço")
     plan_type = serializers.IntegerField(read_only=True, label="Tipo de plano")
     user = serializers.PrimaryKeyRelatedField(read_only=True, label="Usuário")
+    owner = serializers.PrimaryKeyRelatedField(read_only=True, label="Dono")
 
     class Meta:
         model = EventOrder
@@ -43,6 +45,10 @@ class EventOrderSerializer(serializers.ModelSerializer):
 
         if plan.plan_type == 2  and not(set(event_week_days_number) == set(plan_week_days_number_list)):     #package
             raise serializers.ValidationError("Os dias selecionados devem ser do mesmo dia da semana do plano desejado.")
+
+        dates = booked_dates(place_ads, dates_from_timestamps(data['dates_selected']))
+        if dates:
+            raise serializers.ValidationError(str(DatesAlreadyBooked(dates)))
         
         return data
 
@@ -55,7 +61,21 @@ class EventOrderListSerializer(serializers.ModelSerializer):
         self.fields['place_ads'] = PlaceAdsSerializer(many=False, read_only=True)
         return super().to_representation(instance)
 
+
+class RequestEventOrderField(serializers.PrimaryKeyRelatedField):
+    '''
+    The order already loaded for the permission check of the request
+    '''
+    def to_internal_value(self, data):
+        try:
+            return get_event_order(self.context['request'])
+        except EventOrder.DoesNotExist:
+            self.fail('does_not_exist', pk_value=data)
+
+
 class CancellationSerializer(serializers.ModelSerializer):
+    event_order = RequestEventOrderField(queryset=EventOrder.objects.all())
+
     class Meta:
         model = Cancellation
         fields = '__all__'
@@ -80,18 +100,26 @@ class AcceptOrderSerializer(serializers.Serializer):
     event_order = serializers.IntegerField(write_only=True, )
     
     def validate(self, data):
-        event_order = EventOrder.objects.get(id=data['event_order'])
+        event_order = get_event_order(self.context['request'])
 
         if not event_order.status == 1: 
             raise serializers.ValidationError(f"A ordem de evento não pode mais ser aceita.")
 
+        dates = booked_dates(
+            event_order.place_ads_id,
+            {date.date() for date in event_order.dates_selected},
+            exclude_event_order=event_order,
+        )
+        if dates:
+            raise serializers.ValidationError(str(DatesAlreadyBooked(dates)))
+
         return data
 
 class RefuseOrderSerializer(serializers.Serializer):
     event_order = serializers.IntegerField(write_only=True, )
     
     def validate(self, data):
-        event_order = EventOrder.objects.get(id=data['event_order'])
+        event_order = get_event_order(self.context['request'])
         
         if not event_order.status == 1: 
             raise serializers.ValidationError(f"A ordem de evento não pode mais ser recusada.")
@@ -105,7 +133,7 @@ class UpdateDatesSelectedSerializer(serializers.Serializer):
     plan = serializers.IntegerField(write_only=True)
 
     def validate(self, data):
-        event_order = EventOrder.objects.get(id=data['event_order'])
+        event_order = get_event_order(self.context['request'])
         plan = Plan.objects.get(id=data['plan'])
 
         plan_week_days_number_list = []
@@ -131,5 +159,13 @@ class UpdateDatesSelectedSerializer(serializers.Serializer):
 
         if event_order.plan_type == 2  and not(set(event_week_days_number) == set(plan_week_days_number_list)):     #package
             raise serializers.ValidationError("Os dias selecionados devem ser do mesmo dia da semana do plano desejado.")
+
+        dates = booked_dates(
+            event_order.place_ads_id,
+            dates_from_timestamps(data['dates_selected']),
+            exclude_event_order=event_order,
+        )
+        if dates:
+            raise serializers.ValidationError(str(DatesAlreadyBooked(dates)))
         
         return data
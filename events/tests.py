@@ -1,11 +1,17 @@
 import time
+from unittest import mock
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from model_bakery import baker
 from datetime import datetime
 
-from events.models import Cancellation, EventOrder
+from checkout.models import Credit
+from events.models import Booking, Cancellation, EventOrder
+from events.permissions import CancellationPermissions
 from places.models import WeekDay
 
 
@@ -145,6 +151,17 @@ class EventOrderTests(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_dont_create_event_order_if_dates_are_already_booked(self):
+        accepted_order = baker.make(
+            'events.EventOrder', place_ads=self.place_ads, dates_selected=[self.datetime2], status=2,
+        )
+        baker.make('events.Booking', event_order=accepted_order, place_ads=self.place_ads, date=self.datetime2.date())
+
+        response = self.create_event_order()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(EventOrder.objects.count(), 1)
+
     #List
     def test_list_event_order(self):
         self.create_event_order()
@@ -199,8 +216,48 @@ class EventOrderTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']),0)
-    
-    
+
+    def test_list_event_orders_as_guest_and_owner_in_pages(self):
+        own_place_ads = baker.make('places.PlaceAds', user=self.orderer_user)
+        baker.make('events.EventOrder', user=self.orderer_user, place_ads=self.place_ads, _quantity=3)
+        baker.make('events.EventOrder', user=self.owner_user, place_ads=own_place_ads, _quantity=2)
+        baker.make('events.EventOrder', user=self.owner_user, place_ads=baker.make('places.PlaceAds'))
+
+        expected = list(
+            EventOrder.objects.filter(Q(user=self.orderer_user) | Q(place_ads__user=self.orderer_user))
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(len(expected), 5)
+
+        self.client.force_authenticate(self.orderer_user)
+        url = reverse("events_urls:event-orders-list")
+
+        response = self.client.get(url, {'limit': 2}, format='json')
+        self.assertEqual(response.data['count'], 5)
+
+        ids = []
+        page = f'{url}?cursor=&limit=2'
+        while page:
+            response = self.client.get(page, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [event_order['id'] for event_order in response.data['results']]
+            page = response.data['next']
+
+        self.assertEqual(ids, expected)
+
+    def test_event_order_owner_follows_place_ads_user(self):
+        event_order = baker.make('events.EventOrder', user=self.orderer_user, place_ads=self.place_ads)
+        self.assertEqual(event_order.owner, self.owner_user)
+
+        new_owner = baker.make('authentication.User')
+        self.place_ads.user = new_owner
+        self.place_ads.save()
+
+        event_order.refresh_from_db()
+        self.assertEqual(event_order.owner, new_owner)
+        self.assertEqual(list(EventOrder.objects.involving(self.owner_user)), [])
+
+
 class CancellationTests(APITestCase):
     def setUp(self):
         self.owner_user = baker.make('authentication.User')
@@ -290,6 +347,60 @@ class CancellationTests(APITestCase):
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['id'], correct_cancellation.id)
 
+    def test_only_cancelling_runs_in_a_locking_transaction(self):
+        self.client.force_authenticate(self.orderer_user)
+        url = reverse("events_urls:cancellations-list")
+        has_permission = CancellationPermissions.has_permission
+        depths = []
+
+        def record_depth(permission, request, view):
+            depths.append(len(connection.savepoint_ids))
+            return has_permission(permission, request, view)
+
+        with mock.patch.object(CancellationPermissions, 'has_permission', autospec=True, side_effect=record_depth):
+            response = self.client.get(url, {}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            response = self.client.post(url, {"event_order": self.event_order.id, "justification": "Chuva."}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        outside = len(connection.savepoint_ids)
+        self.assertEqual(depths, [outside, outside + 1])
+
+    def test_cancel_event_order_loads_it_once_for_update(self):
+        self.client.force_authenticate(self.orderer_user)
+        url = reverse("events_urls:cancellations-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {"event_order": self.event_order.id, "justification": "Chuva."}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        selects = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and 'FROM "events_eventorder"' in query['sql']
+        ]
+        self.assertEqual(len(selects), 1)
+        self.assertIn('FOR UPDATE', selects[0])
+
+    def test_cancel_accepted_event_order_releases_its_dates(self):
+        self.event_order.status = 2
+        self.event_order.save()
+        for day in (9, 10):
+            baker.make(
+                'events.Booking', event_order=self.event_order, place_ads=self.place_ads, date=datetime(2021, 12, day).date(),
+            )
+
+        body = {
+            "event_order": self.event_order.id,
+            "justification": "Porque eu quis."
+        }
+
+        self.client.force_authenticate(self.owner_user)
+        url = reverse("events_urls:cancellations-list")
+        response = self.client.post(url, body, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Booking.objects.filter(event_order=self.event_order).exists())
+
     
 class AcceptOrRefuseOrderTests(APITestCase):
     def setUp(self):
@@ -395,6 +506,67 @@ class AcceptOrRefuseOrderTests(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_accept_event_order_books_its_dates(self):
+        self.event_order.dates_selected = [datetime(2021, 12, 9, 10, 40), datetime(2021, 12, 9, 18, 0), datetime(2021, 12, 10)]
+        self.event_order.save()
+
+        self.client.force_authenticate(self.owner_user)
+        url = reverse("accept-order")
+        response = self.client.patch(url, {"event_order": self.event_order.id}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(Booking.objects.filter(place_ads=self.place_ads).order_by('date').values_list('date', flat=True)),
+            [datetime(2021, 12, 9).date(), datetime(2021, 12, 10).date()],
+        )
+
+    def test_dont_accept_event_order_if_dates_are_already_booked(self):
+        self.event_order.dates_selected = [datetime(2021, 12, 9), datetime(2021, 12, 10)]
+        self.event_order.save()
+        other_event_order = baker.make(
+            'events.EventOrder', place_ads=self.place_ads, dates_selected=[datetime(2021, 12, 10, 15, 0)], status=1,
+        )
+
+        self.client.force_authenticate(self.owner_user)
+        url = reverse("accept-order")
+        self.client.patch(url, {"event_order": self.event_order.id}, format='json')
+        response = self.client.patch(url, {"event_order": other_event_order.id}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(EventOrder.objects.get(id=other_event_order.id).status, 1)
+        self.assertEqual(Booking.objects.filter(event_order=other_event_order).count(), 0)
+
+    def test_booking_conflict_rolls_back_the_accept(self):
+        self.event_order.dates_selected = [datetime(2021, 12, 10)]
+        self.event_order.save()
+        other_event_order = baker.make('events.EventOrder', place_ads=self.place_ads, status=2)
+        baker.make('events.Booking', event_order=other_event_order, place_ads=self.place_ads, date=datetime(2021, 12, 10).date())
+
+        self.client.force_authenticate(self.owner_user)
+        url = reverse("accept-order")
+        # a concurrent accept commits between validation and the booking insert
+        with mock.patch('events.serializers.booked_dates', return_value=[]):
+            response = self.client.patch(url, {"event_order": self.event_order.id}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(EventOrder.objects.get(id=self.event_order.id).status, 1)
+        self.assertEqual(Credit.objects.get(id=self.credit.id).amount, 100)
+
+    def test_accept_event_order_loads_it_once_for_update(self):
+        self.client.force_authenticate(self.owner_user)
+        url = reverse("accept-order")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(url, {"event_order": self.event_order.id}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        selects = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and '"events_eventorder"' in query['sql']
+        ]
+        self.assertEqual(len(selects), 1)
+        self.assertIn('FOR UPDATE', selects[0])
+        self.assertFalse(any('"places_placeads"' in query['sql'] for query in queries))
+
 
 class UpdateDatesSelectedTests(APITestCase):
     def setUp(self):
@@ -434,6 +606,22 @@ class UpdateDatesSelectedTests(APITestCase):
         self.timestamp3 = time.mktime(self.datetime3.timetuple())
         self.timestamp4 = time.mktime(self.datetime4.timetuple())
 
+    def test_dont_update_dates_selected_to_booked_dates(self):
+        accepted_order = baker.make('events.EventOrder', place_ads=self.place_ads, status=2)
+        baker.make('events.Booking', event_order=accepted_order, place_ads=self.place_ads, date=self.datetime1.date())
+
+        body = {
+            "event_order": self.event_order.id,
+            "dates_selected": [self.timestamp1, self.timestamp2],
+            "plan": self.plan.id,
+        }
+
+        self.client.force_authenticate(self.orderer_user)
+        url = reverse("dates-selected-update")
+        response = self.client.patch(url, body, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_update_dates_selected_from_event_order(self):
         body = {
             "event_order": self.event_order.id,
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+
+from .models import Booking, EventOrder
+
+
+class DatesAlreadyBooked(Exception):
+    def __init__(self, dates):
+        self.dates = dates
+        super().__init__(
+            'As datas {} já estão reservadas para este local.'.format(
+                ', '.join(date.strftime('%d/%m/%Y') for date in dates)
+            )
+        )
+
+
+def get_event_order(request):
+    '''
+    The order named by ``request.data['event_order']``, loaded once per
+    request: permissions, serializers and views of a status change share it.
+    Inside a transaction the row stays locked (SELECT ... FOR UPDATE) until
+    the change commits.
+
+    Raises:
+        EventOrder.DoesNotExist
+    '''
+    if not hasattr(request, '_event_order'):
+        queryset = EventOrder.objects.all()
+        if transaction.get_connection().in_atomic_block:
+            queryset = queryset.select_for_update()
+        request._event_order = queryset.get(id=request.data['event_order'])
+
+    return request._event_order
+
+
+def dates_from_timestamps(timestamps):
+    '''
+    Args:
+        timestamps(list): unix timestamps sent by the client
+
+    Returns:
+        dates(list): distinct calendar days, sorted
+    '''
+    return sorted({datetime.fromtimestamp(timestamp).date() for timestamp in timestamps})
+
+
+def booked_dates(place_ads, dates, exclude_event_order=None):
+    '''
+    Dates already taken by accepted orders of the place, resolved by the
+    unique (place_ads, date) index in a single query
+
+    Returns:
+        dates(list): the subset of ``dates`` that is booked
+    '''
+    bookings = Booking.objects.filter(place_ads=place_ads, date__in=dates)
+
+    if exclude_event_order is not None:
+        bookings = bookings.exclude(event_order=exclude_event_order)
+
+    return sorted(bookings.values_list('date', flat=True))
+
+
+def book_event_order(event_order):
+    '''
+    Reserve every selected date of an accepted order.
+
+    Raises:
+        DatesAlreadyBooked: another accepted order holds one of the dates
+    '''
+    dates = sorted({date.date() for date in event_order.dates_selected})
+
+    try:
+        with transaction.atomic():
+            Booking.objects.bulk_create([
+                Booking(event_order=event_order, place_ads_id=event_order.place_ads_id, date=date)
+                for date in dates
+            ])
+    except IntegrityError:
+        raise DatesAlreadyBooked(booked_dates(event_order.place_ads_id, dates, exclude_event_order=event_order))
+
+
+def release_event_order(event_order):
+    return Booking.objects.filter(event_order=event_order).delete()
@@ -1,11 +1,12 @@
 from rest_framework import viewsets, status
 from rest_framework import mixins
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Prefetch
 from datetime import datetime
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from checkout.models import Credit
+from checkout.ledger import post_credit_transaction
 
 from places.models import Plan, PlaceAds
 
@@ -25,7 +26,35 @@ from .permissions import (
     UpdateStatusPermissions,
     UpdateDatesSelectedPermissions,
 )
+from .utils import book_event_order, get_event_order, release_event_order
 from checkout.constants import UNLOCK_PRICE
+
+
+class LockEventOrderMixin:
+    '''
+    Runs the request in a transaction, so the order get_event_order loads
+    for the permission check stays locked until the change commits, and
+    rolls it back when the request fails. Viewsets list the actions that
+    change the order in ``lock_actions``; the others run as usual.
+    '''
+    lock_actions = None
+
+    def dispatch(self, request, *args, **kwargs):
+        self.locks_event_order = self.lock_actions is None or (
+            getattr(self, 'action_map', {}).get(request.method.lower()) in self.lock_actions
+        )
+        if not self.locks_event_order:
+            return super().dispatch(request, *args, **kwargs)
+
+        with transaction.atomic():
+            return super().dispatch(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        if self.locks_event_order:
+            transaction.set_rollback(True)
+        return super().handle_exception(exc)
+
+
 class EventOrderViewSet(
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -36,6 +65,7 @@ class EventOrderViewSet(
     serializer_class = EventOrderSerializer
     permission_classes = [EventOrderPermissions]
     filterset_fields = ['place_ads']
+    cursor_field = 'created_at'
 
     def create(self, request, *args, **kwargs):
         try:            
@@ -80,23 +110,28 @@ class EventOrderViewSet(
 
     def list(self, request, *args, **kwargs):
         self.serializer_class = EventOrderListSerializer
-        self.queryset = EventOrder.objects.filter(Q(user=request.user) | Q(place_ads__user=request.user))
+        self.queryset = EventOrder.objects.involving(request.user).prefetch_related(
+            Prefetch('place_ads', queryset=PlaceAds.objects.for_listing()),
+        )
         return super().list(request, *args, **kwargs)
 
 
-class CancellationViewSet(viewsets.ModelViewSet):
+class CancellationViewSet(LockEventOrderMixin, viewsets.ModelViewSet):
     queryset = Cancellation.objects.all()
     serializer_class = CancellationSerializer
     permission_classes = [CancellationPermissions]
+    cursor_field = 'created_at'
+    lock_actions = ['create']
 
     def create(self, request, *args, **kwargs):
         try:            
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
 
-            event_order = EventOrder.objects.get(id=request.data['event_order'])
+            event_order = get_event_order(request)
             event_order.status = 4
             event_order.save()
+            release_event_order(event_order)
             
             cancellation = Cancellation.objects.create(
                 event_order=event_order,
@@ -108,7 +143,7 @@ class CancellationViewSet(viewsets.ModelViewSet):
             raise ValidationError(error)
 
     def list(self, request, *args, **kwargs):
-        self.queryset = Cancellation.objects.filter(Q(event_order__user=request.user) | Q(event_order__place_ads__user=request.user))
+        self.queryset = Cancellation.objects.filter(event_order__in=EventOrder.objects.involving(request.user))
         return super().list(request, *args, **kwargs)
 
 
@@ -117,44 +152,42 @@ class HistoryViewSet(viewsets.ModelViewSet):
     serializer_class = HistorySerializer
 
 
-class AcceptOrderViewSet(APIView):
+class AcceptOrderViewSet(LockEventOrderMixin, APIView):
     serializer_class = AcceptOrderSerializer
     permission_classes = [UpdateStatusPermissions]
 
     def patch(self, request, *args, **kwargs):
         try:
-            serializer = self.serializer_class(data=request.data)
+            serializer = self.serializer_class(data=request.data, context={'request': request})
             serializer.is_valid(raise_exception=True)
             
-            event_order = EventOrder.objects.get(id=request.data['event_order'])
-            credit = Credit.objects.get(user=request.user)
+            event_order = get_event_order(request)
+
+            with transaction.atomic():
+                # a concurrent accept of an overlapping order makes the
+                # booking fail and rolls back the credit debit
+                post_credit_transaction(request.user, -UNLOCK_PRICE, 3, event_order=event_order)     #unlock
+                book_event_order(event_order)
 
-            if credit.amount - UNLOCK_PRICE >= 0:
-                credit.amount -= UNLOCK_PRICE
-                credit.save()
-                
                 event_order.status = 2
                 event_order.save()
-            
-                data = {"message": "Evento aceito"}
-                return Response(data=data, status=status.HTTP_200_OK)
-            
-            else: 
-                raise ValidationError(f"Créditos insuficientes.")
+
+            data = {"message": "Evento aceito"}
+            return Response(data=data, status=status.HTTP_200_OK)
         except Exception as error:
             raise ValidationError(error)
 
 
-class RefuseOrderViewSet(APIView):
+class RefuseOrderViewSet(LockEventOrderMixin, APIView):
     serializer_class = RefuseOrderSerializer
     permission_classes = [UpdateStatusPermissions]
 
     def patch(self, request, *args, **kwargs):
         try:
-            serializer = self.serializer_class(data=request.data)
+            serializer = self.serializer_class(data=request.data, context={'request': request})
             serializer.is_valid(raise_exception=True)
 
-            event_order = EventOrder.objects.get(id=request.data['event_order'])
+            event_order = get_event_order(request)
             event_order.status = 3
             event_order.save()
             
@@ -164,16 +197,16 @@ class RefuseOrderViewSet(APIView):
             raise ValidationError(error)
 
 
-class UpdateDatesSelectedViewSet(APIView):
+class UpdateDatesSelectedViewSet(LockEventOrderMixin, APIView):
     serializer_class = UpdateDatesSelectedSerializer
     permission_classes = [UpdateDatesSelectedPermissions]
 
     def patch(self, request, *args, **kwargs):
         try:
-            serializer = self.serializer_class(data=request.data)
+            serializer = self.serializer_class(data=request.data, context={'request': request})
             serializer.is_valid(raise_exception=True)
 
-            event_order = EventOrder.objects.get(id=request.data['event_order'])
+            event_order = get_event_order(request)
             plan = Plan.objects.get(id=request.data['plan'])
 
             dates_selected = []
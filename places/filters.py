@@ -1,4 +1,11 @@
-from rest_framework.filters import BaseFilterBackend
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+
+from .models import SEARCH_CONFIG
+
+DEFAULT_RADIUS_KM = 10
 
 class LocalTypeFilter(BaseFilterBackend):
     def filter_queryset(self, request, queryset, view):
@@ -35,3 +42,54 @@ class StatusFilter(BaseFilterBackend):
                 return queryset.filter(status=status)
             except Exception:
                 return queryset.none()
+
+
+class ScoreFilter(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        min_score = request.query_params.get('min_score', None)
+
+        if not min_score:
+            return queryset.all()
+        else:
+            try:
+                return queryset.filter(rating_avg__gte=float(min_score))
+            except Exception:
+                return queryset.none()
+
+
+class NearFilter(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        near = request.query_params.get('near', None)
+
+        if not near:
+            return queryset.all()
+        else:
+            try:
+                latitude, longitude = [float(value) for value in near.split(',')]
+                radius_km = float(request.query_params.get('radius_km', DEFAULT_RADIUS_KM))
+
+                if abs(latitude) > 90 or abs(longitude) > 180 or radius_km <= 0:
+                    return queryset.none()
+
+                return queryset.near(latitude, longitude, radius_km)
+            except Exception:
+                return queryset.none()
+
+
+class FullTextSearchFilter(SearchFilter):
+    '''
+    Ranked full-text search over the stored ``search_vector`` on PostgreSQL,
+    falling back to SearchFilter's ``icontains`` lookups on other databases.
+    '''
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+
+        if not search_terms:
+            return queryset.all()
+        elif connections[queryset.db].vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+        else:
+            query = SearchQuery(' '.join(search_terms), config=SEARCH_CONFIG, search_type='websearch')
+            return queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query),
+            ).order_by('-search_rank', *queryset.query.order_by)
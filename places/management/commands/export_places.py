@@ -0,0 +1,66 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from places.models import PlaceAds
+from places.utils import CATALOG_CSV_COLUMNS, catalog_row_to_csv, export_place_ads
+
+
+class Command(BaseCommand):
+    help = 'Export place ads with their addresses, images and plans as an NDJSON or CSV catalog for import_places.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file, or - to write to stdout.')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='Defaults to csv for .csv files, ndjson otherwise.')
+        parser.add_argument('--user', type=int, help='Only the ads of this owner.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Ads read per query.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        batch_size = options['batch_size']
+
+        queryset = PlaceAds.objects.select_related('address').prefetch_related('images', 'plan_set__week_days')
+        if options['user']:
+            queryset = queryset.filter(user_id=options['user'])
+
+        file = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        # progress goes to stderr when the catalog is written to stdout
+        log = self.stderr if path == '-' else self.stdout
+
+        writer = None
+        if format == 'csv':
+            writer = csv.DictWriter(file, fieldnames=CATALOG_CSV_COLUMNS)
+            writer.writeheader()
+
+        exported = 0
+        last_id = 0
+        start = time.perf_counter()
+        try:
+            while True:
+                # keyset pagination keeps every batch query on the primary key
+                batch = list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+                if not batch:
+                    break
+
+                for place_ads in batch:
+                    row = export_place_ads(place_ads)
+                    if writer:
+                        writer.writerow(catalog_row_to_csv(row))
+                    else:
+                        file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+                exported += len(batch)
+                last_id = batch[-1].id
+                log.write(f'{exported} rows exported ({exported / (time.perf_counter() - start):.0f} rows/s)')
+        finally:
+            if file is not sys.stdout:
+                file.close()
+
+        elapsed = time.perf_counter() - start
+        log.write(self.style.SUCCESS(
+            f'{exported} place ads exported in {elapsed:.1f}s ({exported / elapsed if elapsed else 0:.0f} rows/s).'
+        ))
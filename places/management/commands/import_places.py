@@ -0,0 +1,101 @@
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.cache import invalidate
+from places.utils import catalog_row_from_csv, import_place_ads
+
+
+def read_rows(file, format):
+    '''
+    Catalog rows of an NDJSON or CSV stream, read one line at a time
+    '''
+    if format == 'csv':
+        for csv_row in csv.DictReader(file):
+            yield catalog_row_from_csv(csv_row)
+        return
+
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        'Import place ads with their addresses, images and plans from an NDJSON or CSV catalog '
+        '(see export_places), in batched transactions. A checkpoint file records the rows '
+        'committed so an interrupted import continues with --resume.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file, or - to read NDJSON/CSV from stdin.')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='Defaults to csv for .csv files, ndjson otherwise.')
+        parser.add_argument('--user', type=int, help='Owner of the rows without a user.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows committed per transaction.')
+        parser.add_argument('--checkpoint', help='Checkpoint file, <path>.checkpoint by default.')
+        parser.add_argument('--resume', action='store_true', help='Skip the rows committed by a previous run.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+        batch_size = options['batch_size']
+        checkpoint = options['checkpoint'] or (None if path == '-' else f'{path}.checkpoint')
+
+        if options['resume'] and not checkpoint:
+            raise CommandError('--resume needs a --checkpoint when reading from stdin.')
+
+        committed = 0
+        if options['resume'] and os.path.exists(checkpoint):
+            with open(checkpoint) as file:
+                committed = json.load(file)['rows']
+
+        file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        rows = islice(read_rows(file, format), committed, None)
+
+        if committed:
+            self.stdout.write(f'Resuming after {committed} rows.')
+
+        imported = 0
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+
+                    with transaction.atomic():
+                        import_place_ads(batch, options['user'])
+                except Exception as error:
+                    raise CommandError(f'Rows {committed + 1} to {committed + batch_size}: {error}')
+
+                committed += len(batch)
+                imported += len(batch)
+                # saved after the commit: a crash in between replays this batch
+                if checkpoint:
+                    self.save_checkpoint(checkpoint, committed)
+
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{committed} rows committed ({imported / elapsed:.0f} rows/s)')
+        finally:
+            if file is not sys.stdin:
+                file.close()
+            if imported:
+                invalidate('places')
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{imported} place ads imported in {elapsed:.1f}s ({imported / elapsed if elapsed else 0:.0f} rows/s).'
+        ))
+
+    def save_checkpoint(self, checkpoint, rows):
+        # written aside and renamed so a crash never leaves a truncated file
+        with open(f'{checkpoint}.tmp', 'w') as file:
+            json.dump({'rows': rows}, file)
+        os.replace(f'{checkpoint}.tmp', checkpoint)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from places.models import PlaceAds
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored rating sum, count and average of every PlaceAds from its PlaceRatings.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = PlaceAds.objects.rebuild_ratings()
+
+        self.stdout.write(self.style.SUCCESS(f'{updated} place ads rebuilt.'))
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.18 on 2026-10-18 16:00
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+
+def rebuild_ratings(apps, schema_editor):
+    PlaceAds = apps.get_model('places', 'PlaceAds')
+    PlaceRatings = apps.get_model('review', 'PlaceRatings')
+
+    ratings = PlaceRatings.objects.filter(place=OuterRef('pk')).order_by().values('place')
+    PlaceAds.objects.update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('rating__score')).values('total')), 0),
+        rating_count=Coalesce(Subquery(ratings.annotate(total=Count('pk')).values('total')), 0),
+    )
+    PlaceAds.objects.filter(rating_count__gt=0).update(
+        rating_avg=Cast(F('rating_sum'), models.FloatField()) / Cast(F('rating_count'), models.FloatField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0001_initial'),
+        ('places', '0011_auto_20230412_1721'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='placeads',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, default=0, verbose_name='Média das notas'),
+        ),
+        migrations.AddField(
+            model_name='placeads',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Quantidade de avaliações'),
+        ),
+        migrations.AddField(
+            model_name='placeads',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Soma das notas'),
+        ),
+        migrations.RunPython(rebuild_ratings, migrations.RunPython.noop),
+    ]
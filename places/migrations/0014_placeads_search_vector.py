@@ -0,0 +1,87 @@
+# Generated by Django 3.2.18 on 2026-10-18 17:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+SEARCH_CONFIG = 'portuguese_unaccent'
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    '''
+    AddIndex that is only applied on PostgreSQL; other backends keep the
+    index in the model state without creating it.
+    '''
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def create_search_config(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_ts_config WHERE cfgname = %s", [SEARCH_CONFIG])
+        if cursor.fetchone():
+            return
+
+        cursor.execute(f"CREATE TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} (COPY = portuguese)")
+
+        # unaccent ships with contrib and may be missing from minimal installs,
+        # in which case the configuration only applies Portuguese stemming
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'unaccent'")
+        if cursor.fetchone():
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+            cursor.execute(
+                f"ALTER TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} "
+                "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem"
+            )
+
+
+def drop_search_config(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TEXT SEARCH CONFIGURATION IF EXISTS {SEARCH_CONFIG}")
+
+
+def update_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    PlaceAds = apps.get_model('places', 'PlaceAds')
+    PlaceAds.objects.update(
+        search_vector=(
+            SearchVector('place_title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('place_description', weight='B', config=SEARCH_CONFIG)
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0013_address_lat_lng_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_config, drop_search_config),
+        migrations.AddField(
+            model_name='placeads',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Vetor de busca'),
+        ),
+        AddPostgresIndex(
+            model_name='placeads',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='placeads_search_vector_idx'),
+        ),
+        migrations.RunPython(update_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.18 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0014_placeads_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='placeads',
+            index=models.Index(fields=['created_at', 'id'], name='placeads_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.18 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('places', '0015_placeads_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='placeads',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['local_type', 'created_at'], name='placeads_open_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='placeads',
+            index=models.Index(fields=['user', 'created_at'], name='placeads_user_created_idx'),
+        ),
+    ]
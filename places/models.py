@@ -1,7 +1,15 @@
-from django.db import models
-from django.db.models.aggregates import Avg
+from math import cos, degrees, radians
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connections, models
+from django.db.models import Count, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import ASin, Cast, Coalesce, Cos, Least, NullIf, Power, Radians, Sin, Sqrt
 from review.models import PlaceRatings
 
+EARTH_RADIUS_KM = 6371.0
+SEARCH_CONFIG = 'portuguese_unaccent'
+
 # Create your models here.
 
 class Address(models.Model):
@@ -14,6 +22,9 @@ class Address(models.Model):
     class Meta:
         verbose_name = "Endereço"
         verbose_name_plural = "Endereços"
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='address_lat_lng_idx'),
+        ]
 
     def __str__(self):
         return f'{self.id}: {self.map_string} - {self.reference}'
@@ -41,6 +52,94 @@ class WeekDay(models.Model):
         verbose_name_plural = "Dias da Semana"
 
 
+def rating_average(rating_sum, rating_count):
+    return Coalesce(
+        ExpressionWrapper(
+            Cast(rating_sum, models.FloatField()) / NullIf(rating_count, Value(0)),
+            output_field=models.FloatField(),
+        ),
+        Value(0.0),
+    )
+
+
+def distance_from(latitude, longitude):
+    '''
+    Haversine distance in km between the point and the address coordinates
+    '''
+    address_latitude = Radians('address__latitude')
+    address_longitude = Radians('address__longitude')
+    haversine = (
+        Power(Sin((address_latitude - radians(latitude)) / 2), 2)
+        + cos(radians(latitude)) * Cos(address_latitude) * Power(Sin((address_longitude - radians(longitude)) / 2), 2)
+    )
+    return ExpressionWrapper(
+        2 * EARTH_RADIUS_KM * ASin(Least(Sqrt(haversine), Value(1.0))),
+        output_field=models.FloatField(),
+    )
+
+
+class PlaceAdsQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related('user', 'address').prefetch_related(
+            'plan_set__week_days', 'images__derivatives',
+        ).defer('search_vector')
+
+    def add_rating(self, score, count=1):
+        rating_sum = F('rating_sum') + score
+        rating_count = F('rating_count') + count
+        return self.update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating_avg=rating_average(rating_sum, rating_count),
+        )
+
+    def rebuild_ratings(self):
+        ratings = PlaceRatings.objects.filter(place=OuterRef('pk')).order_by().values('place')
+        self.update(
+            rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('rating__score')).values('total')), 0),
+            rating_count=Coalesce(Subquery(ratings.annotate(total=Count('pk')).values('total')), 0),
+        )
+        return self.update(rating_avg=rating_average(F('rating_sum'), F('rating_count')))
+
+    def near(self, latitude, longitude, radius_km):
+        '''
+        Ads whose address is within ``radius_km`` of the point, closest first
+
+        A bounding box on the indexed latitude/longitude columns discards most
+        rows before the exact haversine distance is computed for the rest.
+        '''
+        latitude_delta = degrees(radius_km / EARTH_RADIUS_KM)
+        bounding_box = Q(address__latitude__range=(latitude - latitude_delta, latitude + latitude_delta))
+
+        if abs(latitude) + latitude_delta < 90:
+            longitude_delta = degrees(radius_km / (EARTH_RADIUS_KM * cos(radians(latitude))))
+            min_longitude, max_longitude = longitude - longitude_delta, longitude + longitude_delta
+
+            if longitude_delta >= 180:
+                pass
+            elif min_longitude < -180:
+                bounding_box &= Q(address__longitude__gte=min_longitude + 360) | Q(address__longitude__lte=max_longitude)
+            elif max_longitude > 180:
+                bounding_box &= Q(address__longitude__gte=min_longitude) | Q(address__longitude__lte=max_longitude - 360)
+            else:
+                bounding_box &= Q(address__longitude__range=(min_longitude, max_longitude))
+
+        return self.filter(bounding_box).annotate(
+            distance_km=distance_from(latitude, longitude),
+        ).filter(distance_km__lte=radius_km).order_by('distance_km')
+
+    def update_search_vector(self):
+        '''
+        Recompute the stored full-text search vector (PostgreSQL only)
+        '''
+        return self.update(
+            search_vector=(
+                SearchVector('place_title', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('place_description', weight='B', config=SEARCH_CONFIG)
+            ),
+        )
+
+
 class PlaceAds(models.Model):
     LOCAL = [
         (1, 'Casas'),
@@ -61,19 +160,39 @@ class PlaceAds(models.Model):
     local_type = models.PositiveSmallIntegerField(verbose_name="Tipo de Local", choices=LOCAL, null=False)
     capacity = models.PositiveSmallIntegerField(verbose_name="Capacidade", null=False)
     status = models.PositiveSmallIntegerField(verbose_name="Status", choices=STATUS, null=False, default=1)
+    rating_sum = models.PositiveIntegerField(verbose_name="Soma das notas", default=0)
+    rating_count = models.PositiveIntegerField(verbose_name="Quantidade de avaliações", default=0)
+    rating_avg = models.FloatField(verbose_name="Média das notas", default=0, db_index=True)
+    search_vector = SearchVectorField(verbose_name="Vetor de busca", null=True, editable=False)
     created_at = models.DateTimeField(verbose_name="Data de criação", auto_now_add=True)
 
+    objects = PlaceAdsQuerySet.as_manager()
+
     @property
     def score(self):
-        return PlaceRatings.objects.filter(place=self).aggregate(Avg('rating'))
-        
+        return self.rating_avg
+
     class Meta:
         verbose_name = "Anúncio de local"
         verbose_name_plural = "Anúncios de locais"
+        indexes = [
+            GinIndex(fields=['search_vector'], name='placeads_search_vector_idx'),
+            models.Index(fields=['created_at', 'id'], name='placeads_created_id_idx'),
+            models.Index(fields=['local_type', 'created_at'], condition=Q(status=1), name='placeads_open_type_idx'),
+            models.Index(fields=['user', 'created_at'], name='placeads_user_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.id}: {self.LOCAL[self.local_type - 1][1]} - {self.place_title}'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        searchable_changed = update_fields is None or {'place_title', 'place_description'} & set(update_fields)
+        if searchable_changed and connections[self._state.db].vendor == 'postgresql':
+            PlaceAds.objects.using(self._state.db).filter(pk=self.pk).update_search_vector()
+
     
 class Plan(models.Model):
     PLAN_TYPE = [
@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from django.forms.models import model_to_dict
 
 from asset.serializers import AssetSerializer
 from .models import (
@@ -30,35 +29,29 @@ class PlaceAdsSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def to_representation(self, instance):
-        plan_data = []
-        plans = Plan.objects.filter(place_ads=instance)
-        
-        for i, plan in enumerate(plans):
-            plan_data.append(model_to_dict(plan))
-            plan_data[i] = PlanSerializer(instance=plan).data
-
-        images_data = []
-        images = instance.images.all()
-
-        for i, image in enumerate(images):
-            images_data.append(model_to_dict(image))
-            images_data[i] = AssetSerializer(instance=image).data
-
-
-        return{
+        # plans, week days and images come from the prefetch cache when the
+        # queryset is built with PlaceAds.objects.for_listing()
+        data = {
             "id": instance.id,
-            "user": instance.user.id,
+            "user": instance.user_id,
             "place_title": instance.place_title,
             "place_description": instance.place_description,
             "local_type": instance.local_type,
             "capacity": instance.capacity,
             "status": instance.status,
+            "score": instance.rating_avg,
+            "rating_count": instance.rating_count,
             "created_at": instance.created_at,
             "address": AddressSerializer(instance=instance.address).data,
-            "plans": plan_data,
-            "images": images_data
+            "plans": PlanSerializer(instance.plan_set.all(), many=True).data,
+            "images": AssetSerializer(instance.images.all(), many=True, context=self.context).data,
         }
 
+        if hasattr(instance, 'distance_km'):
+            data['distance_km'] = instance.distance_km
+
+        return data
+
 
 class PlanSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,62 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import invalidate_on_commit
+from events.models import EventOrder
+from review.models import PlaceRatings
+
+from .models import Address, PlaceAds, Plan, WeekDay
+from .utils import calendar_group, week_day_map
+
+
+@receiver(post_save, sender=EventOrder)
+@receiver(post_delete, sender=EventOrder)
+def invalidate_calendar(sender, instance, **kwargs):
+    invalidate_on_commit(calendar_group(instance.place_ads_id))
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def invalidate_plan(sender, instance, **kwargs):
+    invalidate_on_commit('places', calendar_group(instance.place_ads_id))
+
+
+@receiver(post_save, sender=PlaceAds)
+@receiver(post_delete, sender=PlaceAds)
+def invalidate_place_ads(sender, instance, **kwargs):
+    invalidate_on_commit('places', calendar_group(instance.id))
+
+
+@receiver(post_save, sender=PlaceAds)
+def sync_event_order_owner(sender, instance, created, **kwargs):
+    if not created:
+        EventOrder.objects.filter(place_ads=instance).exclude(owner=instance.user_id).update(owner=instance.user_id)
+
+
+@receiver(post_save, sender=Address)
+@receiver(post_delete, sender=Address)
+@receiver(post_save, sender=PlaceRatings)
+@receiver(post_delete, sender=PlaceRatings)
+@receiver(m2m_changed, sender=PlaceAds.images.through)
+def invalidate_places(sender, **kwargs):
+    invalidate_on_commit('places')
+
+
+@receiver(post_save, sender=WeekDay)
+@receiver(post_delete, sender=WeekDay)
+def invalidate_week_days(sender, **kwargs):
+    week_day_map.cache_clear()
+    invalidate_on_commit('week-days', 'places')
+
+
+@receiver(m2m_changed, sender=Plan.week_days.through)
+def invalidate_plan_week_days(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+
+    if reverse:
+        place_ads_ids = Plan.objects.filter(pk__in=pk_set or []).values_list('place_ads_id', flat=True)
+    else:
+        place_ads_ids = [instance.place_ads_id]
+
+    invalidate_on_commit('places', *[calendar_group(place_ads_id) for place_ads_id in set(place_ads_ids)])
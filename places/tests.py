@@ -1,3 +1,15 @@
+import json
+import os
+from contextlib import contextmanager
+from datetime import date, datetime
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.utils import ConnectionHandler
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -6,7 +18,38 @@ from model_bakery import baker
 from PIL import Image
 import tempfile
 
-from places.models import PlaceAds, Plan, WeekDay
+from asset.models import Asset
+from authentication.models import User
+from events.models import EventOrder
+from places.models import Address, PlaceAds, Plan, WeekDay
+from places.utils import export_place_ads, week_day_ids, week_day_map
+
+SQLITE_MODELS = [User, Asset, Address, WeekDay, PlaceAds, Plan, EventOrder]
+
+
+@contextmanager
+def sqlite_database():
+    '''
+    Run the block on a fresh in-memory SQLite database as the default one,
+    with the tables of SQLITE_MODELS (the migrations need PostgreSQL). GIN
+    indexes are left out, like the migrations do on other backends.
+    '''
+    postgres = connections['default']
+    sqlite = ConnectionHandler({'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}})['default']
+
+    with sqlite.schema_editor() as editor:
+        for model in SQLITE_MODELS:
+            editor.create_model(model)
+        editor.deferred_sql = [sql for sql in editor.deferred_sql if 'USING gin' not in str(sql)]
+
+    connections['default'] = sqlite
+    week_day_map.cache_clear()
+    try:
+        yield sqlite
+    finally:
+        connections['default'] = postgres
+        week_day_map.cache_clear()
+        sqlite.close()
 
 
 class PlaceAdsTests(APITestCase):
@@ -92,6 +135,66 @@ class PlaceAdsTests(APITestCase):
         for day in plan2.week_days.all():
             self.assertEqual(day.day in body['plans'][1]['week_days'], True)
 
+    def test_create_place_ads_query_count_does_not_grow_with_plans(self):
+        user = baker.make('authentication.User')
+        self.client.force_authenticate(user)
+        url = reverse("places_urls:places-ads-list")
+
+        def body(total_plans):
+            return {
+                "address": {"map_string": "Map Street String", "reference": "reference", "cep": "84268660"},
+                "place_title": "Title",
+                "place_description": "Description",
+                "capacity": 50,
+                "local_type": 1,
+                "images": [],
+                "plans": [
+                    {"week_days": [0, 5, 6], "plan_type": 1, "name": f"plan {i}", "price": 50 + i}
+                    for i in range(total_plans)
+                ],
+            }
+
+        # loads the process-level weekday map
+        self.client.post(url, body(1), format='json')
+
+        queries = {}
+        for total_plans in (1, 20):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(url, body(total_plans), format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(response.data['plans']), total_plans)
+            queries[total_plans] = len(context)
+
+        self.assertEqual(queries[1], queries[20])
+        place_ads = PlaceAds.objects.get(id=response.data['id'])
+        self.assertEqual(Plan.week_days.through.objects.filter(plan__place_ads=place_ads).count(), 60)
+
+    def test_create_place_ads_with_plans_on_sqlite(self):
+        with sqlite_database() as sqlite:
+            self.assertFalse(sqlite.features.can_return_rows_from_bulk_insert)
+            for day in range(7):
+                WeekDay.objects.create(day=day)
+            user = baker.make('authentication.User')
+            self.client.force_authenticate(user)
+
+            response = self.client.post(reverse("places_urls:places-ads-list"), {
+                "address": {"map_string": "Map Street String", "reference": "reference", "cep": "84268660"},
+                "place_title": "Title",
+                "place_description": "Description",
+                "capacity": 50,
+                "local_type": 1,
+                "images": [],
+                "plans": [
+                    {"week_days": [0, 6], "plan_type": 1, "name": "Fim de semana", "price": 100},
+                    {"week_days": [1, 2, 3], "plan_type": 1, "name": "Semana", "price": 80},
+                ],
+            }, format='json')
+
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+            plans = {plan.name: plan for plan in Plan.objects.filter(place_ads_id=response.data['id'])}
+            self.assertEqual(sorted(day.day for day in plans['Fim de semana'].week_days.all()), [0, 6])
+            self.assertEqual(sorted(day.day for day in plans['Semana'].week_days.all()), [1, 2, 3])
+
     def test_list_place_ads(self):
         image = Image.new(mode='RGB', size=(200, 20), color='blue')
 
@@ -135,6 +238,124 @@ class PlaceAdsTests(APITestCase):
         for day in plan.week_days.all():
             self.assertEqual(day.id in response.data['plans'][0]['week_days'], True)
 
+    def test_list_place_ads_in_a_constant_number_of_queries(self):
+        user = baker.make('authentication.User')
+
+        def make_place_ads(quantity):
+            for _ in range(quantity):
+                image = Image.new(mode='RGB', size=(200, 20), color='blue')
+                tmp_file = tempfile.NamedTemporaryFile(suffix='.png')
+                image.save(tmp_file)
+                tmp_file.seek(0)
+
+                place_ads = baker.make('places.PlaceAds', user=user, images=[baker.make('asset.Asset', file_high=tmp_file)])
+                baker.make('places.Plan', place_ads=place_ads, week_days=WeekDay.objects.all(), _quantity=2)
+
+        self.client.force_authenticate(user)
+        url = reverse("places_urls:places-ads-list")
+
+        make_place_ads(2)
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(url, {}, format='json')
+        self.assertEqual(len(response.data['results']), 2)
+
+        make_place_ads(8)
+        with CaptureQueriesContext(connection) as large_page:
+            response = self.client.get(url, {}, format='json')
+        self.assertEqual(len(response.data['results']), 10)
+
+        self.assertEqual(len(small_page), len(large_page))
+        self.assertEqual(len(response.data['results'][0]['plans']), 2)
+        self.assertEqual(len(response.data['results'][0]['plans'][0]['week_days']), 7)
+        self.assertEqual(len(response.data['results'][0]['images']), 1)
+
+    def test_list_place_ads_near_a_point(self):
+        user = baker.make('authentication.User')
+        natal = baker.make('places.PlaceAds', address=baker.make('places.Address', latitude=-5.7945, longitude=-35.2110))
+        parnamirim = baker.make('places.PlaceAds', address=baker.make('places.Address', latitude=-5.9157, longitude=-35.2628))
+        baker.make('places.PlaceAds', address=baker.make('places.Address', latitude=-8.0476, longitude=-34.8770))  # Recife
+        baker.make('places.PlaceAds', address=baker.make('places.Address', latitude=None, longitude=None))
+
+        self.client.force_authenticate(user)
+        url = reverse("places_urls:places-ads-list")
+
+        response = self.client.get(url, {'near': '-5.7950,-35.2100', 'radius_km': 20}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([place_ads['id'] for place_ads in response.data['results']], [natal.id, parnamirim.id])
+        self.assertLess(response.data['results'][0]['distance_km'], 1)
+        self.assertAlmostEqual(response.data['results'][1]['distance_km'], 14.4, delta=0.5)
+
+        response = self.client.get(url, {'near': '-5.7950,-35.2100', 'radius_km': 1}, format='json')
+        self.assertEqual([place_ads['id'] for place_ads in response.data['results']], [natal.id])
+
+        response = self.client.get(url, {'near': 'not-a-point'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 0)
+
+    def test_search_place_ads_ranks_title_matches_first(self):
+        user = baker.make('authentication.User')
+        in_description = baker.make(
+            'places.PlaceAds', place_title='Sítio com piscina', place_description='Perto das casas de praia',
+        )
+        in_title = baker.make(
+            'places.PlaceAds', place_title='Casa de praia', place_description='Vista para o mar',
+        )
+        baker.make('places.PlaceAds', place_title='Lancha', place_description='Passeio pelo rio')
+
+        self.client.force_authenticate(user)
+        url = reverse("places_urls:places-ads-list")
+        response = self.client.get(url, {'search': 'casas'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([place_ads['id'] for place_ads in response.data['results']], [in_title.id, in_description.id])
+
+        in_title.place_title = 'Barco'
+        in_title.save()
+        response = self.client.get(url, {'search': 'casas'}, format='json')
+
+        self.assertEqual([place_ads['id'] for place_ads in response.data['results']], [in_description.id])
+
+    def test_place_ads_calendar(self):
+        cache.clear()
+        user = baker.make('authentication.User')
+        place_ads = baker.make('places.PlaceAds', status=1)
+        daily = baker.make('places.Plan', place_ads=place_ads, plan_type=1, price=200,
+                           week_days=WeekDay.objects.filter(day__lte=4))   #Segunda a sexta
+        cheaper = baker.make('places.Plan', place_ads=place_ads, plan_type=1, price=150,
+                             week_days=WeekDay.objects.filter(day=4))   #Sexta
+        accepted_order = baker.make('events.EventOrder', place_ads=place_ads, status=2,
+                                    dates_selected=[datetime(2021, 12, 9)])
+        baker.make('events.Booking', event_order=accepted_order, place_ads=place_ads, date=date(2021, 12, 9))
+
+        self.client.force_authenticate(user)
+        url = reverse("places_urls:places-ads-calendar", args=[place_ads.id])
+        query = {'from': '2021-12-06', 'to': '2021-12-12'}   #Segunda a domingo
+        response = self.client.get(url, query, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        days = response.data['days']
+        self.assertEqual(len(days), 7)
+        self.assertEqual([day['bookable'] for day in days], [True, True, True, False, True, False, False])
+        self.assertEqual(days[3]['booked'], True)
+        self.assertEqual(days[0]['price'], 200)
+        self.assertEqual(days[4]['price'], 150)
+        self.assertEqual([plan['id'] for plan in days[4]['plans']], [daily.id, cheaper.id])
+        self.assertEqual(days[5]['plans'], [])
+
+        with self.assertNumQueries(0):
+            self.client.get(url, query, format='json')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            accepted_order.status = 4
+            accepted_order.save()
+            accepted_order.bookings.all().delete()
+
+        response = self.client.get(url, query, format='json')
+        self.assertEqual(response.data['days'][3]['bookable'], True)
+
+        response = self.client.get(url, {'from': '2021-12-12', 'to': '2021-12-06'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_update_place_ads(self):
         image = Image.new(mode='RGB', size=(200, 20), color='blue')
 
@@ -228,3 +449,175 @@ class PlaceAdsTests(APITestCase):
         for day in plan3.week_days.all():
             self.assertEqual(day.day in body['plans'][1]['week_days'], True)
 
+    def test_update_place_ads_applies_the_plan_diff_in_constant_queries(self):
+        user = baker.make('authentication.User')
+        self.client.force_authenticate(user)
+        weekend = WeekDay.objects.filter(day__in=[5, 6])
+        # loads the process-level weekday map
+        week_day_ids([0])
+
+        def place_with_plans(total_plans):
+            address = baker.make('places.Address')
+            place_ads = baker.make('places.PlaceAds', user=user, address=address)
+            plans = baker.make('places.Plan', place_ads=place_ads, plan_type=1, price=50,
+                               week_days=weekend, _quantity=total_plans)
+            return address, place_ads, sorted(plans, key=lambda plan: plan.id)
+
+        def body(address, plans):
+            # the first plan is kept as is, the second renamed, the third gets
+            # other days, the rest are dropped and one plan is added
+            return {
+                "address": {"id": address.id, "map_string": "Rua", "reference": "ref", "cep": "84268660",
+                            "latitude": None, "longitude": None},
+                "place_title": "Title",
+                "place_description": "Description",
+                "capacity": 50,
+                "local_type": 1,
+                "images": [],
+                "plans": [
+                    {"id": plans[0].id, "week_days": [5, 6], "plan_type": 1, "name": plans[0].name, "price": 50},
+                    {"id": plans[1].id, "week_days": [6, 5], "plan_type": 1, "name": "Renomeado", "price": 50},
+                    {"id": plans[2].id, "week_days": [0, 6], "plan_type": 1, "name": plans[2].name, "price": 50},
+                    {"week_days": [0, 1, 2], "plan_type": 2, "name": "Novo", "price": 120},
+                ],
+            }
+
+        queries = {}
+        for total_plans in (4, 30):
+            address, place_ads, plans = place_with_plans(total_plans)
+            url = reverse("places_urls:places-ads-detail", args=[place_ads.id])
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.put(url, body(address, plans), format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            queries[total_plans] = len(context)
+
+            remaining = {plan.id: plan for plan in Plan.objects.filter(place_ads=place_ads).prefetch_related('week_days')}
+            self.assertEqual(len(remaining), 4)
+            self.assertEqual(remaining[plans[1].id].name, 'Renomeado')
+            self.assertEqual(sorted(day.day for day in remaining[plans[0].id].week_days.all()), [5, 6])
+            self.assertEqual(sorted(day.day for day in remaining[plans[2].id].week_days.all()), [0, 6])
+            new_plan = Plan.objects.get(place_ads=place_ads, name='Novo')
+            self.assertEqual(sorted(day.day for day in new_plan.week_days.all()), [0, 1, 2])
+
+        self.assertEqual(queries[4], queries[30])
+
+    def test_update_place_ads_adds_plans_on_sqlite(self):
+        with sqlite_database():
+            for day in range(7):
+                WeekDay.objects.create(day=day)
+            user = baker.make('authentication.User')
+            self.client.force_authenticate(user)
+            place_ads = baker.make('places.PlaceAds', user=user)
+            plan = baker.make('places.Plan', place_ads=place_ads, plan_type=1, price=50)
+
+            response = self.client.put(reverse("places_urls:places-ads-detail", args=[place_ads.id]), {
+                "address": {"id": place_ads.address_id, "map_string": "Rua", "reference": "ref", "cep": "84268660",
+                            "latitude": None, "longitude": None},
+                "place_title": "Title",
+                "place_description": "Description",
+                "capacity": 50,
+                "local_type": 1,
+                "images": [],
+                "plans": [
+                    {"id": plan.id, "week_days": [5, 6], "plan_type": 1, "name": plan.name, "price": 50},
+                    {"week_days": [0, 1, 2], "plan_type": 2, "name": "Novo", "price": 120},
+                ],
+            }, format='json')
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+            new_plan = Plan.objects.get(place_ads=place_ads, name='Novo')
+            self.assertEqual(sorted(day.day for day in new_plan.week_days.all()), [0, 1, 2])
+
+    def test_export_and_import_places_catalog(self):
+        user = baker.make('authentication.User')
+        asset = baker.make('asset.Asset')
+        for title in ('Casa', 'Chácara'):
+            place_ads = baker.make('places.PlaceAds', user=user, place_title=title, local_type=1, images=[asset])
+            baker.make('places.Plan', place_ads=place_ads, plan_type=1, week_days=WeekDay.objects.filter(day__in=[5, 6]))
+
+        catalog = PlaceAds.objects.select_related('address').prefetch_related('images', 'plan_set__week_days')
+        exported = [export_place_ads(place_ads) for place_ads in catalog.order_by('id')]
+
+        directory = tempfile.mkdtemp()
+        paths = [os.path.join(directory, 'catalog.ndjson'), os.path.join(directory, 'catalog.csv')]
+        for path in paths:
+            call_command('export_places', path, stdout=StringIO())
+
+        for path in paths:
+            call_command('import_places', path, batch_size=1, stdout=StringIO())
+
+            imported = reversed(catalog.order_by('-id')[:2])
+            self.assertEqual([export_place_ads(place_ads) for place_ads in imported], exported)
+
+        self.assertEqual(PlaceAds.objects.count(), 6)
+        self.assertFalse(PlaceAds.objects.filter(search_vector__isnull=True).exists())
+
+    def test_import_places_on_sqlite(self):
+        path = os.path.join(tempfile.mkdtemp(), 'catalog.ndjson')
+
+        with sqlite_database() as sqlite:
+            self.assertFalse(sqlite.features.can_return_rows_from_bulk_insert)
+            for day in range(7):
+                WeekDay.objects.create(day=day)
+            user = baker.make('authentication.User')
+            Asset.objects.bulk_create([Asset(file_high='photo.jpg', status=2)])
+            asset = Asset.objects.get()
+
+            with open(path, 'w') as file:
+                for index in range(3):
+                    file.write(json.dumps({
+                        "address": {"map_string": f"Rua {index}", "reference": "ref", "cep": "84268660"},
+                        "place_title": f"Casa {index}",
+                        "place_description": "Descrição",
+                        "capacity": 10,
+                        "local_type": 1,
+                        "images": [asset.id],
+                        "plans": [{"week_days": [0, index + 1], "plan_type": 1, "name": "Diária", "price": 100}],
+                    }) + '\n')
+
+            call_command('import_places', path, user=user.id, batch_size=2, stdout=StringIO())
+
+            catalog = PlaceAds.objects.select_related('address').prefetch_related('images', 'plan_set__week_days')
+            for index, place_ads in enumerate(catalog.order_by('id')):
+                row = export_place_ads(place_ads)
+                self.assertEqual(row['place_title'], f'Casa {index}')
+                self.assertEqual(row['address']['map_string'], f'Rua {index}')
+                self.assertEqual(row['images'], [asset.id])
+                self.assertEqual(row['plans'][0]['week_days'], [0, index + 1])
+            self.assertEqual(PlaceAds.objects.count(), 3)
+
+    def test_import_places_resumes_after_a_failed_batch(self):
+        user = baker.make('authentication.User')
+
+        def row(index, local_type=1):
+            return {
+                "address": {"map_string": "Rua", "reference": "ref", "cep": "84268660"},
+                "place_title": f"Casa {index}",
+                "place_description": "Descrição",
+                "capacity": 10,
+                "local_type": local_type,
+                "plans": [{"week_days": [0, 6], "plan_type": 1, "name": "Diária", "price": 100}],
+            }
+
+        path = os.path.join(tempfile.mkdtemp(), 'catalog.ndjson')
+        rows = [row(index) for index in range(5)]
+        rows[3]['local_type'] = None
+        with open(path, 'w') as file:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+
+        with self.assertRaises(CommandError):
+            call_command('import_places', path, user=user.id, batch_size=2, stdout=StringIO())
+
+        self.assertEqual(sorted(PlaceAds.objects.values_list('place_title', flat=True)), ['Casa 0', 'Casa 1'])
+
+        rows[3]['local_type'] = 2
+        with open(path, 'w') as file:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+
+        stdout = StringIO()
+        call_command('import_places', path, user=user.id, batch_size=2, resume=True, stdout=stdout)
+
+        self.assertIn('3 place ads imported', stdout.getvalue())
+        self.assertEqual(PlaceAds.objects.filter(user=user).count(), 5)
+        self.assertEqual(Plan.week_days.through.objects.filter(plan__place_ads__user=user).count(), 10)
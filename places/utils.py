@@ -0,0 +1,306 @@
+import json
+from datetime import timedelta
+from functools import lru_cache
+
+CALENDAR_CACHE_TIMEOUT = 60 * 60
+CALENDAR_MAX_DAYS = 366
+
+CATALOG_ADDRESS_FIELDS = ['map_string', 'reference', 'cep', 'latitude', 'longitude']
+CATALOG_PLAN_FIELDS = ['plan_type', 'name', 'price']
+CATALOG_CSV_COLUMNS = [
+    'user', 'place_title', 'place_description', 'local_type', 'capacity', 'status',
+    *[f'address_{field}' for field in CATALOG_ADDRESS_FIELDS], 'images', 'plans',
+]
+
+
+def calendar_group(place_ads_id):
+    return f'calendar:{place_ads_id}'
+
+
+@lru_cache(maxsize=None)
+def week_day_map():
+    '''
+    WeekDay ids by day, loaded once per process and cleared by the WeekDay
+    signals
+
+    Returns:
+        ids(dict): {day: id}
+    '''
+    from .models import WeekDay
+
+    return dict(WeekDay.objects.values_list('day', 'id'))
+
+
+def week_day_ids(days):
+    '''
+    Args:
+        days(list): WeekDay.day values
+
+    Returns:
+        ids(list): the matching WeekDay ids, in the same order
+    '''
+    from .models import WeekDay
+
+    ids = week_day_map()
+    if not set(days) <= ids.keys():
+        # rows created by another process since the map was loaded
+        week_day_map.cache_clear()
+        ids = week_day_map()
+
+    try:
+        return [ids[day] for day in days]
+    except KeyError:
+        raise WeekDay.DoesNotExist('WeekDay matching query does not exist.')
+
+
+def bulk_create_with_ids(model, objs):
+    '''
+    bulk_create that also sets the primary keys of ``objs`` on backends
+    that don't return them from bulk inserts, like SQLite on Django 3.2.
+    There the ids are read back in the transaction of the insert: SQLite
+    has a single writer, so the last ids are the ones just inserted.
+
+    Returns:
+        objs(list): the created objects, with their ids
+    '''
+    from django.db import connections, router, transaction
+
+    db = router.db_for_write(model)
+    if not objs or connections[db].features.can_return_rows_from_bulk_insert:
+        return model.objects.using(db).bulk_create(objs)
+
+    with transaction.atomic(using=db):
+        objs = model.objects.using(db).bulk_create(objs)
+        ids = model.objects.using(db).order_by('-pk').values_list('pk', flat=True)[:len(objs)]
+        for obj, pk in zip(objs, reversed(list(ids))):
+            obj.pk = pk
+
+    return objs
+
+
+def sync_plans(place_ads, request_plans):
+    '''
+    Make the plans of a place match ``request_plans`` touching only what changed
+
+    Plans must come from ``place_ads.plan_set`` prefetched with their week
+    days. Requested plans with the id of one of the place's plans update it,
+    the others are created and the place's plans left out are deleted, with
+    one bulk query per kind of change.
+
+    Args:
+        place_ads(PlaceAds): the place
+        request_plans(list): dicts with plan_type, name, price, week_days and
+            optionally the id of an existing plan
+
+    Returns:
+        plans(dict): lists of the created, updated and deleted plans
+    '''
+    from django.db.models import Q
+    from .models import Plan
+
+    stale = {plan.id: plan for plan in place_ads.plan_set.all()}
+    fields = ['plan_type', 'name', 'price']
+
+    created, created_week_days = [], []
+    updated = []
+    week_days_added = []
+    week_days_removed = Q()
+
+    for request_plan in request_plans:
+        days = week_day_ids(request_plan['week_days'])
+        plan = stale.pop(request_plan.get('id'), None)
+
+        if plan is None:
+            created.append(Plan(place_ads=place_ads, **{field: request_plan[field] for field in fields}))
+            created_week_days.append(days)
+            continue
+
+        if any(getattr(plan, field) != request_plan[field] for field in fields):
+            for field in fields:
+                setattr(plan, field, request_plan[field])
+            updated.append(plan)
+
+        current = {week_day.id for week_day in plan.week_days.all()}
+        week_days_added += [
+            Plan.week_days.through(plan_id=plan.id, weekday_id=day_id) for day_id in set(days) - current
+        ]
+        if current - set(days):
+            week_days_removed |= Q(plan_id=plan.id, weekday_id__in=current - set(days))
+
+    if updated:
+        Plan.objects.bulk_update(updated, fields)
+
+    if stale:
+        Plan.objects.filter(id__in=stale.keys()).delete()
+
+    if created:
+        bulk_create_with_ids(Plan, created)
+        for plan, days in zip(created, created_week_days):
+            week_days_added += [Plan.week_days.through(plan_id=plan.id, weekday_id=day_id) for day_id in set(days)]
+
+    if week_days_removed:
+        Plan.week_days.through.objects.filter(week_days_removed).delete()
+
+    if week_days_added:
+        Plan.week_days.through.objects.bulk_create(week_days_added)
+
+    return {'created': created, 'updated': updated, 'deleted': list(stale.values())}
+
+
+def import_place_ads(rows, user_id=None):
+    '''
+    Create ads from catalog rows with one bulk insert per table
+
+    Rows have the shape of the PlaceAds create request (address, place
+    fields, images and plans) plus an optional ``user`` id.
+
+    Args:
+        rows(list): catalog rows
+        user_id(int): owner of the rows without ``user``
+
+    Returns:
+        place_ads(list): the created ads
+    '''
+    from django.db import connections
+    from .models import Address, PlaceAds, Plan
+
+    addresses = bulk_create_with_ids(Address, [
+        Address(**{field: row['address'].get(field) for field in CATALOG_ADDRESS_FIELDS}) for row in rows
+    ])
+
+    place_ads = bulk_create_with_ids(PlaceAds, [
+        PlaceAds(
+            user_id=row.get('user') or user_id,
+            address=address,
+            place_title=row['place_title'],
+            place_description=row['place_description'],
+            local_type=row['local_type'],
+            capacity=row['capacity'],
+            status=row.get('status') or 1,
+        )
+        for row, address in zip(rows, addresses)
+    ])
+
+    if connections[PlaceAds.objects.db].vendor == 'postgresql':
+        PlaceAds.objects.filter(id__in=[ads.id for ads in place_ads]).update_search_vector()
+
+    PlaceAds.images.through.objects.bulk_create([
+        PlaceAds.images.through(placeads_id=ads.id, asset_id=asset_id)
+        for row, ads in zip(rows, place_ads) for asset_id in row.get('images', [])
+    ])
+
+    request_plans = [(ads, request_plan) for row, ads in zip(rows, place_ads) for request_plan in row.get('plans', [])]
+    week_days = [week_day_ids(request_plan['week_days']) for _, request_plan in request_plans]
+    plans = bulk_create_with_ids(Plan, [
+        Plan(place_ads=ads, **{field: request_plan[field] for field in CATALOG_PLAN_FIELDS})
+        for ads, request_plan in request_plans
+    ])
+
+    Plan.week_days.through.objects.bulk_create([
+        Plan.week_days.through(plan_id=plan.id, weekday_id=day_id)
+        for plan, days in zip(plans, week_days) for day_id in set(days)
+    ])
+
+    return place_ads
+
+
+def export_place_ads(place_ads):
+    '''
+    Catalog row of an ad, the inverse of import_place_ads
+
+    Args:
+        place_ads(PlaceAds): the ad with its address, images and plans with
+            week days prefetched
+
+    Returns:
+        row(dict): address, place fields, image ids and plans
+    '''
+    return {
+        'user': place_ads.user_id,
+        'place_title': place_ads.place_title,
+        'place_description': place_ads.place_description,
+        'local_type': place_ads.local_type,
+        'capacity': place_ads.capacity,
+        'status': place_ads.status,
+        'address': {field: getattr(place_ads.address, field) for field in CATALOG_ADDRESS_FIELDS},
+        'images': [asset.id for asset in place_ads.images.all()],
+        'plans': [
+            {
+                'week_days': sorted(week_day.day for week_day in plan.week_days.all()),
+                **{field: getattr(plan, field) for field in CATALOG_PLAN_FIELDS},
+            }
+            for plan in sorted(place_ads.plan_set.all(), key=lambda plan: plan.id)
+        ],
+    }
+
+
+def catalog_row_to_csv(row):
+    '''
+    Flatten a catalog row into CATALOG_CSV_COLUMNS: address fields get an
+    ``address_`` prefix, images and plans are JSON encoded
+    '''
+    csv_row = {column: row.get(column) for column in CATALOG_CSV_COLUMNS[:6]}
+    csv_row.update({f'address_{field}': row['address'].get(field) for field in CATALOG_ADDRESS_FIELDS})
+    csv_row['images'] = json.dumps(row.get('images', []))
+    csv_row['plans'] = json.dumps(row.get('plans', []))
+    return csv_row
+
+
+def catalog_row_from_csv(csv_row):
+    '''
+    Inverse of catalog_row_to_csv; empty cells become None
+    '''
+    values = {column: value if value != '' else None for column, value in csv_row.items()}
+    return {
+        **{column: values.get(column) for column in CATALOG_CSV_COLUMNS[:6]},
+        'address': {field: values.get(f'address_{field}') for field in CATALOG_ADDRESS_FIELDS},
+        'images': json.loads(values.get('images') or '[]'),
+        'plans': json.loads(values.get('plans') or '[]'),
+    }
+
+
+def build_calendar(place_ads, start, end):
+    '''
+    Per-day availability of a place between ``start`` and ``end`` (inclusive)
+
+    Plans must come from ``place_ads.plan_set`` prefetched with their week
+    days; bookings of accepted orders are read in a single query.
+
+    Args:
+        place_ads(PlaceAds): the place
+        start(date): first day
+        end(date): last day
+
+    Returns:
+        days(list): one dict per day with date, bookable, booked, price and plans
+    '''
+    from events.models import Booking
+
+    booked = set(
+        Booking.objects.filter(place_ads=place_ads, date__range=(start, end)).values_list('date', flat=True)
+    )
+
+    plans_by_week_day = {}
+    for plan in sorted(place_ads.plan_set.all(), key=lambda plan: plan.id):
+        for week_day in plan.week_days.all():
+            plans_by_week_day.setdefault(week_day.day, []).append(plan)
+
+    days = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        plans = plans_by_week_day.get(day.weekday(), [])
+        daily_prices = [plan.price for plan in plans if plan.plan_type == 1]
+        is_booked = day in booked
+
+        days.append({
+            "date": day,
+            "bookable": place_ads.status == 1 and bool(plans) and not is_booked,
+            "booked": is_booked,
+            "price": min(daily_prices) if daily_prices else None,
+            "plans": [
+                {"id": plan.id, "name": plan.name, "plan_type": plan.plan_type, "price": plan.price}
+                for plan in plans
+            ],
+        })
+
+    return days
@@ -1,4 +1,11 @@
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from asset.utils import image_formats_key
+from core.cache import cache_key, cache_response
 from rest_framework import filters, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
@@ -21,6 +28,18 @@ from .filters import(
     LocalTypeFilter,
     UserFilter,
     StatusFilter,
+    ScoreFilter,
+    NearFilter,
+    FullTextSearchFilter,
+)
+from .utils import (
+    CALENDAR_CACHE_TIMEOUT,
+    CALENDAR_MAX_DAYS,
+    build_calendar,
+    bulk_create_with_ids,
+    calendar_group,
+    sync_plans,
+    week_day_ids,
 )
 
 
@@ -32,157 +51,157 @@ class WeekDayViewSet(viewsets.ModelViewSet):
     queryset = WeekDay.objects.all()
     serializer_class = WeekDaySerializer
 
+    @cache_response('week-days')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response('week-days')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class PlaceAdsViewSet(viewsets.ModelViewSet):
-    queryset = PlaceAds.objects.all()
+    queryset = PlaceAds.objects.for_listing()
     serializer_class = PlaceAdsSerializer
     permission_classes = [PlaceAdsPermissions]
     search_fields = ['place_title', 'place_description']
+    ordering_fields = ['rating_avg', 'created_at']
+    cursor_field = 'created_at'
     filter_backends = [
         LocalTypeFilter,
         UserFilter,
         StatusFilter,
-        filters.SearchFilter,
+        ScoreFilter,
+        NearFilter,
+        FullTextSearchFilter,
+        filters.OrderingFilter,
     ]
 
+    @cache_response('places', vary=image_formats_key)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response('places', vary=image_formats_key)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def create(self, request, *args, **kwargs):
         try:
-            request_address = request.data['address']
-            address = Address.objects.create(**request_address)
-            
-            try:
-                request_status = request.data['status']
-            except:
-                request_status = 1
-            
-            place_ads = PlaceAds.objects.create(
-                user=request.user,
-                address=address,
-                place_title=request.data['place_title'],
-                place_description=request.data['place_description'],
-                local_type=request.data['local_type'],
-                capacity=request.data['capacity'],
-                status=request_status
-                )
-            
-            through_objs = []
-            for image_id in request.data['images']:
-                throug = PlaceAds.images.through(asset_id=image_id, placeads_id=place_ads.id)
-                through_objs.append(throug)
-
-            PlaceAds.images.through.objects.bulk_create(through_objs)
-
-            request_plans = request.data['plans']
-            
-            all_week_days_obj = WeekDay.objects.all()
-            for request_plan in request_plans:
-                week_days_id_list = [
-                    all_week_days_obj.get(day=week_day).id
-                    for week_day in request_plan['week_days']
-                ]
-
-                plan = Plan.objects.create(
-                    place_ads=place_ads,
-                    plan_type=request_plan['plan_type'],
-                    name=request_plan['name'],
-                    price=request_plan['price'],
-                )
-                
-                through_objs = []
-                for day_id in week_days_id_list:
-                    throug = Plan.week_days.through(
-                        weekday_id=day_id,
-                        plan_id=plan.id,
+            with transaction.atomic():
+                request_address = request.data['address']
+                address = Address.objects.create(**request_address)
+
+                try:
+                    request_status = request.data['status']
+                except KeyError:
+                    request_status = 1
+
+                place_ads = PlaceAds.objects.create(
+                    user=request.user,
+                    address=address,
+                    place_title=request.data['place_title'],
+                    place_description=request.data['place_description'],
+                    local_type=request.data['local_type'],
+                    capacity=request.data['capacity'],
+                    status=request_status
                     )
+
+                through_objs = []
+                for image_id in request.data['images']:
+                    throug = PlaceAds.images.through(asset_id=image_id, placeads_id=place_ads.id)
                     through_objs.append(throug)
-            
-                Plan.week_days.through.objects.bulk_create(through_objs)
 
-            return Response(data=self.serializer_class(instance=place_ads).data, status=status.HTTP_201_CREATED)
+                PlaceAds.images.through.objects.bulk_create(through_objs)
 
-        except Exception as error:
-            raise ValidationError(error)
+                request_plans = request.data['plans']
+                week_days_id_lists = [week_day_ids(request_plan['week_days']) for request_plan in request_plans]
 
-    def update(self, request, *args, **kwargs):
-        try:
-            request_address = request.data['address']
-            address = Address.objects.get(id=request_address['id'])
-
-            #update address
-            address.map_string = request_address['map_string']
-            address.reference = request_address['reference']
-            address.cep = request_address['cep']
-            address.latitude = request_address['latitude']
-            address.longitude = request_address['longitude']
-            address.save()
-            
-            #update place_ads
-            place_ads = self.get_object()
-            place_ads.place_title = request.data['place_title']
-            place_ads.place_description = request.data['place_description']
-            place_ads.local_type = request.data['local_type']
-            place_ads.capacity = request.data['capacity']
-            place_ads.place_title = request.data['place_title']
-            place_ads.images.set(request.data['images'])
-            place_ads.save()
-            
-            #update plan
-            plans = Plan.objects.filter(place_ads=place_ads)
-            request_plans = request.data['plans']
-            
-            new_plans_id = []
-            all_week_days_obj = WeekDay.objects.all()
-            for request_plan in request_plans:
-                try:
-                    week_days_list = []
-                    
-                    for day in request_plan['week_days']:
-                        day_id = all_week_days_obj.get(day=day).id
-                        week_days_list.append(day_id)
-                    
-                    plan = plans.get(id=request_plan['id'])
-                    plan.plan_type = request_plan['plan_type']
-                    plan.name = request_plan['name']
-                    plan.price = request_plan['price']
-                    plan.week_days.set(week_days_list)
-                    plan.save()
-
-                except:
-                    week_days_id_list = [
-                        all_week_days_obj.get(day=week_day).id
-                        for week_day in request_plan['week_days']
-                    ]
-
-                    plan = Plan.objects.create(
+                plans = bulk_create_with_ids(Plan, [
+                    Plan(
                         place_ads=place_ads,
                         plan_type=request_plan['plan_type'],
                         name=request_plan['name'],
                         price=request_plan['price'],
                     )
-                    
-                    through_objs = []
+                    for request_plan in request_plans
+                ])
+
+                through_objs = []
+                for plan, week_days_id_list in zip(plans, week_days_id_lists):
                     for day_id in week_days_id_list:
                         throug = Plan.week_days.through(
                             weekday_id=day_id,
                             plan_id=plan.id,
                         )
                         through_objs.append(throug)
-                
-                    Plan.week_days.through.objects.bulk_create(through_objs)
 
-                
-                new_plans_id.append(plan.id)
+                Plan.week_days.through.objects.bulk_create(through_objs)
 
-            
-            for plan in plans:
-                
-                if not plan.id in new_plans_id:
-                    plan.delete()
+            place_ads = PlaceAds.objects.for_listing().get(id=place_ads.id)
+            return Response(data=self.serializer_class(instance=place_ads).data, status=status.HTTP_201_CREATED)
+
+        except Exception as error:
+            raise ValidationError(error)
 
+    def update(self, request, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                request_address = request.data['address']
+                address = Address.objects.get(id=request_address['id'])
+
+                # update address
+                address.map_string = request_address['map_string']
+                address.reference = request_address['reference']
+                address.cep = request_address['cep']
+                address.latitude = request_address['latitude']
+                address.longitude = request_address['longitude']
+                address.save()
+
+                # update place_ads
+                place_ads = self.get_object()
+                place_ads.place_title = request.data['place_title']
+                place_ads.place_description = request.data['place_description']
+                place_ads.local_type = request.data['local_type']
+                place_ads.capacity = request.data['capacity']
+                place_ads.images.set(request.data['images'])
+                place_ads.save()
+
+                # update plan: plans and week days come prefetched by get_object
+                sync_plans(place_ads, request.data['plans'])
+
+            place_ads = PlaceAds.objects.for_listing().get(id=place_ads.id)
             return Response(data=self.serializer_class(instance=place_ads).data, status=status.HTTP_200_OK)
         except Exception as error:
             raise ValidationError(error)
 
+    @action(methods=['GET'], detail=True)
+    def calendar(self, request, *args, **kwargs):
+        try:
+            start = date.fromisoformat(request.query_params.get('from', date.today().isoformat()))
+            end = date.fromisoformat(request.query_params.get('to', (start + timedelta(days=30)).isoformat()))
+        except ValueError:
+            raise ValidationError("As datas devem estar no formato AAAA-MM-DD.")
+
+        if end < start:
+            raise ValidationError("A data final deve ser igual ou posterior à data inicial.")
+        if (end - start).days >= CALENDAR_MAX_DAYS:
+            raise ValidationError(f"O período não pode ser maior que {CALENDAR_MAX_DAYS} dias.")
+
+        key = cache_key(calendar_group(kwargs['pk']), start, end)
+        data = cache.get(key)
+
+        if data is None:
+            place_ads = self.get_object()
+            data = {
+                "place_ads": place_ads.id,
+                "from": start,
+                "to": end,
+                "days": build_calendar(place_ads, start, end),
+            }
+            cache.set(key, data, CALENDAR_CACHE_TIMEOUT)
+
+        return Response(data=data, status=status.HTTP_200_OK)
+
 
 class PlanViewSet(viewsets.ModelViewSet):
     queryset = Plan.objects.all()
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 # Create your models here.
 
@@ -25,6 +25,11 @@ class Rating(models.Model):
     def __str__(self) -> str:
         return f'{self.id}: Nota {self.score}, "{self.message}"'
 
+    def save(self, *args, **kwargs):
+        # review.signals locks the previous score and updates the place totals in this transaction
+        with transaction.atomic():
+            super(Rating, self).save(*args, **kwargs)
+
 
 class UserRatings(models.Model):
     rating = models.OneToOneField('review.Rating',
@@ -56,3 +61,8 @@ class PlaceRatings(models.Model):
 
     def __str__(self) -> str:
         return f'{self.id}: {self.user}, {self.place} - {self.rating}'
+
+    def save(self, *args, **kwargs):
+        # review.signals locks the previous row and moves the score between places in this transaction
+        with transaction.atomic():
+            super(PlaceRatings, self).save(*args, **kwargs)
@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.cache import invalidate_on_commit
+from places.models import PlaceAds
+
+from .models import PlaceRatings, Rating
+
+
+@receiver(pre_save, sender=Rating)
+def lock_previous_score(sender, instance, raw, **kwargs):
+    '''
+    Rating.save runs in a transaction, so the row stays locked until the
+    place totals follow the new score
+    '''
+    instance._previous_score = None
+    if instance.pk and not raw:
+        previous = Rating.objects.select_for_update().filter(pk=instance.pk)
+        instance._previous_score = previous.values_list('score', flat=True).first()
+
+
+@receiver(post_save, sender=Rating)
+def update_place_score(sender, instance, raw, **kwargs):
+    previous_score = getattr(instance, '_previous_score', None)
+    if raw or previous_score is None or previous_score == instance.score:
+        return
+
+    PlaceAds.objects.filter(placeratings__rating=instance).add_rating(instance.score - previous_score, count=0)
+    invalidate_on_commit('places')
+
+
+@receiver(pre_save, sender=PlaceRatings)
+def lock_previous_place_rating(sender, instance, raw, **kwargs):
+    instance._previous = None
+    if instance.pk and not raw:
+        instance._previous = (
+            PlaceRatings.objects.select_for_update().filter(pk=instance.pk).values_list('place', 'rating__score').first()
+        )
+
+
+@receiver(post_save, sender=PlaceRatings)
+def add_place_rating(sender, instance, raw, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous', None)
+    current = (instance.place_id, instance.rating.score)
+    if previous == current:
+        return
+
+    if previous:
+        PlaceAds.objects.filter(id=previous[0]).add_rating(-previous[1], count=-1)
+    PlaceAds.objects.filter(id=instance.place_id).add_rating(instance.rating.score)
+
+
+@receiver(post_delete, sender=PlaceRatings)
+def remove_place_rating(sender, instance, **kwargs):
+    # also sent for QuerySet.delete(), the admin bulk delete and cascades from the user
+    PlaceAds.objects.filter(id=instance.place_id).add_rating(-instance.rating.score, count=-1)
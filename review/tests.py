@@ -1,3 +1,126 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from model_bakery import baker
 
-# Create your tests here.
+from authentication.models import User
+from places.models import PlaceAds
+from review.models import PlaceRatings, Rating
+
+
+class PlaceRatingsTests(APITestCase):
+    def setUp(self):
+        self.user = baker.make('authentication.User')
+        self.place_ads = baker.make('places.PlaceAds')
+
+    def rate(self, score, place_ads=None):
+        rating = baker.make('review.Rating', score=score)
+        return baker.make('review.PlaceRatings', rating=rating, user=self.user, place=place_ads or self.place_ads)
+
+    def test_score_is_updated_when_ratings_are_created(self):
+        self.rate(5)
+        self.rate(2)
+
+        place_ads = PlaceAds.objects.get(id=self.place_ads.id)
+        self.assertEqual(place_ads.rating_sum, 7)
+        self.assertEqual(place_ads.rating_count, 2)
+        self.assertEqual(place_ads.score, 3.5)
+
+    def test_score_is_updated_when_rating_score_changes(self):
+        place_rating = self.rate(5)
+        self.rate(3)
+
+        rating = Rating.objects.get(id=place_rating.rating_id)
+        rating.score = 1
+        rating.save()
+
+        place_ads = PlaceAds.objects.get(id=self.place_ads.id)
+        self.assertEqual(place_ads.rating_sum, 4)
+        self.assertEqual(place_ads.rating_count, 2)
+        self.assertEqual(place_ads.score, 2)
+
+    def test_score_is_moved_when_rating_changes_place(self):
+        other_place_ads = baker.make('places.PlaceAds')
+        place_rating = self.rate(4)
+
+        place_rating.place = other_place_ads
+        place_rating.save()
+
+        place_ads = PlaceAds.objects.get(id=self.place_ads.id)
+        self.assertEqual(place_ads.rating_count, 0)
+        self.assertEqual(place_ads.score, 0)
+
+        other_place_ads = PlaceAds.objects.get(id=other_place_ads.id)
+        self.assertEqual(other_place_ads.rating_count, 1)
+        self.assertEqual(other_place_ads.score, 4)
+
+    def test_score_is_updated_when_ratings_are_deleted(self):
+        place_rating = self.rate(5)
+        self.rate(1)
+
+        place_rating.delete()
+
+        place_ads = PlaceAds.objects.get(id=self.place_ads.id)
+        self.assertEqual(place_ads.rating_sum, 1)
+        self.assertEqual(place_ads.rating_count, 1)
+        self.assertEqual(place_ads.score, 1)
+
+    def test_score_is_updated_when_ratings_are_deleted_in_bulk(self):
+        self.rate(5)
+        self.rate(4)
+        other_user = baker.make('authentication.User')
+        baker.make('review.PlaceRatings', rating=baker.make('review.Rating', score=1), user=other_user, place=self.place_ads)
+
+        PlaceRatings.objects.filter(rating__score=5).delete()
+        # the ratings of a deleted user go with it
+        User.objects.filter(id=other_user.id).delete()
+
+        place_ads = PlaceAds.objects.get(id=self.place_ads.id)
+        self.assertEqual(place_ads.rating_sum, 4)
+        self.assertEqual(place_ads.rating_count, 1)
+        self.assertEqual(place_ads.score, 4)
+
+    def test_rating_score_change_invalidates_places(self):
+        place_rating = self.rate(5)
+        rating = Rating.objects.get(id=place_rating.rating_id)
+
+        with mock.patch('review.signals.invalidate_on_commit') as invalidate_on_commit:
+            rating.save()
+            invalidate_on_commit.assert_not_called()
+
+            rating.score = 2
+            rating.save()
+            invalidate_on_commit.assert_called_once_with('places')
+
+    def test_rebuild_place_ratings_command(self):
+        self.rate(5)
+        self.rate(4)
+        PlaceAds.objects.update(rating_sum=0, rating_count=0, rating_avg=0)
+
+        call_command('rebuild_place_ratings', stdout=StringIO())
+
+        place_ads = PlaceAds.objects.get(id=self.place_ads.id)
+        self.assertEqual(place_ads.rating_sum, 9)
+        self.assertEqual(place_ads.rating_count, 2)
+        self.assertEqual(place_ads.score, 4.5)
+
+    def test_list_place_ads_ordered_and_filtered_by_score(self):
+        best_place_ads = baker.make('places.PlaceAds')
+        self.rate(2)
+        self.rate(5, place_ads=best_place_ads)
+
+        self.client.force_authenticate(self.user)
+        url = reverse("places_urls:places-ads-list")
+        response = self.client.get(url, {'ordering': '-rating_avg'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['id'], best_place_ads.id)
+        self.assertEqual(response.data['results'][0]['score'], 5)
+
+        response = self.client.get(url, {'min_score': 3}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([place_ads['id'] for place_ads in response.data['results']], [best_place_ads.id])